@@ -0,0 +1,135 @@
+"""
+ANN 索引基准：对 ann_index.INDEX_TYPES 中的每种索引报告
+构建耗时、索引文件大小、检索延迟（p50 / p95）、recall@k（以 flat 精确检索为基准），
+以及在全新进程中普通加载与只读内存映射加载的耗时和常驻内存增量（读取 /proc，仅 Linux）。
+数据为带簇结构的合成向量（接近真实 embedding 的分布），不需要模型。
+
+用法（在 smart_file_system 的上一级目录执行）:
+    python -m smart_file_system.benchmarks.bench_ann --vectors 100000 --dim 1024 --json ann.json
+    python -m smart_file_system.benchmarks.bench_ann --types flat hnsw --nprobe 32 --ef-search 128
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from ..subsystems import ann_index
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_LOAD_PROBE = """
+import json, os, time
+from smart_file_system.subsystems import ann_index
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+before = rss_mb()
+t = time.perf_counter()
+index = ann_index.read_index({path!r}, mmap={mmap!r})
+elapsed = time.perf_counter() - t
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_mb() - before}}))
+"""
+
+
+def make_vectors(n, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+
+def load_probe(path, mmap):
+    script = _LOAD_PROBE.format(path=path, mmap=mmap)
+    result = subprocess.run([sys.executable, "-c", script], cwd=PACKAGE_ROOT, capture_output=True, text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(ann_index.INDEX_TYPES), choices=ann_index.INDEX_TYPES)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args(argv)
+
+    params = {}
+    if args.ef_search:
+        params["ef_search"] = args.ef_search
+    if args.nprobe:
+        params["nprobe"] = args.nprobe
+    params = ann_index.index_params(params)
+
+    data = make_vectors(args.vectors + args.queries, args.dim, args.clusters)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+    ids = np.arange(args.vectors, dtype=np.int64)
+    truth = None
+    report = {"vectors": args.vectors, "dim": args.dim, "k": args.k, "params": params, "types": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for index_type in ["flat"] + [t for t in args.types if t != "flat"]:
+            t = time.perf_counter()
+            index = ann_index.build_index(index_type, vectors, ids, params=params)
+            build_s = time.perf_counter() - t
+
+            sp = ann_index.search_params(index, params=params)
+            latencies = []
+            found = []
+            for q in queries:
+                t = time.perf_counter()
+                _, labels = index.search(q.reshape(1, -1), args.k, params=sp)
+                latencies.append(time.perf_counter() - t)
+                found.append(labels[0])
+            if truth is None:
+                truth = found
+            recall = statistics.mean(len(set(f) & set(g)) / args.k for f, g in zip(found, truth))
+
+            path = os.path.join(tmp, f"{index_type}.faiss")
+            faiss.write_index(index, path)
+            del index
+            normal = load_probe(path, mmap=False)
+            mapped = load_probe(path, mmap=True)
+
+            latencies.sort()
+            entry = {
+                "build_s": round(build_s, 2),
+                "file_mb": round(os.path.getsize(path) / 2 ** 20, 1),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+                f"recall@{args.k}": round(recall, 4),
+                "load_s": round(normal["seconds"], 3),
+                "load_rss_mb": round(normal["rss_mb"], 1),
+                "mmap_load_s": round(mapped["seconds"], 3),
+                "mmap_rss_mb": round(mapped["rss_mb"], 1),
+            }
+            report["types"][index_type] = entry
+            if index_type in args.types:
+                print(f"{index_type:9s} build={entry['build_s']:7.2f}s file={entry['file_mb']:7.1f}MB "
+                      f"p50={entry['p50_ms']:7.3f}ms p95={entry['p95_ms']:7.3f}ms "
+                      f"recall@{args.k}={entry[f'recall@{args.k}']:.3f} "
+                      f"load={entry['load_s']:.3f}s/{entry['load_rss_mb']:.0f}MB "
+                      f"mmap={entry['mmap_load_s']:.3f}s/{entry['mmap_rss_mb']:.0f}MB")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+LLM 分类合并基准：比较逐文件分类与多文件合并分类的吞吐、单文件延迟与 LLM 请求数：
+  - per_file    OllamaClassifier.classify，callers 个线程并发，每个文件一次请求
+  - batching    BatchingClassifier 前端（同样 callers 个线程并发调用 classify），按候选集合并
+  - bulk        Classifier.classify_many 的做法：按候选集分组后直接 classify_batch
+假 Ollama 服务按 prompt / 输出的 token 数（按 4 个字符一个 token 估算）模拟预填充与生成耗时，
+并用 --parallel 限制同时推理的请求数（相当于 OLLAMA_NUM_PARALLEL）。
+--malformed / --bad-item 让一部分批量输出整体无法解析 / 单项不是合法类别，用来检验逐个回退。
+
+用法（在 smart_file_system 的上一级目录执行）:
+    python -m smart_file_system.benchmarks.bench_classify_batch --files 200 --json classify_batch.json
+    python -m smart_file_system.benchmarks.bench_classify_batch --batch-size 16 --malformed 0.1 --bad-item 0.05
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from ..data_structures.file_info import FileInfo
+from ..subsystems.classifier import BatchingClassifier, OllamaClassifier
+from ..subsystems.llm_client import OllamaHTTPBackend
+from ..utils.fake_ollama import FakeOllamaServer
+from ..utils.synthetic_corpus import TOPICS
+
+MODES = ("per_file", "batching", "bulk")
+
+# 几组候选类别（对应 kNN 近邻给出的不同候选集）
+CANDIDATE_SETS = [
+    ["invoice", "contract", "other"],
+    ["research paper", "code script", "meeting notes", "other"],
+    ["contract", "meeting notes", "invoice", "research paper", "other"],
+]
+
+
+def make_responder(malformed, bad_item, seed):
+    """确定性的假模型：按摘要哈希从候选中选类别；批量 prompt 输出 JSON 数组"""
+    rng = random.Random(seed)
+
+    def pick(candidates, summary):
+        return candidates[zlib.crc32(summary.encode("utf-8")) % len(candidates)]
+
+    def responder(model, prompt, images):
+        lines = prompt.splitlines()
+        start = lines.index("候选类别（请从中选择，严格输出其中之一）：") + 1
+        candidates = []
+        for line in lines[start:]:
+            if not line.strip():
+                break
+            candidates.append(line.split(". ", 1)[1])
+        if "待分类文档摘要：" in lines:
+            return pick(candidates, lines[lines.index("待分类文档摘要：") + 1])
+
+        summaries = [line.split("] ", 1)[1] for line in lines if line.startswith("[")]
+        if rng.random() < malformed:
+            return "```json\n[" + ", ".join(json.dumps(pick(candidates, s)) for s in summaries[:-1])
+        labels = [("unknown" if rng.random() < bad_item else pick(candidates, s)) for s in summaries]
+        return "```json\n" + json.dumps(labels, ensure_ascii=False) + "\n```"
+
+    return responder
+
+
+def make_latency(base_ms, prefill_ms, decode_ms):
+    def latency(prompt, response):
+        return (base_ms + len(prompt) / 4 * prefill_ms + len(response) / 4 * decode_ms) / 1000
+    return latency
+
+
+def make_files(n, seed):
+    """n 个带摘要的 FileInfo 与各自的候选集"""
+    rng = random.Random(seed)
+    files = []
+    for i in range(n):
+        topic = rng.choice(list(TOPICS))
+        words = TOPICS[topic]
+        summary = " ".join(rng.choice(words) for _ in range(40))
+        f = FileInfo(f"/corpus/{topic}-{i}.txt", f"{topic}-{i}.txt", "txt", "document", 1024)
+        f.content["text_summary"] = f"{topic} {i}: {summary}."
+        files.append((f, rng.choice(CANDIDATE_SETS)))
+    return files
+
+
+def fewshot_examples(candidates):
+    return [{"text_summary": f"{label}: " + " ".join(TOPICS.get(label, ["misc"])), "correct_label": label}
+            for label in candidates[:3]]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_mode(mode, files, client, args):
+    latencies = []
+    labels = {}
+    batcher = None
+
+    def classify_one(classifier, f, candidates):
+        t = time.perf_counter()
+        labels[f.file_id] = classifier.classify(f, candidates, fewshot_examples=fewshot_examples(candidates),
+                                                fewshot_version=1)
+        latencies.append(time.perf_counter() - t)
+
+    def classify_group(classifier, members, candidates):
+        t = time.perf_counter()
+        result = classifier.classify_batch(members, candidates, fewshot_examples=fewshot_examples(candidates),
+                                           fewshot_version=1, max_batch_size=args.batch_size)
+        elapsed = time.perf_counter() - t
+        for f, label in zip(members, result):
+            labels[f.file_id] = label
+            latencies.append(elapsed)
+
+    llm = OllamaClassifier(llm_client=client)
+    start = time.perf_counter()
+    if mode == "per_file":
+        with ThreadPoolExecutor(args.callers) as pool:
+            list(pool.map(lambda item: classify_one(llm, *item), files))
+    elif mode == "batching":
+        batcher = BatchingClassifier(llm, max_batch_size=args.batch_size, max_wait=args.max_wait,
+                                     concurrency=args.parallel)
+        with ThreadPoolExecutor(args.callers) as pool:
+            list(pool.map(lambda item: classify_one(batcher, *item), files))
+        batcher.close()
+    else:
+        groups = {}
+        for f, candidates in files:
+            groups.setdefault(tuple(candidates), []).append(f)
+        # 每组再切成 batch_size 大小的块，块之间并发
+        chunks = [(members[i:i + args.batch_size], list(candidates))
+                  for candidates, members in groups.items() for i in range(0, len(members), args.batch_size)]
+        with ThreadPoolExecutor(args.parallel) as pool:
+            list(pool.map(lambda chunk: classify_group(llm, *chunk), chunks))
+    elapsed = time.perf_counter() - start
+
+    entry = {
+        "files_per_s": round(len(files) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "failed": sum(1 for label in labels.values() if label is None),
+    }
+    if batcher is not None:
+        entry["batcher"] = batcher.stats()
+    return entry, labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-wait", type=float, default=0.2, help="BatchingClassifier 凑批的最长等待（秒）")
+    parser.add_argument("--callers", type=int, default=32, help="并发调用 classify 的线程数")
+    parser.add_argument("--parallel", type=int, default=1, help="假模型同时推理的请求数")
+    parser.add_argument("--base-ms", type=float, default=30.0, help="每次请求的固定开销（毫秒）")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.5)
+    parser.add_argument("--decode-ms-per-token", type=float, default=15.0)
+    parser.add_argument("--malformed", type=float, default=0.0, help="批量输出整体无法解析的比例")
+    parser.add_argument("--bad-item", type=float, default=0.0, help="批量输出中单项不是合法类别的比例")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args(argv)
+
+    files = make_files(args.files, args.seed)
+    report = {"options": {k: v for k, v in vars(args).items() if k != "json_path"}, "modes": {}}
+    reference = None
+    with FakeOllamaServer(responder=make_responder(args.malformed, args.bad_item, args.seed),
+                          latency=make_latency(args.base_ms, args.prefill_ms_per_token, args.decode_ms_per_token),
+                          parallel=args.parallel) as server:
+        client = OllamaHTTPBackend(base_url=server.url, pool_size=max(args.callers, args.parallel))
+        for mode in args.modes:
+            server.requests.clear()
+            entry, labels = run_mode(mode, files, client, args)
+            entry["llm_requests"] = len(server.requests)
+            entry["prompt_kchars"] = round(sum(len(r.get("prompt", "")) for r in server.requests) / 1000, 1)
+            # 与逐文件结果对比（假模型是确定性的，回退路径也应得到同样的类别）
+            if reference is None:
+                reference = labels
+            entry["agreement"] = round(sum(labels[k] == v for k, v in reference.items()) / len(reference), 4)
+            report["modes"][mode] = entry
+            print(f"{mode:9s} {entry['files_per_s']:7.2f} files/s  p50={entry['p50_ms']:.0f}ms "
+                  f"p99={entry['p99_ms']:.0f}ms  requests={entry['llm_requests']}  "
+                  f"prompt={entry['prompt_kchars']}k chars  agreement={entry['agreement']:.3f}"
+                  + (f"  mean batch={entry['batcher']['mean_batch_size']}" if "batcher" in entry else ""))
+        client.close()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
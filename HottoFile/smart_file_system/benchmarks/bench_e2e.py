@@ -0,0 +1,233 @@
+"""
+端到端基准：生成 txt / md / pdf / docx / xlsx / png 合成语料，用真实的
+FileParser → Classifier → EmbeddingManager 路径入库，LLM 换成本地假 Ollama 服务（走真实 HTTP 客户端），
+embedding 换成确定性哈希向量。对每个语料规模（在独立子进程中运行）报告
+  - 吞吐（files/sec）与各阶段（抽取 / OCR / 摘要 / 分类 / embedding 批）的 p50 / p99 延迟
+  - 峰值常驻内存
+  - 索引保存耗时与大小
+  - 检索、删除延迟随规模的变化
+没有安装 tesseract 时跳过 OCR（图片仍会经过视觉模型描述）。
+--driver async 改用 AsyncOrchestrator.ingest_many 并发入库（同时在途的文件数为 --in-flight），
+此时各阶段延迟取自 sfs_orchestrator_stage_seconds 直方图（按桶上界估算）。
+
+用法（在 smart_file_system 的上一级目录执行）:
+    python -m smart_file_system.benchmarks.bench_e2e --sizes 500 2000 10000 --json e2e.json
+    python -m smart_file_system.benchmarks.bench_e2e --sizes 1000 --llm-latency 0.05 --persist-mode sync
+    python -m smart_file_system.benchmarks.bench_e2e --sizes 2000 --llm-latency 0.05 --driver async --llm-concurrency 8
+"""
+import asyncio
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from ..subsystems.classifier import Classifier, OllamaClassifier
+from ..subsystems.embedding_manager import EmbeddingManager
+from ..subsystems.file_parser import FileParser, ocr_image
+from ..subsystems.llm_client import OllamaHTTPBackend
+from ..subsystems.orchestrator import AsyncOrchestrator
+from ..utils import metrics
+from ..utils.fake_embeddings import HashEmbeddings
+from ..utils.fake_ollama import FakeOllamaServer
+from ..utils.synthetic_corpus import CORPUS_EXTS, TOPICS, generate_corpus
+
+STAGES = ("extract", "ocr", "summarize", "classify", "embed_batch")
+
+
+def stub_responder(model, prompt, images):
+    """确定性的假模型：图片返回固定格式的描述，分类从候选中按摘要哈希选一个，其余返回正文开头作为摘要"""
+    if images:
+        return f"A grayscale striped image, pattern {zlib.crc32(prompt.encode('utf-8')) % 97}."
+    lines = prompt.splitlines()
+    if "待分类文档摘要：" in lines:
+        start = lines.index("候选类别（请从中选择，严格输出其中之一）：") + 1
+        candidates = []
+        for line in lines[start:]:
+            if not line.strip():
+                break
+            candidates.append(line.split(". ", 1)[1])
+        summary = lines[lines.index("待分类文档摘要：") + 1]
+        return candidates[zlib.crc32(summary.encode("utf-8")) % len(candidates)]
+    return " ".join(lines[1:])[:300]
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(values[len(values) // 2] * 1000, 3),
+        "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))] * 1000, 3),
+    }
+
+
+def timed(latencies, name, func, *args):
+    t = time.perf_counter()
+    result = func(*args)
+    latencies[name].append(time.perf_counter() - t)
+    return result
+
+
+def run_size(n, options):
+    """在当前进程中完成一个规模的完整测量，返回报告字典"""
+    rng = random.Random(options["seed"])
+    latencies = {stage: [] for stage in STAGES}
+    latencies.update(search=[], delete=[])
+    has_ocr = shutil.which("tesseract") is not None
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOllamaServer(responder=stub_responder, latency=options["llm_latency"]) as server:
+        t = time.perf_counter()
+        corpus = generate_corpus(os.path.join(tmp, "corpus"), n, exts=options["exts"], seed=options["seed"],
+                                 lines=options["lines"], image_size=options["image_size"])
+        corpus_s = time.perf_counter() - t
+
+        client = OllamaHTTPBackend(base_url=server.url, pool_size=max(8, options["llm_concurrency"]),
+                                   default_concurrency=options["llm_concurrency"])
+        parser = FileParser(llm_client=client)
+        classifier = Classifier(OllamaClassifier(llm_client=client))
+        em = EmbeddingManager(os.path.join(tmp, "faiss_index"), persist_mode=options["persist_mode"],
+                              embeddings=HashEmbeddings(options["dim"]), embedding_cache_path=False,
+                              index_type=options["index_type"])
+
+        file_ids = []
+        batch = []
+        start = time.perf_counter()
+        if options["driver"] == "async":
+            file_ids = asyncio.run(ingest_async(parser, classifier, em, [path for path, _ in corpus], options))
+            corpus = []
+        for path, _ in corpus:
+            job = timed(latencies, "extract", parser.extract, path)
+            if job["needs_ocr"] and has_ocr and job["ocr_image"] is not None:
+                try:
+                    job["ocr_text"] = timed(latencies, "ocr", ocr_image, job["ocr_image"])
+                except Exception as e:
+                    print(f"OCR/图像解析失败: {e}")
+                    job["ocr_failed"] = True
+            timed(latencies, "summarize", parser.summarize, job)
+            file_info = timed(latencies, "classify", classifier.classify, parser.build_file_info(job), em)
+            file_ids.append(file_info.file_id)
+            batch.append(file_info)
+            if len(batch) >= options["batch_size"]:
+                timed(latencies, "embed_batch", em.upsert_files, batch)
+                batch = []
+        if batch:
+            timed(latencies, "embed_batch", em.upsert_files, batch)
+        ingest_s = time.perf_counter() - start
+
+        t = time.perf_counter()
+        em.save_index()
+        save_s = time.perf_counter() - t
+        index_mb = sum(os.path.getsize(os.path.join(em.persist_path, f)) for f in os.listdir(em.persist_path)) / 2 ** 20
+
+        words = [w for topic_words in TOPICS.values() for w in topic_words]
+        for _ in range(options["queries"]):
+            timed(latencies, "search", em.search, " ".join(rng.sample(words, 5)), options["k"])
+        for file_id in rng.sample(file_ids, min(options["deletes"], len(file_ids))):
+            timed(latencies, "delete", em.delete_files, [file_id])
+
+        em.close()
+        parser.close()
+        client.close()
+        llm_requests = len(server.requests)
+
+    return {
+        "files": n,
+        "corpus_s": round(corpus_s, 3),
+        "ingest_s": round(ingest_s, 3),
+        "files_per_s": round(n / ingest_s, 2) if ingest_s else None,
+        "llm_requests": llm_requests,
+        "knn_fast_path_ratio": round(classifier.fast_path_ratio(), 3),
+        "ocr": "tesseract" if has_ocr else "skipped (tesseract not found)",
+        "stages": ({stage: percentiles(latencies[stage]) for stage in STAGES} if options["driver"] == "serial"
+                   else orchestrator_stages()),
+        "save_s": round(save_s, 3),
+        "index_mb": round(index_mb, 2),
+        "search": percentiles(latencies["search"]),
+        "delete": percentiles(latencies["delete"]),
+        # Linux 上 ru_maxrss 的单位是 KiB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+async def ingest_async(parser, classifier, em, paths, options):
+    async with AsyncOrchestrator(parser, classifier, em, llm_concurrency=options["llm_concurrency"],
+                                 index_batch_size=options["batch_size"],
+                                 max_in_flight=options["in_flight"]) as orch:
+        results = await orch.ingest_many(paths)
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        print(f"⚠️ {len(failed)} 个文件入库失败，例如: {failed[0]!r}")
+    return [r.file_id for r in results if not isinstance(r, Exception)]
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def _fmt_ms(ms):
+    # 直方图估算超过最大的桶时没有数值
+    return ">max" if ms is None else f"{ms:.2f}"
+
+
+def orchestrator_stages():
+    stages = {}
+    for h in metrics.snapshot()["histograms"]:
+        if h["name"] == "sfs_orchestrator_stage_seconds" and h["labels"].get("status") == "ok":
+            stages[h["labels"]["stage"]] = {"count": h["count"], "p50_ms": _ms(h["p50"]), "p99_ms": _ms(h["p99"])}
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--exts", nargs="+", default=list(CORPUS_EXTS), choices=CORPUS_EXTS)
+    parser.add_argument("--lines", type=int, default=20, help="每个文本类文件的句子数")
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="假模型每次调用的模拟耗时（秒）")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32, help="每批写入向量库的文件数")
+    parser.add_argument("--persist-mode", choices=["wal", "sync"], default="wal")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--deletes", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--driver", choices=["serial", "async"], default="serial")
+    parser.add_argument("--in-flight", type=int, default=256, help="async 驱动同时在途的文件数")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="每个模型同时进行的请求数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args(argv)
+
+    options = vars(args)
+    report = {"options": {k: v for k, v in options.items() if k not in ("sizes", "json_path")}, "runs": []}
+    for n in args.sizes:
+        # 每个规模使用全新的子进程，峰值内存互不影响
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            run = pool.submit(run_size, n, options).result()
+        report["runs"].append(run)
+        stages = "  ".join(f"{name}={_fmt_ms(s['p50_ms'])}/{_fmt_ms(s['p99_ms'])}ms"
+                           for name, s in run["stages"].items() if s["count"])
+        print(f"n={n:<7d} {run['files_per_s']:8.1f} files/s  rss={run['peak_rss_mb']:.0f}MB  "
+              f"save={run['save_s']:.3f}s ({run['index_mb']:.1f}MB)  "
+              f"search={run['search']['p50_ms']:.2f}/{run['search']['p99_ms']:.2f}ms  "
+              f"delete={run['delete']['p50_ms']:.2f}/{run['delete']['p99_ms']:.2f}ms")
+        print(f"           p50/p99: {stages}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
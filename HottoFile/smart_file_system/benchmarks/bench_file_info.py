@@ -0,0 +1,111 @@
+"""
+FileInfo 内存与序列化基准：比较旧的基于 __dict__ 的 FileInfo + to_dict() 向量元数据
+与当前 __slots__ 版本 + to_index_metadata(lean=True)（启用 FileCatalog 时）在 N 个文件时的
+  - 对象常驻内存（tracemalloc）
+  - docstore 序列化大小（pickle 一组 Document(page_content=摘要, metadata=...)，与 index.pkl 相同）
+
+用法（在 smart_file_system 的上一级目录执行）:
+    python -m smart_file_system.benchmarks.bench_file_info --files 100000 --json file_info.json
+"""
+import argparse
+import gc
+import json
+import pickle
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from langchain_core.documents import Document
+
+from ..data_structures.file_info import FileInfo
+
+
+class LegacyFileInfo:
+    """改动前的 FileInfo（每个实例带 __dict__ 与 metadata / content 两个字典），仅用于对比"""
+
+    def __init__(self, path, name, ext, ftype, size, created_at=None, modified_at=None, text_summary=None):
+        self.file_id = str(uuid.uuid4())
+        self.path = path
+        self.name = name
+        self.ext = ext
+        self.type = ftype
+        self.metadata = {
+            "size": size,
+            "created_at": created_at or datetime.now().isoformat(),
+            "modified_at": modified_at or datetime.now().isoformat()
+        }
+        self.content = {
+            "text_summary": text_summary,
+            "image_features": None,
+            "audio_transcript": None,
+            "video_keyframes": None
+        }
+        self.embedding = None
+        self.candidates = []
+        self.final_label = None
+        self.feedback = None
+
+    def to_dict(self):
+        return {
+            "file_id": self.file_id,
+            "path": self.path,
+            "name": self.name,
+            "ext": self.ext,
+            "type": self.type,
+            "metadata": self.metadata,
+            "content": self.content,
+            "embedding": self.embedding,
+            "candidates": self.candidates,
+            "final_label": self.final_label,
+            "feedback": self.feedback
+        }
+
+
+def make(cls, n):
+    files = []
+    for i in range(n):
+        f = cls(f"/data/docs/{i // 1000}/report-{i}.pdf", f"report-{i}.pdf", "pdf", "document", 10_000 + i,
+                created_at="2025-01-01T00:00:00", modified_at="2025-06-01T00:00:00",
+                text_summary=f"第 {i} 份季度报告的摘要：收入、成本与主要风险。" * 4)
+        f.candidates = ["report", "invoice", "other"]
+        f.final_label = "report"
+        files.append(f)
+    return files
+
+
+def measure(cls, n, to_meta):
+    gc.collect()
+    tracemalloc.start()
+    files = make(cls, n)
+    objects_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    docs = {str(i): Document(page_content=f.content["text_summary"], metadata=to_meta(f)) for i, f in enumerate(files)}
+    docstore_bytes = len(pickle.dumps(docs))
+    return {"objects_mb": round(objects_bytes / 2 ** 20, 1), "docstore_pickle_mb": round(docstore_bytes / 2 ** 20, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args(argv)
+
+    report = {
+        "files": args.files,
+        "legacy": measure(LegacyFileInfo, args.files, lambda f: f.to_dict()),
+        "slots": measure(FileInfo, args.files, lambda f: f.to_index_metadata(lean=True)),
+    }
+    for key in ("objects_mb", "docstore_pickle_mb"):
+        before, after = report["legacy"][key], report["slots"][key]
+        report[f"{key}_saved_pct"] = round(100 * (before - after) / before, 1) if before else 0.0
+        print(f"{key:20s} legacy={before:8.1f}MB slots={after:8.1f}MB saved={report[f'{key}_saved_pct']:.1f}%")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+过滤检索基准：比较 EmbeddingManager 的
+  - 无过滤检索
+  - 预过滤（search(filters=...)，索引内 ID 选择器）
+  - 后过滤（多取 k * overfetch 条再在 Python 里筛选，旧做法）
+的延迟与召回率（以子集上的精确检索为基准）。向量为确定性的随机向量，不需要模型。
+
+用法（在 smart_file_system 的上一级目录执行）:
+    python -m smart_file_system.benchmarks.bench_filtered_search --files 50000 --dim 256 --json filtered.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ..data_structures.file_info import FileInfo
+from ..subsystems.embedding_manager import EmbeddingManager
+from ..utils.fake_embeddings import HashEmbeddings
+
+
+# 名称（含大致选择率） -> 过滤条件
+CASES = {
+    "label=1%": {"label": "label-7"},
+    "ext=10%": {"ext": "e3"},
+    "type=50%": {"type": "document"},
+    "ext+date": {"ext": "e3", "modified_after": "2025-07-01"},
+}
+
+
+def make_files(n):
+    files = []
+    for i in range(n):
+        f = FileInfo(f"/bench/{i}.e{i % 10}", f"{i}.e{i % 10}", f"e{i % 10}",
+                     "document" if i % 2 else "image", 1000 + i,
+                     modified_at=f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00",
+                     text_summary=f"synthetic summary {i}")
+        f.final_label = f"label-{i % 100}"
+        files.append(f)
+    return files
+
+
+def timed(fn, queries):
+    latencies = []
+    results = []
+    for q in queries:
+        t = time.perf_counter()
+        results.append(fn(q))
+        latencies.append(time.perf_counter() - t)
+    return results, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=10, help="后过滤时多取的倍数")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args(argv)
+
+    embeddings = HashEmbeddings(args.dim)
+    files = make_files(args.files)
+    report = {"files": args.files, "dim": args.dim, "k": args.k, "cases": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        em = EmbeddingManager(os.path.join(tmp, "faiss_index"), persist_mode="sync", embeddings=embeddings,
+                              embedding_cache_path=False)
+        t = time.perf_counter()
+        em.build_index(files)
+        report["build_s"] = round(time.perf_counter() - t, 3)
+
+        index = em.vectorstore.index
+        all_ids = np.array(sorted(em.vectorstore.index_to_docstore_id), dtype=np.int64)
+        all_vectors = np.stack([index.reconstruct(int(i)) for i in all_ids])
+        queries = [np.asarray(embeddings.embed_query(f"query {i}"), dtype=np.float32) for i in range(args.queries)]
+
+        _, lat = timed(lambda q: em._search_by_vector(q, args.k), queries)
+        report["unfiltered_ms"] = round(statistics.median(lat) * 1000, 3)
+        print(f"{'unfiltered':12s} p50={report['unfiltered_ms']:.3f}ms")
+
+        for name, filters in CASES.items():
+            subset = np.array(sorted(em._matching_ids(filters)), dtype=np.int64)
+            pos = np.searchsorted(all_ids, subset)
+            sub_vectors = all_vectors[pos]
+
+            def exact(q):
+                d = ((sub_vectors - q) ** 2).sum(axis=1)
+                return set(subset[np.argsort(d)[:args.k]].tolist())
+
+            truth = [exact(q) for q in queries]
+            pre, pre_lat = timed(lambda q: em._search_by_vector(q, args.k, filters), queries)
+            post_hits, post_lat = timed(lambda q: em._search_by_vector(q, args.k * args.overfetch), queries)
+
+            id_of = {doc_id: int_id for int_id, doc_id in em.vectorstore.index_to_docstore_id.items()}
+            allowed = set(subset.tolist())
+
+            def recall(results, post=False):
+                values = []
+                for hits, gt in zip(results, truth):
+                    ids = [id_of[doc.id] for doc, _ in hits]
+                    if post:
+                        ids = [i for i in ids if i in allowed][:args.k]
+                    values.append(len(set(ids) & gt) / max(len(gt), 1))
+                return round(statistics.mean(values), 4)
+
+            entry = {
+                "matched": int(len(subset)),
+                "prefilter_ms": round(statistics.median(pre_lat) * 1000, 3),
+                "prefilter_recall": recall(pre),
+                "postfilter_ms": round(statistics.median(post_lat) * 1000, 3),
+                "postfilter_recall": recall(post_hits, post=True),
+            }
+            report["cases"][name] = entry
+            print(f"{name:12s} matched={entry['matched']:7d} "
+                  f"pre p50={entry['prefilter_ms']:.3f}ms recall={entry['prefilter_recall']:.3f}  "
+                  f"post(x{args.overfetch}) p50={entry['postfilter_ms']:.3f}ms recall={entry['postfilter_recall']:.3f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
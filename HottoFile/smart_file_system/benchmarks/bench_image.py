@@ -0,0 +1,158 @@
+"""
+图片解析基准：比较三种图片处理方式的单张延迟（p50 / p99）、CPU 时间（含 tesseract 子进程）、
+视觉模型请求数与请求体大小：
+  - legacy      旧做法：原图整张 OCR，然后把原文件交给视觉模型，串行
+  - concurrent  FileParser(image_strategy="concurrent")：解码一次、分别缩放，OCR 与视觉模型同时进行
+  - ocr_first   FileParser(image_strategy="ocr_first")：先 OCR，文字足够时跳过视觉模型
+语料为合成的手机照片（横向 JPEG，少量文字）和扫描件（纵向 JPEG，整页文字），视觉模型为带固定延迟的假 Ollama 服务。
+
+没有安装 tesseract 时必须用 --fake-ocr-ms-per-mpix 模拟 OCR：按像素数休眠（tesseract 在子进程中运行，
+不占用本进程 CPU），扫描件（纵向）返回整页文字，照片返回少量文字。
+
+用法（在 smart_file_system 的上一级目录执行）:
+    python -m smart_file_system.benchmarks.bench_image --images 10 --vlm-latency 0.8 --json image.json
+    python -m smart_file_system.benchmarks.bench_image --fake-ocr-ms-per-mpix 150
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from ..subsystems.file_parser import IMAGE_PROMPT, FileParser
+from ..subsystems.llm_client import OllamaHTTPBackend
+from ..utils.fake_ollama import FakeOllamaServer
+from ..utils.synthetic_corpus import TOPICS
+
+MODES = ("legacy", "concurrent", "ocr_first")
+
+
+def make_images(root, n, photo_size, scan_size, seed=0):
+    """生成 n 张照片和 n 张扫描件，返回 [(路径, 类别)]"""
+    from PIL import Image, ImageDraw, ImageFont
+    rng = random.Random(seed)
+    words = [w for topic_words in TOPICS.values() for w in topic_words]
+    images = []
+    for kind, (width, height) in (("photo", photo_size), ("scan", scan_size)):
+        font = ImageFont.load_default(size=max(12, height // 60))
+        for i in range(n):
+            if kind == "photo":
+                # 渐变背景 + 噪声，近似照片的压缩特性
+                image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+                image = Image.blend(image, Image.effect_noise((width, height), 40).convert("RGB"), 0.3)
+                lines = 2
+            else:
+                image = Image.new("RGB", (width, height), "white")
+                lines = 50
+            draw = ImageDraw.Draw(image)
+            step = height // (lines + 2)
+            for row in range(lines):
+                text = " ".join(rng.choice(words) for _ in range(8))
+                draw.text((width // 20, step * (row + 1)), text, fill="black", font=font)
+            path = os.path.join(root, f"{kind}-{i}.jpg")
+            image.save(path, quality=90)
+            images.append((path, kind))
+    return images
+
+
+def fake_ocr(ms_per_mpix):
+    """
+    按像素数休眠的假 OCR；纵向图片（扫描件）返回整页文字，横向（照片）返回少量文字。
+    和 pytesseract 一样会先把图片解码（计入本进程 CPU）。
+    """
+    def image_to_string(image, *args, **kwargs):
+        image.load()
+        time.sleep(image.width * image.height / 1e6 * ms_per_mpix / 1000)
+        return ("lorem ipsum " * 80) if image.height > image.width else "IMG 2024"
+    return image_to_string
+
+
+def legacy_parse(parser, path):
+    """改动前 FileParser 的图片路径：整张原图 OCR，再把原文件交给视觉模型"""
+    import pytesseract
+    from PIL import Image
+    ocr_text = pytesseract.image_to_string(Image.open(path))
+    image_desc = parser._call_ollama(IMAGE_PROMPT, image=path)
+    return f"OCR文本：{ocr_text}\n视觉模型描述：{image_desc}"
+
+
+def cpu_seconds():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=10, help="照片和扫描件各多少张")
+    parser.add_argument("--photo-size", type=int, nargs=2, default=[4032, 3024])
+    parser.add_argument("--scan-size", type=int, nargs=2, default=[2480, 3508])
+    parser.add_argument("--vlm-latency", type=float, default=0.8, help="假视觉模型每次调用的耗时（秒）")
+    parser.add_argument("--fake-ocr-ms-per-mpix", type=float, default=None,
+                        help="用按像素休眠的假 OCR 代替 tesseract（每百万像素的毫秒数）")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args(argv)
+
+    if args.fake_ocr_ms_per_mpix is not None:
+        import pytesseract
+        pytesseract.image_to_string = fake_ocr(args.fake_ocr_ms_per_mpix)
+        ocr_engine = f"fake ({args.fake_ocr_ms_per_mpix} ms/Mpix)"
+    elif shutil.which("tesseract"):
+        ocr_engine = "tesseract"
+    else:
+        parser.error("没有找到 tesseract，请安装或使用 --fake-ocr-ms-per-mpix")
+
+    report = {"images_per_kind": args.images, "ocr": ocr_engine, "vlm_latency_s": args.vlm_latency, "modes": {}}
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOllamaServer(responder=lambda model, prompt, images: "A document photo.",
+                             latency=args.vlm_latency) as server:
+        images = make_images(tmp, args.images, tuple(args.photo_size), tuple(args.scan_size))
+        client = OllamaHTTPBackend(base_url=server.url)
+        for mode in args.modes:
+            file_parser = FileParser(llm_client=client, image_strategy="ocr_first" if mode == "ocr_first" else "concurrent")
+            server.requests.clear()
+            entry = {}
+            for kind in ("photo", "scan"):
+                latencies = []
+                cpu = []
+                for path, image_kind in images:
+                    if image_kind != kind:
+                        continue
+                    c, t = cpu_seconds(), time.perf_counter()
+                    if mode == "legacy":
+                        legacy_parse(file_parser, path)
+                    else:
+                        file_parser.parse_file(path)
+                    latencies.append(time.perf_counter() - t)
+                    cpu.append(cpu_seconds() - c)
+                entry[kind] = {
+                    "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+                    "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                    "cpu_ms": round(sum(cpu) / len(cpu) * 1000, 1),
+                }
+            payloads = [len(img) for req in server.requests for img in (req.get("images") or [])]
+            entry["vlm_requests"] = len(payloads)
+            entry["vlm_payload_kb"] = round(sum(payloads) / len(payloads) / 1024, 1) if payloads else 0
+            report["modes"][mode] = entry
+            file_parser.close()
+            print(f"{mode:10s} " + "  ".join(
+                f"{kind}: p50={entry[kind]['p50_ms']:.0f}ms p99={entry[kind]['p99_ms']:.0f}ms cpu={entry[kind]['cpu_ms']:.0f}ms"
+                for kind in ("photo", "scan")) + f"  vlm={entry['vlm_requests']} x {entry['vlm_payload_kb']:.0f}KB")
+        client.close()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+启动耗时基准：在全新的解释器中测量各子系统的导入时间和 EmbeddingManager 构造时间，
+并检查重量级依赖没有被提前导入。
+
+用法（在 smart_file_system 的上一级目录执行）:
+    python -m smart_file_system.benchmarks.bench_startup --repeat 5 --json startup.json
+    python -m smart_file_system.benchmarks.bench_startup --max-seconds 1.5   # 超过阈值返回非零，用于 CI
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 测量目标 -> 执行后不应出现在 sys.modules 中的模块
+TARGETS = {
+    "import:subsystems.file_parser": (
+        "import smart_file_system.subsystems.file_parser",
+        ["pytesseract", "PIL", "pdfplumber", "docx", "pptx", "openpyxl"],
+    ),
+    "import:subsystems.classifier": (
+        "import smart_file_system.subsystems.classifier",
+        [],
+    ),
+    "import:subsystems.embedding_manager": (
+        "import smart_file_system.subsystems.embedding_manager",
+        ["sentence_transformers", "transformers", "torch"],
+    ),
+    "construct:EmbeddingManager": (
+        "from smart_file_system.subsystems.embedding_manager import EmbeddingManager\n"
+        "EmbeddingManager(persist_path={persist_path!r}, persist_mode='sync')",
+        ["sentence_transformers", "transformers", "torch"],
+    ),
+}
+
+_PROBE = """
+import sys, time, json
+t = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def run_once(code, forbidden):
+    script = _PROBE.format(code=code, forbidden=forbidden)
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=PACKAGE_ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=None, help="任一目标的中位数超过该值即视为回归")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args(argv)
+
+    report = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        persist_path = os.path.join(tmp, "faiss_index")
+        for name, (code, forbidden) in TARGETS.items():
+            runs = [run_once(code.format(persist_path=persist_path), forbidden) for _ in range(args.repeat)]
+            seconds = [r["seconds"] for r in runs]
+            loaded = sorted({m for r in runs for m in r["loaded"]})
+            entry = {
+                "median_s": round(statistics.median(seconds), 4),
+                "min_s": round(min(seconds), 4),
+                "eagerly_loaded": loaded,
+            }
+            report[name] = entry
+            status = "OK"
+            if loaded or (args.max_seconds is not None and entry["median_s"] > args.max_seconds):
+                status = "REGRESSION"
+                failed = True
+            print(f"{name:40s} median={entry['median_s']:.3f}s min={entry['min_s']:.3f}s "
+                  f"eager={loaded or '-'} {status}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
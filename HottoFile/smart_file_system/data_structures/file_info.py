@@ -1,39 +1,91 @@
-
 import json
 import uuid
+from collections.abc import MutableMapping
 from datetime import datetime
-from datetime import datetime
+
+_METADATA_KEYS = ("size", "created_at", "modified_at")
+_CONTENT_KEYS = ("text_summary", "image_features", "audio_transcript", "video_keyframes")
+
+
+class _FieldView(MutableMapping):
+    """把 FileInfo 的若干槽位呈现为字典（file_info.metadata / file_info.content），读写直接作用于对象本身"""
+
+    __slots__ = ("_owner", "_keys")
+
+    def __init__(self, owner, keys):
+        self._owner = owner
+        self._keys = keys
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self._owner, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            raise KeyError(key)
+        setattr(self._owner, key, value)
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return repr(dict(self))
+
 
 class FileInfo:
-    def __init__(self, path, name, ext, ftype, size, created_at=None, modified_at=None, 
-                 text_summary=None, image_features=None, audio_transcript=None, video_keyframes=None):
+    # 使用 __slots__：每个实例不再带 __dict__ 和两个嵌套字典，10 万级文件时内存明显更小
+    __slots__ = ("file_id", "path", "name", "ext", "type",
+                 "size", "created_at", "modified_at",
+                 "text_summary", "image_features", "audio_transcript", "video_keyframes",
+                 "embedding", "candidates", "final_label", "feedback", "catalog_id", "content_hash")
+
+    def __init__(self, path, name, ext, ftype, size, created_at=None, modified_at=None,
+                 text_summary=None, image_features=None, audio_transcript=None, video_keyframes=None,
+                 file_id=None):
         # 基础信息
-        self.file_id = str(uuid.uuid4())  # 自动生成唯一ID
+        self.file_id = file_id or str(uuid.uuid4())  # 未指定时自动生成唯一ID
         self.path = path
         self.name = name
         self.ext = ext
         self.type = ftype  # "document" / "image" / "audio" / "video" / "other"
 
         # 元信息
-        self.metadata = {
-            "size": size,
-            "created_at": created_at or datetime.now().isoformat(),
-            "modified_at": modified_at or datetime.now().isoformat()
-        }
+        self.size = size
+        self.created_at = created_at or datetime.now().isoformat()
+        self.modified_at = modified_at or datetime.now().isoformat()
 
         # 内容
-        self.content = {
-            "text_summary": text_summary,
-            "image_features": image_features,
-            "audio_transcript": audio_transcript,
-            "video_keyframes": video_keyframes
-        }
+        self.text_summary = text_summary
+        self.image_features = image_features
+        self.audio_transcript = audio_transcript
+        self.video_keyframes = video_keyframes
 
         # Embedding & 分类信息
         self.embedding = None
         self.candidates = []
         self.final_label = None
         self.feedback = None
+        # FileCatalog 中的行 id（也是向量 ID），未登记时为 None
+        self.catalog_id = None
+        # 解析时算出的文件内容 sha256（登记 FileManifest 时复用），未计算时为 None
+        self.content_hash = None
+
+    # 元信息字典 { "size", "created_at", "modified_at" }
+    @property
+    def metadata(self):
+        return _FieldView(self, _METADATA_KEYS)
+
+    # 内容字典 { "text_summary", "image_features", "audio_transcript", "video_keyframes" }
+    @property
+    def content(self):
+        return _FieldView(self, _CONTENT_KEYS)
 
     # 转换成字典
     def to_dict(self):
@@ -43,13 +95,60 @@ class FileInfo:
             "name": self.name,
             "ext": self.ext,
             "type": self.type,
-            "metadata": self.metadata,
-            "content": self.content,
-            "embedding": self.embedding,
+            "metadata": dict(self.metadata),
+            "content": dict(self.content),
+            "embedding": self.embedding.tolist() if hasattr(self.embedding, "tolist") else self.embedding,
             "candidates": self.candidates,
             "final_label": self.final_label,
-            "feedback": self.feedback
+            "feedback": self.feedback,
+            "content_hash": self.content_hash
+        }
+
+    # 向量库中每个向量附带的元数据：摘要就是 Document.page_content，不再重复存放；embedding 不存。
+    # lean=True（启用了 FileCatalog）时只保留检索与过滤用的字段，完整记录通过 file_id / catalog_id
+    # 到 FileCatalog 中取；否则向量库是唯一的存放处，created_at、candidates 和其它内容字段也一并保存
+    def to_index_metadata(self, lean=False):
+        meta = {
+            "file_id": self.file_id,
+            "path": self.path,
+            "name": self.name,
+            "ext": self.ext,
+            "type": self.type,
+            "size": self.size,
+            "modified_at": self.modified_at,
+            "final_label": self.final_label,
+            "feedback": self.feedback,
         }
+        if self.catalog_id is not None:
+            meta["catalog_id"] = self.catalog_id
+        if not lean:
+            meta["created_at"] = self.created_at
+            meta["candidates"] = list(self.candidates)
+            meta["content"] = {key: getattr(self, key) for key in _CONTENT_KEYS if key != "text_summary"}
+        return meta
+
+    # 从 to_dict() 或 to_index_metadata() 的结果还原
+    @classmethod
+    def from_dict(cls, data):
+        metadata = data.get("metadata") or {}
+        content = data.get("content") or {}
+        info = cls(
+            data.get("path"), data.get("name"), data.get("ext"), data.get("type"),
+            metadata.get("size", data.get("size")),
+            created_at=metadata.get("created_at", data.get("created_at")),
+            modified_at=metadata.get("modified_at", data.get("modified_at")),
+            file_id=data.get("file_id"),
+        )
+        for key in _CONTENT_KEYS:
+            if key in content:
+                setattr(info, key, content[key])
+        info.embedding = data.get("embedding")
+        info.candidates = list(data.get("candidates") or [])
+        info.final_label = data.get("final_label")
+        info.feedback = data.get("feedback")
+        info.catalog_id = data.get("catalog_id")
+        info.content_hash = data.get("content_hash")
+        return info
 
     # 转换成JSON
     def to_json(self):
@@ -61,4 +160,3 @@ class FileInfo:
             self.feedback = label
         else:
             self.final_label = label
-      # 内容字典 { "text_summary": "...", "ocr_text": "..." }
@@ -63,6 +63,17 @@ class DummyLLM:
 
 # ===== Usage =====
 if __name__ == "__main__":
+    import os
+    import sys
+
+    # 批量导入：python -m smart_file_system.main ingest <目录> [选项]（--help 查看全部选项）
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        if not __package__:
+            # 以脚本方式运行（python smart_file_system/main.py）时按包导入子系统
+            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from smart_file_system.subsystems.bulk_ingest import main as ingest_main
+        sys.exit(ingest_main(sys.argv[2:]))
+
     fm = FeedbackManager()
     llm = DummyLLM()
     clf = Classifier(llm, fm)
@@ -0,0 +1,177 @@
+import faiss
+import numpy as np
+
+# 支持的索引类型：
+#   flat      精确检索（IndexIDMap2 + IndexFlat），小规模默认
+#   sq8       8 bit 标量量化（IndexIDMap2 + IndexScalarQuantizer），内存约为 flat 的 1/4
+#   hnsw      HNSW 图（IndexIDMap2 + IndexHNSWFlat），不支持删除，用墓碑标记
+#   ivf_flat  倒排 + 原始向量（IndexIVFFlat，直接使用外部 ID）
+#   ivf_pq    倒排 + 乘积量化（IndexIVFPQ），内存最小
+INDEX_TYPES = ("flat", "sq8", "hnsw", "ivf_flat", "ivf_pq")
+
+DEFAULT_INDEX_PARAMS = {
+    "hnsw_m": 32,
+    "ef_construction": 80,
+    "ef_search": 64,
+    "nlist": None,          # None：按 4 * sqrt(n) 自动选择
+    "nprobe": 16,
+    "pq_m": None,           # None：取能整除维度、不超过 64 的最大子空间数
+    "pq_nbits": 8,
+    "tombstone_ratio": 0.2,  # HNSW 墓碑超过该比例时重建
+}
+
+# HNSW 被删除的向量把外部 ID 改写为负数（-2 - 位置），检索时用该选择器排除
+_LIVE_IDS = faiss.IDSelectorRange(0, 2 ** 62)
+
+
+def index_params(params=None):
+    merged = dict(DEFAULT_INDEX_PARAMS)
+    merged.update(params or {})
+    return merged
+
+
+def index_kind(index):
+    """识别已有索引的类型（INDEX_TYPES 之一）"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+
+def min_train_size(index_type, params=None, n=0):
+    """该类型训练至少需要的向量数（flat / hnsw 不需要训练）"""
+    params = index_params(params)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return 39 * _nlist(params, n)
+    if index_type == "sq8":
+        return 1
+    return 0
+
+
+def _nlist(params, n):
+    if params["nlist"]:
+        return int(params["nlist"])
+    return int(min(65536, max(16, 4 * np.sqrt(max(n, 1)))))
+
+
+def _pq_m(params, dim):
+    if params["pq_m"]:
+        return int(params["pq_m"])
+    return max(m for m in range(1, min(dim, 64) + 1) if dim % m == 0)
+
+
+def new_index(index_type, dim, metric=faiss.METRIC_L2, params=None, n=0):
+    """建立空索引（尚未训练）；n 为预计的向量数，用于选择 nlist"""
+    params = index_params(params)
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlat(dim, metric))
+    if index_type == "sq8":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, metric))
+    if index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, params["hnsw_m"], metric)
+        base.hnsw.efConstruction = params["ef_construction"]
+        return faiss.IndexIDMap2(base)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        quantizer = faiss.IndexFlat(dim, metric)
+        nlist = _nlist(params, n)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(params, dim), params["pq_nbits"], metric)
+        # 支持按外部 ID 取回向量和删除
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+    raise ValueError(f"未知的索引类型: {index_type}（可选 {', '.join(INDEX_TYPES)}）")
+
+
+def build_index(index_type, vectors, ids, metric=faiss.METRIC_L2, params=None, train_size=None):
+    """用给定向量建立并训练索引"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    index = new_index(index_type, vectors.shape[1], metric, params, n=len(vectors))
+    if not index.is_trained:
+        sample = vectors
+        limit = train_size or 256 * _nlist(index_params(params), len(vectors))
+        if len(vectors) > limit:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), limit, replace=False)]
+        index.train(sample)
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def get_vectors(index, ids):
+    """按外部 ID 取回已存向量（量化索引返回的是解码后的近似向量）；ID 不存在（含 HNSW 墓碑）时抛出 KeyError"""
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if isinstance(index, faiss.IndexIDMap):
+        id_map = faiss.vector_to_array(index.id_map)
+        order = np.argsort(id_map, kind="stable")
+        sorted_ids = id_map[order]
+        slots = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        missing = ids[sorted_ids[slots] != ids] if len(sorted_ids) else ids
+        if len(missing):
+            raise KeyError(f"索引中没有这些向量 ID: {missing[:10].tolist()}")
+        positions = order[slots]
+        base = faiss.downcast_index(index.index)
+        if len(positions) < 1024:
+            return np.stack([base.reconstruct(int(p)) for p in positions])
+        return base.reconstruct_n(0, base.ntotal)[positions]
+    return np.stack([index.reconstruct(int(i)) for i in ids])
+
+
+def remove_ids(index, ids):
+    """删除向量；HNSW 不支持删除，改为把这些位置的外部 ID 改写成负数墓碑"""
+    ids = np.asarray(ids, dtype=np.int64)
+    if index_kind(index) != "hnsw":
+        return index.remove_ids(ids)
+    id_map = faiss.rev_swig_ptr(index.id_map.data(), index.id_map.size())
+    positions = np.nonzero(np.isin(id_map, ids))[0]
+    id_map[positions] = -2 - positions
+    return len(positions)
+
+
+def tombstone_count(index):
+    if index_kind(index) != "hnsw":
+        return 0
+    return int((faiss.vector_to_array(index.id_map) < 0).sum())
+
+
+def search_params(index, selector=None, params=None, has_tombstones=False):
+    """
+    按索引类型构造 SearchParameters（HNSW 的 efSearch、IVF 的 nprobe，以及 ID 选择器）。
+    调用方需要在检索结束前持有 selector 的引用。
+    """
+    params = index_params(params)
+    kind = index_kind(index)
+    if kind == "hnsw":
+        # 过滤条件只包含存活的 ID；没有过滤时需要排除墓碑
+        if selector is None and has_tombstones:
+            selector = _LIVE_IDS
+        sp = faiss.SearchParametersHNSW(efSearch=params["ef_search"])
+    elif kind in ("ivf_flat", "ivf_pq"):
+        sp = faiss.SearchParametersIVF(nprobe=params["nprobe"])
+    elif selector is None:
+        return None
+    else:
+        sp = faiss.SearchParameters()
+    if selector is not None:
+        sp.sel = selector
+    return sp
+
+
+def read_index(path, mmap=False):
+    """读取索引；mmap=True 时以只读方式内存映射向量数据，不支持时退回普通读取"""
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except (RuntimeError, AttributeError) as e:
+            print(f"⚠️ 无法内存映射索引，改为完整读取: {e}")
+    return faiss.read_index(path)
@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ..data_structures.file_info import FileInfo
+from ..utils import metrics
+from .file_parser import IMAGE_EXTS, SUMMARY_PROMPTS
+from .reconciler import Reconciler
+
+SUPPORTED_EXTS = frozenset(list(SUMMARY_PROMPTS) + IMAGE_EXTS)
+
+
+class BulkIngester:
+    """
+    首次导入整个目录树：
+
+        扫描 → [解析+摘要: 线程池] → [分类: 按候选集合并 LLM 调用] → 检查点 → EmbeddingManager.bulk_load
+
+    - 每个文件只 embedding 一次（分类时算出的向量直接写入索引），按批写入内存索引，
+      后面批次的 kNN 分类能用上前面的结果；整个导入只在结束时保存一次索引
+    - 分类完成的文件追加写入检查点（checkpoint_dir/done.jsonl），中断后再次运行会跳过这些文件，
+      并从检查点重建索引（摘要不再调用 LLM，向量命中 EmbeddingCache）
+    - 定期打印进度、速度与预计剩余时间
+
+    用法:
+        ingester = BulkIngester(parser, classifier, embedding_manager, "faiss_index.bulk")
+        ingester.run("/mnt/share")
+    """
+
+    def __init__(self, parser, classifier, embedding_manager, checkpoint_dir, manifest=None, workers=4,
+                 batch_size=256, classify_batch_size=8, progress_interval=10.0):
+        """
+        :param parser: FileParser
+        :param classifier: Classifier，为 None 时只做规则分类
+        :param embedding_manager: EmbeddingManager
+        :param checkpoint_dir: 检查点目录，导入成功后删除
+        :param manifest: 可选的 FileManifest；索引保存后登记所有导入的文件
+        :param workers: 并行解析的线程数（LLM 并发仍受客户端按模型的上限约束）
+        :param batch_size: 每批分类、写入检查点与索引的文件数
+        :param classify_batch_size: 每次 LLM 分类调用包含的文件数
+        :param progress_interval: 进度输出间隔（秒）
+        """
+        self.parser = parser
+        self.classifier = classifier
+        self.embedding_manager = embedding_manager
+        self.checkpoint_dir = checkpoint_dir
+        self.manifest = manifest
+        self.workers = workers
+        self.batch_size = batch_size
+        self.classify_batch_size = classify_batch_size
+        self.progress_interval = progress_interval
+        self.stats = {"scanned": 0, "resumed": 0, "parsed": 0, "failed": 0, "indexed": 0}
+        self._started = None
+        self._last_report = 0.0
+        self._todo = 0
+        self._lock = threading.Lock()
+
+    # ---------- 检查点 ----------
+    @property
+    def _done_path(self):
+        return os.path.join(self.checkpoint_dir, "done.jsonl")
+
+    @property
+    def _failed_path(self):
+        return os.path.join(self.checkpoint_dir, "failed.jsonl")
+
+    def _open_checkpoint(self, root, retry_failed):
+        """返回 (已完成的路径集合, 应跳过的失败路径集合)；检查点属于其它目录时报错"""
+        meta_path = os.path.join(self.checkpoint_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("root") != root:
+                raise ValueError(f"检查点 {self.checkpoint_dir} 属于另一次导入（{meta.get('root')}），"
+                                 f"请换一个检查点目录或先删除它")
+        else:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"root": root, "started_at": time.time()}, f)
+        done = {record["path"] for record in _read_jsonl(self._done_path)}
+        failed = set() if retry_failed else {record["path"] for record in _read_jsonl(self._failed_path)}
+        return done, failed
+
+    @staticmethod
+    def _append(path, records):
+        """追加一批记录并落盘；崩溃时最多留下一行写了一半的记录，读取时会被跳过"""
+        with open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _resumed_batches(self):
+        batch = []
+        for record in _read_jsonl(self._done_path):
+            batch.append(FileInfo.from_dict(record))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # ---------- 导入 ----------
+    def scan(self, root):
+        """并行遍历目录树，返回支持的文件路径（排序，便于断点续传时顺序一致）"""
+        found = Reconciler(manifest=None, workers=self.workers).scan(root)
+        return sorted(p for p in found if os.path.splitext(p)[1].lower().lstrip(".") in SUPPORTED_EXTS)
+
+    def run(self, root, replace=True, retry_failed=False):
+        """
+        导入 root 下所有支持的文件，返回统计信息。
+        :param replace: True 时替换现有索引；False 时追加（同一 file_id 覆盖）
+        :param retry_failed: 是否重试检查点中记录为失败的文件
+        """
+        root = os.path.abspath(root)
+        done, failed = self._open_checkpoint(root, retry_failed)
+        paths = self.scan(root)
+        self.stats["scanned"] = len(paths)
+        self.stats["resumed"] = len(done)
+        todo = [p for p in paths if p not in done and p not in failed]
+        self._todo = len(todo)
+        print(f"📂 {root}: 共 {len(paths)} 个文件，检查点中已完成 {len(done)} 个，"
+              f"跳过失败 {len(failed)} 个，待处理 {len(todo)} 个")
+
+        self._started = time.monotonic()
+        self._last_report = self._started
+
+        def batches():
+            yield from self._resumed_batches()
+            yield from self._new_batches(todo)
+
+        self.stats["indexed"] = self.embedding_manager.bulk_load(batches(), replace=replace)
+        self._report(force=True)
+
+        if self.manifest is not None:
+            self._record_manifest()
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        print(f"✅ 导入完成：{self.stats['indexed']} 个向量，用时 {_fmt_duration(time.monotonic() - self._started)}，"
+              f"失败 {self.stats['failed']} 个")
+        return dict(self.stats)
+
+    def _new_batches(self, paths):
+        """并行解析，按完成顺序凑批；每批分类后写入检查点再交给索引"""
+        batch = []
+        pending = set()
+        todo = iter(paths)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-parse") as pool:
+            # 只保持有限个在途任务，不为上百万个文件一次性创建 future；
+            # 窗口大于一批，分类和写索引期间解析线程仍有活可干
+            window = self.batch_size + self.workers * 4
+            for path in todo:
+                pending.add(pool.submit(self._parse, path))
+                if len(pending) >= window:
+                    break
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    file_info = fut.result()
+                    if file_info is not None:
+                        batch.append(file_info)
+                    next_path = next(todo, None)
+                    if next_path is not None:
+                        pending.add(pool.submit(self._parse, next_path))
+                if len(batch) >= self.batch_size:
+                    yield self._finish_batch(batch)
+                    batch = []
+                self._report()
+        if batch:
+            yield self._finish_batch(batch)
+
+    def _parse(self, path):
+        file_info = None
+        try:
+            file_info = self.parser.parse_file(path)
+        except Exception as e:
+            print(f"⚠️ 解析失败 {path}: {e}")
+        with self._lock:
+            if file_info is None:
+                self.stats["failed"] += 1
+                self._append(self._failed_path, [{"path": path}])
+            else:
+                self.stats["parsed"] += 1
+        metrics.inc("sfs_bulk_files_total", status="failed" if file_info is None else "parsed")
+        return file_info
+
+    def _finish_batch(self, batch):
+        if self.classifier is not None:
+            self.classifier.classify_many(batch, self.embedding_manager, max_batch_size=self.classify_batch_size)
+        records = []
+        for f in batch:
+            record = f.to_dict()
+            # 向量不进检查点：续传时由 EmbeddingCache 直接给出
+            record["embedding"] = None
+            records.append(record)
+        self._append(self._done_path, records)
+        return batch
+
+    def _record_manifest(self):
+        """索引保存后再登记清单；内容哈希用解析时算出的（未启用解析缓存时为 None，对账时 stat 变化即视为修改）"""
+        rows = []
+        for record in _read_jsonl(self._done_path):
+            try:
+                st = os.stat(record["path"])
+            except OSError:
+                continue
+            rows.append((record["path"], record["file_id"], st.st_size, st.st_mtime_ns, st.st_ino,
+                         record.get("content_hash")))
+            if len(rows) >= 10_000:
+                self.manifest.record_many(rows)
+                rows = []
+        if rows:
+            self.manifest.record_many(rows)
+
+    def _report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        processed = self.stats["parsed"] + self.stats["failed"]
+        elapsed = now - self._started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = (self._todo - processed) / rate if rate else None
+        percent = processed / self._todo * 100 if self._todo else 100.0
+        metrics.set_gauge("sfs_bulk_progress_ratio", percent / 100)
+        print(f"📦 {processed}/{self._todo} ({percent:.1f}%)  {rate:.1f} files/s  "
+              f"已用 {_fmt_duration(elapsed)}  剩余 {_fmt_duration(eta) if eta is not None else '?'}  "
+              f"失败 {self.stats['failed']}")
+
+
+def _read_jsonl(path):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 崩溃时写了一半的最后一行
+                continue
+
+
+def _fmt_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+# ---------- 命令行 ----------
+def add_arguments(parser):
+    parser.add_argument("root", help="要导入的目录")
+    parser.add_argument("--index", default="faiss_index", help="向量索引目录")
+    parser.add_argument("--checkpoint", default=None, help="检查点目录，默认 <index>.bulk")
+    parser.add_argument("--append", action="store_true", help="追加到现有索引（默认替换）")
+    parser.add_argument("--retry-failed", action="store_true", help="重试上次失败的文件")
+    parser.add_argument("--workers", type=int, default=4, help="并行解析的线程数")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="每个模型同时进行的请求数")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批分类与写入索引的文件数")
+    parser.add_argument("--classify-batch-size", type=int, default=8, help="每次 LLM 分类调用包含的文件数")
+    parser.add_argument("--index-type", default="flat", help="导入完成后使用的索引类型（见 ann_index）")
+    parser.add_argument("--manifest", default=None, help="FileManifest 路径，导入后登记文件")
+    parser.add_argument("--parse-cache", default=None, help="ParseCache 路径，按内容哈希复用解析结果")
+    parser.add_argument("--no-classify", action="store_true", help="只做规则分类，不调用 LLM")
+    parser.add_argument("--progress-interval", type=float, default=10.0)
+    return parser
+
+
+def run_from_args(args):
+    from .classifier import Classifier, OllamaClassifier
+    from .embedding_manager import EmbeddingManager
+    from .file_manifest import FileManifest
+    from .file_parser import FileParser
+    from .llm_client import OllamaHTTPBackend
+
+    client = OllamaHTTPBackend(pool_size=max(8, args.llm_concurrency), default_concurrency=args.llm_concurrency)
+    cache = None
+    if args.parse_cache:
+        from .parse_cache import ParseCache
+        cache = ParseCache(args.parse_cache)
+    parser = FileParser(llm_client=client, cache=cache)
+    classifier = None if args.no_classify else Classifier(OllamaClassifier(llm_client=client))
+    # bulk_load 不写 WAL，结束时只保存一次
+    em = EmbeddingManager(args.index, persist_mode="sync", index_type=args.index_type)
+    manifest = FileManifest(args.manifest) if args.manifest else None
+    ingester = BulkIngester(parser, classifier, em, args.checkpoint or f"{args.index}.bulk", manifest=manifest,
+                            workers=args.workers, batch_size=args.batch_size,
+                            classify_batch_size=args.classify_batch_size, progress_interval=args.progress_interval)
+    try:
+        ingester.run(args.root, replace=not args.append, retry_failed=args.retry_failed)
+    except KeyboardInterrupt:
+        print(f"\n⏸️ 已中断，重新运行同一命令即可从检查点 {ingester.checkpoint_dir} 继续")
+        return 130
+    finally:
+        em.close()
+        parser.close()
+        if manifest is not None:
+            manifest.close()
+        client.close()
+    return 0
+
+
+def main(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(prog="main.py ingest", description="批量导入目录到向量索引"))
+    return run_from_args(parser.parse_args(argv))
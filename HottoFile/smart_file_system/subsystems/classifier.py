@@ -1,9 +1,29 @@
-import subprocess
+import inspect
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Optional
 
+from ..utils import metrics
+from .decision_cache import fewshot_key
+from .llm_client import get_default_client
+
+
 class OllamaClassifier:
-    def __init__(self, model: str = "gemma3:4b"):
+    def __init__(self, model: str = "gemma3:4b", llm_client=None, timeout: Optional[float] = None,
+                 decision_cache=None):
+        """
+        :param model: Ollama 模型名称
+        :param llm_client: LLMBackend 实例，默认使用进程内共享的 HTTP 客户端
+        :param timeout: 单次调用超时（秒）
+        :param decision_cache: 可选的 DecisionCache，相同摘要+候选+few-shot 版本直接复用结果
+        """
         self.model = model
+        self.llm_client = llm_client or get_default_client()
+        self.timeout = timeout
+        self.decision_cache = decision_cache
 
     def _build_prompt(self, text_summary: str, candidate_labels: List[str], fewshot_examples: Optional[List[dict]] = None) -> str:
         """
@@ -22,7 +42,7 @@ class OllamaClassifier:
         if fewshot_examples:
             prompt_parts.append("以下是一些示例（供参考）：")
             for i, ex in enumerate(fewshot_examples, start=1):
-                summary = ex.get("text_summary", "")
+                summary = ex.get("text_summary") or ex.get("summary", "")
                 label = ex.get("correct_label", "")
                 if summary and label:
                     prompt_parts.append(f"示例 {i} 摘要: {summary}")
@@ -43,9 +63,12 @@ class OllamaClassifier:
 
         return "\n".join(prompt_parts)
 
-    def classify(self, file_info, candidate_labels: List[str], fewshot_examples: Optional[List[dict]] = None) -> Optional[str]:
+    def classify(self, file_info, candidate_labels: List[str], fewshot_examples: Optional[List[dict]] = None,
+                 fewshot_version=None) -> Optional[str]:
         """
         使用 Ollama 模型进行分类。
+        :param fewshot_version: few-shot 上下文的版本，作为结果缓存键的一部分；
+                                未提供时由所用示例计算（见 decision_cache.fewshot_key）
         """
         text_summary = file_info.content.get("text_summary", "") or ""
         if not text_summary:
@@ -54,44 +77,400 @@ class OllamaClassifier:
         if "other" not in [c.lower() for c in candidate_labels]:
             candidate_labels = candidate_labels + ["other"]
 
+        cache_key = None
+        if self.decision_cache is not None:
+            if fewshot_version is None:
+                fewshot_version = fewshot_key(fewshot_examples)
+            cache_key = self.decision_cache.make_key(text_summary, candidate_labels, self.model, fewshot_version)
+            cached = self.decision_cache.get(cache_key)
+            metrics.inc("sfs_decision_cache_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+
+        label = self._query_llm(text_summary, candidate_labels, fewshot_examples)
+        if label is not None and cache_key is not None:
+            self.decision_cache.put(cache_key, label, fewshot_version)
+        return label
+
+    def _build_batch_prompt(self, summaries: List[str], candidate_labels: List[str],
+                            fewshot_examples: Optional[List[dict]] = None) -> str:
+        """
+        多篇文档共用一段说明、候选类别和 few-shot 示例：摘要按编号列出，要求输出等长的 JSON 数组。
+        """
+        prompt_parts = []
+        prompt_parts.append("你是一个文档分类助手。请根据每篇文档的摘要，分别从候选类别中选择最合适的一个类别。")
+        prompt_parts.append("")
+
+        if fewshot_examples:
+            prompt_parts.append("以下是一些示例（供参考）：")
+            for i, ex in enumerate(fewshot_examples, start=1):
+                summary = ex.get("text_summary") or ex.get("summary", "")
+                label = ex.get("correct_label", "")
+                if summary and label:
+                    prompt_parts.append(f"示例 {i} 摘要: {summary}")
+                    prompt_parts.append(f"示例 {i} 正确类别: {label}")
+                    prompt_parts.append("")
+
+        prompt_parts.append("候选类别（请从中选择，严格输出其中之一）：")
+        for idx, lab in enumerate(candidate_labels, start=1):
+            prompt_parts.append(f"{idx}. {lab}")
+        prompt_parts.append("")
+
+        prompt_parts.append(f"待分类文档摘要（共 {len(summaries)} 篇，按编号列出）：")
+        for idx, summary in enumerate(summaries, start=1):
+            # 摘要内的换行会打乱编号列表
+            prompt_parts.append(f"[{idx}] {' '.join(summary.split())}")
+        prompt_parts.append("")
+        prompt_parts.append(f"注意：只输出一个 JSON 数组，按编号顺序包含 {len(summaries)} 个类别名称，例如 "
+                            f"{json.dumps(candidate_labels[:2], ensure_ascii=False)}。"
+                            "类别名称必须是候选类别中的**精确文本**，不要包含编号或其他说明。无法判断时用 'other'。")
+
+        return "\n".join(prompt_parts)
+
+    def classify_batch(self, file_infos, candidate_labels: List[str], fewshot_examples: Optional[List[dict]] = None,
+                       fewshot_version=None, max_batch_size: int = 16) -> List[Optional[str]]:
+        """
+        对共享同一组候选类别的多个文件做分类，每 max_batch_size 个文件一次 LLM 调用。
+        结果缓存命中的文件不进入 prompt；批量输出无法解析、或某一项不是合法类别时，
+        对应文件退回单文件的 _query_llm。
+        :return: 与 file_infos 一一对应的类别（失败为 None）
+        """
+        if "other" not in [c.lower() for c in candidate_labels]:
+            candidate_labels = candidate_labels + ["other"]
+        if self.decision_cache is not None and fewshot_version is None:
+            fewshot_version = fewshot_key(fewshot_examples)
+
+        labels = [None] * len(file_infos)
+        cache_keys = [None] * len(file_infos)
+        pending = []
+        for i, file_info in enumerate(file_infos):
+            text_summary = file_info.content.get("text_summary", "") or ""
+            if not text_summary:
+                continue
+            if self.decision_cache is not None:
+                cache_keys[i] = self.decision_cache.make_key(text_summary, candidate_labels, self.model,
+                                                             fewshot_version)
+                cached = self.decision_cache.get(cache_keys[i])
+                metrics.inc("sfs_decision_cache_total", result="miss" if cached is None else "hit")
+                if cached is not None:
+                    labels[i] = cached
+                    continue
+            pending.append(i)
+
+        for start in range(0, len(pending), max(1, max_batch_size)):
+            chunk = pending[start:start + max(1, max_batch_size)]
+            summaries = [file_infos[i].content["text_summary"] for i in chunk]
+            results = self._query_llm_batch(summaries, candidate_labels, fewshot_examples) if len(chunk) > 1 else None
+            if results is None:
+                results = [None] * len(chunk)
+            for i, summary, label in zip(chunk, summaries, results):
+                metrics.inc("sfs_classify_batch_items_total", result="ok" if label is not None else "fallback")
+                if label is None:
+                    label = self._query_llm(summary, candidate_labels, fewshot_examples)
+                labels[i] = label
+                if label is not None and cache_keys[i] is not None:
+                    self.decision_cache.put(cache_keys[i], label, fewshot_version)
+        return labels
+
+    def _query_llm_batch(self, summaries: List[str], candidate_labels: List[str],
+                         fewshot_examples: Optional[List[dict]] = None) -> Optional[List[Optional[str]]]:
+        """一次调用分类多篇摘要；整体无法解析时返回 None，单项无法识别时该项为 None"""
+        prompt = self._build_batch_prompt(summaries, candidate_labels, fewshot_examples)
+        try:
+            with metrics.timer("sfs_llm_request_seconds", model=self.model, caller="classifier_batch"):
+                output = self.llm_client.generate(self.model, prompt, timeout=self.timeout)
+        except Exception as e:
+            metrics.inc("sfs_llm_errors_total", model=self.model, caller="classifier_batch")
+            print(f"[Error] Ollama batch classify failed: {e}")
+            return None
+        items = self._parse_batch_output(output, len(summaries))
+        if items is None:
+            metrics.inc("sfs_classify_batch_malformed_total", model=self.model)
+            return None
+        return [self._match_label(item, candidate_labels) if item else None for item in items]
+
+    @staticmethod
+    def _parse_batch_output(output: Optional[str], n: int) -> Optional[List[Optional[str]]]:
+        """
+        从模型输出中取出 JSON 数组（容忍 ```json 代码块和前后说明文字）。
+        元素可以是类别字符串，也可以是 {"id": 编号, "label": 类别}；
+        长度不等于 n 且没有编号可对齐时返回 None。
+        """
+        if not output:
+            return None
+        start, end = output.find("["), output.rfind("]")
+        if start < 0 or end <= start:
+            return None
+        try:
+            data = json.loads(output[start:end + 1])
+        except ValueError:
+            return None
+        if not isinstance(data, list):
+            return None
+
+        def label_of(item):
+            if isinstance(item, str):
+                return item
+            if isinstance(item, dict):
+                value = item.get("label") or item.get("category") or item.get("类别")
+                return value if isinstance(value, str) else None
+            return None
+
+        if len(data) == n:
+            return [label_of(item) for item in data]
+        # 模型漏掉或多出了条目：按编号对齐，没有编号的整体作废
+        items = [None] * n
+        for item in data:
+            idx = item.get("id") if isinstance(item, dict) else None
+            if not isinstance(idx, int) or not 1 <= idx <= n:
+                return None
+            items[idx - 1] = label_of(item)
+        return items
+
+    @staticmethod
+    def _match_label(output: str, candidate_labels: List[str]) -> Optional[str]:
+        """把模型输出映射到候选类别：先精确匹配（忽略大小写），再按包含关系宽松匹配"""
+        low = output.strip().lower()
+        canonical_map = {c.lower(): c for c in candidate_labels}
+
+        # 精确匹配
+        if low in canonical_map:
+            return canonical_map[low]
+
+        # 宽松匹配：包含关系
+        for cand_low, cand_orig in canonical_map.items():
+            if cand_low in low:
+                return cand_orig
+
+        return None
+
+    def _query_llm(self, text_summary: str, candidate_labels: List[str],
+                   fewshot_examples: Optional[List[dict]] = None) -> Optional[str]:
         prompt = self._build_prompt(text_summary, candidate_labels, fewshot_examples)
 
         try:
-            result = subprocess.run(
-                ["ollama", "run", self.model],
-                input=prompt,
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            output = result.stdout.strip()
+            with metrics.timer("sfs_llm_request_seconds", model=self.model, caller="classifier"):
+                output = self.llm_client.generate(self.model, prompt, timeout=self.timeout)
             if not output:
                 return None
 
-            first_line = output.splitlines()[0].strip()
-            low = first_line.lower()
+            return self._match_label(output.splitlines()[0], candidate_labels)
+        except Exception as e:
+            metrics.inc("sfs_llm_errors_total", model=self.model, caller="classifier")
+            print(f"[Error] Ollama classify failed: {e}")
+            return None
+
+
+# 批量分类完成后放回队列的标记
+_DONE = object()
 
-            canonical_map = {c.lower(): c for c in candidate_labels}
 
-            # 精确匹配
-            if low in canonical_map:
-                return canonical_map[low]
+class BatchingClassifier:
+    """
+    OllamaClassifier 的合并前端，接口与 OllamaClassifier.classify 相同（可直接传给 Classifier）：
+    并发到达的请求按 (候选类别集合, few-shot 版本) 分组，同组凑满 max_batch_size 个、
+    或最早的请求等待超过 max_wait 秒（且有空闲并发）时，用一次 classify_batch 调用完成整组。
+    调用方线程只是等待结果，所以上游并发（例如 IngestPipeline 的 llm_concurrency）
+    应不小于 max_batch_size；真正同时进行的 LLM 请求数由 concurrency 限制。
 
-            # 宽松匹配：包含关系
-            for cand_low, cand_orig in canonical_map.items():
-                if cand_low in low:
-                    return cand_orig
+    用法:
+        classifier = Classifier(BatchingClassifier(OllamaClassifier(), max_batch_size=8, max_wait=0.2))
+    """
+
+    def __init__(self, llm_classifier: OllamaClassifier, max_batch_size: int = 8, max_wait: float = 0.2,
+                 concurrency: int = 2, max_fewshot: int = 8):
+        """
+        :param llm_classifier: 实际执行分类的 OllamaClassifier
+        :param max_batch_size: 每次 LLM 调用最多包含的文件数
+        :param max_wait: 凑批的最长等待时间（秒）；模型空闲时这就是合并带来的最大额外延迟
+        :param concurrency: 同时进行的批量 LLM 请求数
+        :param max_fewshot: 同组文件的 few-shot 示例合并去重后最多保留的条数
+        """
+        self.llm_classifier = llm_classifier
+        self.model = llm_classifier.model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_fewshot = max_fewshot
+        self.concurrency = concurrency
+        self.batches = 0
+        self.batched_items = 0
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="classify-batch")
+        self._thread = None
+        self._thread_lock = threading.Lock()
 
+    def classify(self, file_info, candidate_labels: List[str], fewshot_examples: Optional[List[dict]] = None,
+                 fewshot_version=None) -> Optional[str]:
+        if not (file_info.content.get("text_summary", "") or ""):
             return None
+        if "other" not in [c.lower() for c in candidate_labels]:
+            candidate_labels = candidate_labels + ["other"]
+        self._ensure_thread()
+        fut = Future()
+        self._queue.put((file_info, candidate_labels, fewshot_examples, fewshot_version, fut))
+        return fut.result()
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "batched_items": self.batched_items,
+                "mean_batch_size": round(self.batched_items / self.batches, 2) if self.batches else 0.0}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    # ---------- 合并批处理 ----------
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="classify-batcher", daemon=True)
+                    self._thread.start()
+
+    @staticmethod
+    def _group_key(candidate_labels, fewshot_version):
+        return frozenset(c.lower() for c in candidate_labels), fewshot_version
+
+    def _run(self):
+        groups = {}  # key -> (截止时间, [请求])
+        inflight = 0
+        while True:
+            timeout = None
+            if groups and inflight < self.concurrency:
+                timeout = max(0.0, min(deadline for deadline, _ in groups.values()) - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                inflight -= 1
+            elif item is not None:
+                key = self._group_key(item[1], item[3])
+                if key not in groups:
+                    groups[key] = (time.monotonic() + self.max_wait, [])
+                groups[key][1].append(item)
+
+            # 只在有空闲并发时发出：模型忙时同组请求继续累积，发出去的批次更满
+            while inflight < self.concurrency and groups:
+                now = time.monotonic()
+                ready = [k for k, (deadline, members) in groups.items()
+                         if deadline <= now or len(members) >= self.max_batch_size]
+                if not ready:
+                    break
+                key = min(ready, key=lambda k: groups[k][0])
+                deadline, members = groups.pop(key)
+                if len(members) > self.max_batch_size:
+                    groups[key] = (deadline, members[self.max_batch_size:])
+                    members = members[:self.max_batch_size]
+                inflight += 1
+                self.batches += 1
+                self.batched_items += len(members)
+                self._pool.submit(self._classify_group, members)
+
+    def _classify_group(self, items):
+        # few-shot 示例按检索结果逐个文件不同，同组合并去重后共用
+        fewshot = []
+        seen = set()
+        for _, _, examples, _, _ in items:
+            for ex in examples or []:
+                ident = (ex.get("text_summary") or ex.get("summary", ""), ex.get("correct_label", ""))
+                if ident not in seen and len(fewshot) < self.max_fewshot:
+                    seen.add(ident)
+                    fewshot.append(ex)
+        _, candidate_labels, _, fewshot_version, _ = items[0]
+        try:
+            labels = self.llm_classifier.classify_batch(
+                [file_info for file_info, *_ in items], candidate_labels, fewshot_examples=fewshot or None,
+                fewshot_version=fewshot_version, max_batch_size=self.max_batch_size)
         except Exception as e:
-            print(f"[Error] Ollama classify failed: {e}")
-            return None
+            for *_, fut in items:
+                fut.set_exception(e)
+            return
+        finally:
+            # 通知调度线程空出了一个并发名额
+            self._queue.put(_DONE)
+        for (*_, fut), label in zip(items, labels):
+            fut.set_result(label)
 
 
 class Classifier:
-    def __init__(self, llm_classifier: OllamaClassifier, feedback_manager=None):
+    def __init__(self, llm_classifier: OllamaClassifier, feedback_manager=None, knn_k: int = 5,
+                 knn_min_votes: int = 3, knn_min_similarity: float = 0.75,
+                 knn_min_confidence: float = 0.8, knn_min_margin: float = 0.5, fewshot_k: int = 3):
+        """
+        :param knn_k: 取多少个近邻参与投票（同时也是候选标签的来源）
+        :param knn_min_votes: 胜出标签至少需要的近邻票数
+        :param knn_min_similarity: 胜出标签近邻的平均相似度下限
+        :param knn_min_confidence: 胜出标签的加权票数占全部权重的比例下限
+        :param knn_min_margin: 胜出标签与第二名的加权票差占全部权重的比例下限
+        满足全部阈值时直接采用投票结果，不再调用 LLM；把 knn_min_confidence 设为大于 1 可关闭快速路径。
+        :param fewshot_k: few-shot 示例条数（按与待分类摘要的相似度从反馈中检索）
+        """
         self.llm_classifier = llm_classifier
         self.feedback_manager = feedback_manager
+        self.knn_k = knn_k
+        self.knn_min_votes = knn_min_votes
+        self.knn_min_similarity = knn_min_similarity
+        self.knn_min_confidence = knn_min_confidence
+        self.knn_min_margin = knn_min_margin
+        self.fewshot_k = fewshot_k
+        self.stats = {"total": 0, "no_summary": 0, "knn_fast_path": 0, "llm": 0, "llm_failed": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+        metrics.inc("sfs_classify_total", outcome=key)
+
+    def fast_path_ratio(self) -> float:
+        """有摘要的文件中，走 kNN 快速路径（未调用 LLM）的比例"""
+        with_summary = self.stats["total"] - self.stats["no_summary"]
+        return self.stats["knn_fast_path"] / with_summary if with_summary else 0.0
+
+    @staticmethod
+    def _label_of(res) -> Optional[str]:
+        """取近邻结果的标签：用户反馈修正过的标签优先"""
+        if isinstance(res, dict) and 'file' in res:
+            f = res['file']
+            if isinstance(f, dict):
+                return f.get("feedback") or f.get("final_label")
+            return getattr(f, "feedback", None) or getattr(f, "final_label", None)
+        if hasattr(res, "metadata"):
+            return res.metadata.get("feedback") or res.metadata.get("final_label") or res.metadata.get("label")
+        if isinstance(res, dict):
+            return res.get("feedback") or res.get("final_label") or res.get("label")
+        return None
+
+    def _knn_vote(self, scored):
+        """
+        相似度加权投票。scored: [(label, similarity)]
+        返回 (label, confidence, margin)；不满足阈值时 label 为 None
+        """
+        weights = {}
+        votes = {}
+        sims = {}
+        for label, sim in scored:
+            if not label:
+                continue
+            w = max(sim, 0.0)
+            weights[label] = weights.get(label, 0.0) + w
+            votes[label] = votes.get(label, 0) + 1
+            sims.setdefault(label, []).append(sim)
+        total = sum(weights.values())
+        if not total:
+            return None, 0.0, 0.0
+
+        ranked = sorted(weights.items(), key=lambda kv: kv[1], reverse=True)
+        top_label, top_weight = ranked[0]
+        second_weight = ranked[1][1] if len(ranked) > 1 else 0.0
+        confidence = top_weight / total
+        margin = (top_weight - second_weight) / total
+        mean_sim = sum(sims[top_label]) / len(sims[top_label])
+
+        if (votes[top_label] >= self.knn_min_votes
+                and mean_sim >= self.knn_min_similarity
+                and confidence >= self.knn_min_confidence
+                and margin >= self.knn_min_margin):
+            return top_label, confidence, margin
+        return None, confidence, margin
 
     def _classify_by_extension(self, file_ext: str) -> str:
         ext_map = {
@@ -102,33 +481,102 @@ class Classifier:
         }
         return ext_map.get(file_ext.lower(), 'other')
 
+    @metrics.timed("sfs_classify_seconds")
     def classify(self, file_info, embedding_manager):
+        prepared = self._prepare(file_info, embedding_manager)
+        if prepared is None:
+            return file_info
+        candidate_labels, fewshot_examples = prepared
+
+        # 4. LLM-based
+        final_label = None
+        if self.llm_classifier:
+            self._count("llm")
+            final_label = self.llm_classifier.classify(file_info, candidate_labels, fewshot_examples=fewshot_examples)
+            if not final_label:
+                self._count("llm_failed")
+        return self._finish(file_info, final_label)
+
+    def classify_many(self, file_infos, embedding_manager, max_batch_size: int = 8):
+        """
+        批量分类（例如目录批量入库）：规则与 kNN 步骤逐个进行，需要 LLM 的文件按候选类别集合分组，
+        每组通过 llm_classifier.classify_batch 每 max_batch_size 个文件调用一次 LLM；
+        llm_classifier 不支持批量时逐个调用。
+        """
+        if hasattr(embedding_manager, "embed_files"):
+            # 一次批量 embedding，后面的 kNN 检索与入库都复用
+            embedding_manager.embed_files(file_infos)
+        groups = {}
+        for file_info in file_infos:
+            with metrics.timer("sfs_classify_seconds"):
+                prepared = self._prepare(file_info, embedding_manager)
+            if prepared is None:
+                continue
+            if not self.llm_classifier:
+                self._finish(file_info, None)
+                continue
+            candidate_labels, fewshot_examples = prepared
+            key = frozenset(c.lower() for c in candidate_labels)
+            groups.setdefault(key, (candidate_labels, []))[1].append((file_info, fewshot_examples))
+
+        for candidate_labels, items in groups.values():
+            members = [file_info for file_info, _ in items]
+            for _ in members:
+                self._count("llm")
+            with metrics.timer("sfs_classify_batch_seconds"):
+                if hasattr(self.llm_classifier, "classify_batch"):
+                    # 同组的 few-shot 示例去重后共用，条数与单文件时一致
+                    merged = {}
+                    for _, examples in items:
+                        for ex in examples or []:
+                            merged.setdefault(json.dumps(ex, sort_keys=True, ensure_ascii=False), ex)
+                    labels = self.llm_classifier.classify_batch(
+                        members, candidate_labels, fewshot_examples=list(merged.values())[:self.fewshot_k] or None,
+                        max_batch_size=max_batch_size)
+                else:
+                    labels = [self.llm_classifier.classify(f, candidate_labels, fewshot_examples=examples)
+                              for f, examples in items]
+            for file_info, label in zip(members, labels):
+                if not label:
+                    self._count("llm_failed")
+                self._finish(file_info, label)
+        return file_infos
+
+    def _prepare(self, file_info, embedding_manager):
+        """
+        规则、kNN 与 few-shot 步骤。已经得出结果（无摘要 / kNN 快速路径）时写好 final_label 并返回 None，
+        否则返回交给 LLM 的 (candidate_labels, fewshot_examples)
+        """
+        self._count("total")
         # 1. rule-based
         rule_based_type = self._classify_by_extension(file_info.ext)
         file_info.type = rule_based_type
 
         if not file_info.content.get('text_summary'):
+            self._count("no_summary")
             file_info.final_label = rule_based_type
-            return file_info
+            return None
 
-        # 2. embedding-based 候选标签
+        # 2. embedding-based 候选标签（带相似度）
+        scored = []
         try:
-            search_results = embedding_manager.search(file_info.content['text_summary'], k=5)
+            if hasattr(embedding_manager, "embed_file"):
+                # 向量记录在 file_info 上，之后入库时直接复用，不再 embedding 第二次
+                vector = embedding_manager.embed_file(file_info)
+                results = embedding_manager.search_by_vector_with_scores(vector, k=self.knn_k)
+                scored = [(self._label_of(doc), sim) for doc, sim in results]
+            elif hasattr(embedding_manager, "search_with_scores"):
+                results = embedding_manager.search_with_scores(file_info.content['text_summary'], k=self.knn_k)
+                scored = [(self._label_of(doc), sim) for doc, sim in results]
+            else:
+                results = embedding_manager.search(file_info.content['text_summary'], k=self.knn_k)
+                scored = [(self._label_of(res), 0.0) for res in results]
         except Exception:
-            search_results = []
+            scored = []
 
         candidate_labels = []
         seen = set()
-        for res in search_results:
-            if isinstance(res, dict) and 'file' in res:
-                f = res['file']
-                lab = getattr(f, "final_label", None) or (f.get("final_label") if isinstance(f, dict) else None)
-            elif hasattr(res, "metadata"):
-                lab = res.metadata.get("final_label") or res.metadata.get("label")
-            elif isinstance(res, dict):
-                lab = res.get("final_label") or res.get("label")
-            else:
-                lab = None
+        for lab, _ in scored:
             if lab and lab not in seen:
                 candidate_labels.append(lab)
                 seen.add(lab)
@@ -141,21 +589,40 @@ class Classifier:
 
         file_info.candidates = candidate_labels
 
+        # 2.5 kNN 投票：近邻高度一致时直接采用，省掉一次 LLM 调用
+        voted_label, _, _ = self._knn_vote(scored)
+        if voted_label:
+            self._count("knn_fast_path")
+            file_info.final_label = voted_label
+            return None
+
         # 3. few-shot
         fewshot_examples = None
         if self.feedback_manager and hasattr(self.feedback_manager, "get_fewshot_examples"):
+            get_examples = self.feedback_manager.get_fewshot_examples
             try:
-                fewshot_examples = self.feedback_manager.get_fewshot_examples(k=3)
+                if _accepts_keyword(get_examples, "query"):
+                    fewshot_examples = get_examples(self.fewshot_k, query=file_info.content['text_summary'])
+                else:
+                    # 不支持相似度检索的反馈管理器
+                    fewshot_examples = get_examples(self.fewshot_k)
             except Exception:
                 pass
 
-        # 4. LLM-based
-        final_label = None
-        if self.llm_classifier:
-            final_label = self.llm_classifier.classify(file_info, candidate_labels, fewshot_examples=fewshot_examples)
+        return candidate_labels, fewshot_examples
 
+    def _finish(self, file_info, final_label):
         if not final_label:
-            final_label = rule_based_type  # fallback
+            final_label = file_info.type  # fallback：规则分类结果
 
         file_info.final_label = final_label
         return file_info
+
+
+def _accepts_keyword(func, name):
+    """func 能否接受关键字参数 name（显式声明或 **kwargs）"""
+    try:
+        params = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in params or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values())
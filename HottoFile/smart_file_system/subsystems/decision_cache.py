@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from ..utils.hashing import text_sha256
+
+
+def fewshot_key(examples):
+    """
+    prompt 中 few-shot 上下文的版本：按顺序取各示例的反馈 seq（没有 seq 时用示例内容）做哈希。
+    只有这次检索到的示例变化时才换版本，无关的新反馈不会让缓存失效。
+    """
+    if not examples:
+        return "none"
+    return text_sha256(*(str(ex["seq"]) if "seq" in ex else json.dumps(ex, sort_keys=True, ensure_ascii=False)
+                         for ex in examples))
+
+
+class DecisionCache:
+    """
+    LLM 分类结果的持久化缓存。
+    键 = sha256(摘要, 排序后的候选标签, 模型名, few-shot 版本)，值 = 标签。
+    内存中是 LRU（OrderedDict），后面是 SQLite；
+    few-shot 版本见 fewshot_key，所用示例变化后旧条目不再命中，随 LRU 淘汰。
+    """
+
+    def __init__(self, db_path="decision_cache.sqlite", max_entries=100_000, memory_entries=10_000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS decision_cache (
+                key TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                version TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_decision_cache_access ON decision_cache(last_access)")
+        self._conn.commit()
+        self._writes_since_evict = 0
+
+    @staticmethod
+    def make_key(text_summary, candidate_labels, model, version):
+        return text_sha256(text_summary, "\x1e".join(sorted(candidate_labels)), model, version)
+
+    def get(self, key):
+        with self._lock:
+            label = self._memory.get(key)
+            if label is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return label
+            row = self._conn.execute("SELECT label FROM decision_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE decision_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._remember(key, row[0])
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, label, version):
+        with self._lock:
+            self._remember(key, label)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO decision_cache (key, label, version, last_access) VALUES (?, ?, ?, ?)",
+                (key, label, str(version), time.time()),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 1000:
+                self._writes_since_evict = 0
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """超过 max_entries 时按最近访问时间淘汰"""
+        count = self._conn.execute("SELECT COUNT(*) FROM decision_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM decision_cache WHERE key IN "
+                "(SELECT key FROM decision_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def _remember(self, key, label):
+        self._memory[key] = label
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM decision_cache").fetchone()[0]
+        return {"entries": count, "memory_entries": len(self._memory), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
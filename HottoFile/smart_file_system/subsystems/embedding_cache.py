@@ -0,0 +1,250 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..utils import metrics
+from ..utils.hashing import text_sha256
+
+
+def normalize_text(text):
+    """缓存键使用的规范化：折叠空白。只有空白差异的文本共享同一个向量"""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    持久化的向量缓存（SQLite），键为 sha256(模型 ID + 规范化文本)。
+    同一段文本在同一模型下只会被 embedding 一次。
+    """
+
+    def __init__(self, db_path="embedding_cache.sqlite", max_entries=1_000_000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_access ON embedding_cache(last_access)")
+        self._conn.commit()
+        self._writes_since_evict = 0
+
+    @staticmethod
+    def make_key(model_id, text):
+        return text_sha256(model_id, normalize_text(text))
+
+    def get_many(self, keys):
+        """返回 {key: np.ndarray}，只包含命中的键"""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            # SQLite 默认最多 999 个绑定参数
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_access = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, items):
+        """items: [(key, vector), ...]"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vector, last_access) VALUES (?, ?, ?)",
+                [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items],
+            )
+            self._writes_since_evict += len(items)
+            if self._writes_since_evict >= 1000:
+                self._writes_since_evict = 0
+                count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM embedding_cache WHERE key IN "
+                        "(SELECT key FROM embedding_cache ORDER BY last_access LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        return {"entries": count, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embedding 前端：
+      - 先查 EmbeddingCache，未变化的文本不会重新 embedding
+      - 未命中的文本进入共享队列，后台线程把并发请求合并成一次 embed_documents 调用
+        （最多 max_batch_size 条，最多等待 max_wait 秒）
+    查询向量（embed_query）直接交给底层模型，不参与合并；最近的查询向量保存在内存 LRU 中。
+    """
+
+    def __init__(self, backend, model_id, cache=None, max_batch_size=64, max_wait=0.02, query_cache_size=1024):
+        """
+        :param backend: 实际的 Embeddings（可以是 LazyEmbeddings）
+        :param model_id: 模型标识，或返回模型标识的无参函数（延迟求值）
+        :param cache: 可选的 EmbeddingCache
+        :param query_cache_size: 查询向量 LRU 的容量，0 表示不缓存
+        """
+        self.backend = backend
+        self._model_id = model_id
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.batches = 0
+        self.embedded_texts = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        self.query_cache_size = query_cache_size
+        self.query_hits = 0
+        self.query_misses = 0
+        self._query_cache = OrderedDict()
+        self._query_lock = threading.Lock()
+
+    @property
+    def model_id(self):
+        if callable(self._model_id):
+            self._model_id = self._model_id()
+        return self._model_id
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        keys = [EmbeddingCache.make_key(self.model_id, t) for t in texts]
+        found = self.cache.get_many(keys) if self.cache is not None else {}
+
+        # 同一次调用里的重复文本只提交一次
+        futures = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in futures:
+                futures[key] = self._submit(key, text)
+        for key, fut in futures.items():
+            found[key] = fut.result()
+        return [np.asarray(found[k], dtype=np.float32).tolist() for k in keys]
+
+    def embed_query(self, text):
+        if not self.query_cache_size:
+            return self.backend.embed_query(text)
+        key = normalize_text(text)
+        with self._query_lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                self.query_hits += 1
+        if vector is not None:
+            metrics.inc("sfs_query_embedding_cache_total", result="hit")
+            return vector.tolist()
+
+        vector = self.backend.embed_query(text)
+        metrics.inc("sfs_query_embedding_cache_total", result="miss")
+        with self._query_lock:
+            self.query_misses += 1
+            self._query_cache[key] = np.asarray(vector, dtype=np.float32)
+            if len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return vector
+
+    def stats(self):
+        stats = {"batches": self.batches, "embedded_texts": self.embedded_texts,
+                 "query_cache": {"entries": len(self._query_cache), "hits": self.query_hits,
+                                 "misses": self.query_misses}}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    # ---------- 合并批处理 ----------
+    def _submit(self, key, text):
+        self._ensure_thread()
+        fut = Future()
+        self._queue.put((key, text, fut))
+        return fut
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch):
+        # 不同调用方可能同时提交了同一段文本
+        by_key = {}
+        for key, text, fut in batch:
+            by_key.setdefault(key, (text, []))[1].append(fut)
+        keys = list(by_key)
+        try:
+            vectors = list(self.backend.embed_documents([by_key[k][0] for k in keys]))
+            if len(vectors) != len(keys):
+                # 少返回的文本对应的调用方会永远等待，整批按失败处理
+                raise ValueError(f"embedding 后端返回了 {len(vectors)} 个向量，应为 {len(keys)} 个")
+        except Exception as e:
+            for _, futs in by_key.values():
+                for fut in futs:
+                    fut.set_exception(e)
+            return
+
+        self.batches += 1
+        self.embedded_texts += len(keys)
+        if self.cache is not None:
+            try:
+                self.cache.put_many(list(zip(keys, vectors)))
+            except Exception as e:
+                print(f"⚠️ 写入向量缓存失败: {e}")
+        for key, vector in zip(keys, vectors):
+            for fut in by_key[key][1]:
+                fut.set_result(vector)
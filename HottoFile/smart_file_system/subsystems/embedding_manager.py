@@ -1,38 +1,209 @@
+import atexit
+import bisect
+import functools
+import json
 import os
+import pickle
+import shutil
 import subprocess
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from datetime import datetime
 import faiss
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings, OllamaEmbeddings
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ..data_structures.file_info import FileInfo
+from ..utils import metrics
+from . import ann_index
+from .embedding_cache import BatchingEmbeddings, EmbeddingCache, normalize_text
+from .index_wal import IndexWAL, decode_vector
+
+# `ollama list` 检测结果的缓存文件与有效期（秒）
+OLLAMA_MODELS_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "hottofile", "ollama_models.json")
+OLLAMA_MODELS_TTL = float(os.environ.get("HOTTO_OLLAMA_MODELS_TTL", 3600))
+_ollama_models = None
+_ollama_models_lock = threading.Lock()
+
+# search(filters=...) 支持的等值过滤属性；另外支持 modified_after / modified_before 区间
+FILTER_ATTRS = ("type", "ext", "label")
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    延迟初始化的 Embedding 代理：第一次真正需要向量时才检测 Ollama、加载模型。
+    只加载索引、或者查询结果命中缓存时不会付出模型初始化的代价。
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self):
+        return self._backend is not None
+
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._factory()
+        return self._backend
+
+    def embed_documents(self, texts):
+        return self.backend().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.backend().embed_query(text)
 
 
 class EmbeddingManager:
-    def __init__(self, persist_path="faiss_index"):
+    def __init__(self, persist_path="faiss_index", persist_mode="wal",
+                 snapshot_interval=300.0, snapshot_ops=1000, wal_fsync=True, embeddings=None,
+                 embedding_model_id=None, embedding_cache_path=None, embed_batch_size=64, embed_max_wait=0.02,
+                 catalog=None, index_type="flat", index_threshold=50_000, index_params=None, read_only=False,
+                 query_cache_size=1024, result_cache_size=256):
         """
-        自动检测 bge-m3 是否在 Ollama 本地可用
+        自动检测 bge-m3 是否在 Ollama 本地可用（延迟到第一次需要向量时）
         persist_path: 保存/加载向量数据库的路径
+        persist_mode: "wal" 变更先写预写日志，按时间/操作数策略或关闭时做全量快照；
+                      "sync" 每次变更都同步保存整个索引（旧行为）
+        snapshot_interval: WAL 模式下两次快照之间的最长间隔（秒）
+        snapshot_ops: WAL 模式下累计多少次变更后触发快照
+        wal_fsync: 每条 WAL 记录是否 fsync
+        embeddings: 可选，直接指定 Embeddings 实例（不做检测）
+        embedding_model_id: 向量缓存使用的模型标识，默认按检测结果（ollama:bge-m3 / hf:BAAI/bge-m3）；
+                            传入 embeddings 时取其 model / model_name / model_id 属性，都没有时必须显式指定
+        embedding_cache_path: 向量缓存 SQLite 路径，默认 <persist_path>.embcache.sqlite；传 False 关闭
+        embed_batch_size / embed_max_wait: 并发 embedding 请求合并成批的上限与等待时间
+        catalog: 可选的 FileCatalog；指定后文件记录同步写入目录，向量 ID 即目录行 id
+        index_type: 向量数达到 index_threshold 后使用的索引类型（见 ann_index.INDEX_TYPES），
+                    在此之前使用精确的 flat 索引；达到阈值时自动迁移（取回已存向量，不重新 embedding）
+        index_threshold: 迁移阈值；IVF 类型还至少需要 39 * nlist 个向量用于训练
+        index_params: 索引参数，覆盖 ann_index.DEFAULT_INDEX_PARAMS（如 ef_search、nprobe）
+        read_only: 只读检索节点：内存映射加载快照（常驻内存不随索引增长），不回放 WAL，禁止写入
+        query_cache_size: 查询向量 LRU 的容量（相同查询不重复 embedding），0 表示关闭
+        result_cache_size: 检索结果 LRU 的容量，键为 (查询, k, 过滤条件)，索引有任何增删后失效；0 表示关闭
         """
+        if index_type not in ann_index.INDEX_TYPES:
+            raise ValueError(f"未知的索引类型: {index_type}（可选 {', '.join(ann_index.INDEX_TYPES)}）")
         self.persist_path = persist_path
-        self.embeddings = self._init_embeddings()
+        self.persist_mode = persist_mode
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_ops = snapshot_ops
+        self.catalog = catalog
+        self.index_type = index_type
+        self.index_threshold = index_threshold
+        self.index_params = ann_index.index_params(index_params)
+        self.read_only = read_only
+        if embeddings is None:
+            backend = LazyEmbeddings(self._init_embeddings)
+            model_id = embedding_model_id or self._embedding_model_id
+        else:
+            backend = embeddings
+            # 只用类名作键会让同一类的不同模型共用缓存行，返回错误的向量
+            model_id = embedding_model_id or _embeddings_model_id(embeddings)
+            if model_id is None:
+                if embedding_cache_path is not False:
+                    raise ValueError(f"无法从 {type(embeddings).__name__} 得到模型名，"
+                                     "请指定 embedding_model_id 或传 embedding_cache_path=False")
+                # 没有持久化缓存时只用于进程内的查询 LRU
+                model_id = type(embeddings).__name__
+        if embedding_cache_path is None:
+            embedding_cache_path = f"{persist_path}.embcache.sqlite"
+        cache = EmbeddingCache(embedding_cache_path) if embedding_cache_path else None
+        self.embeddings = BatchingEmbeddings(
+            backend, model_id, cache=cache, max_batch_size=embed_batch_size, max_wait=embed_max_wait,
+            query_cache_size=query_cache_size
+        )
         self.vectorstore = None
+        # file_id -> 向量的整数 ID 列表（IndexIDMap2 中的稳定 ID）
+        self._file_ids = {}
+        self._next_id = 0
+        # 预过滤用的 ID 集合：(属性, 值) -> {int_id}，以及按修改时间排序的 [(modified_at, int_id)]
+        self._attr_ids = {}
+        self._id_attrs = {}
+        self._by_modified = []
+        # 批量增删后 _by_modified 不再逐条维护，下一次按日期过滤时整体排序一次
+        self._modified_stale = False
+        # 索引代数：每次增删（以及重建）都会递增，过滤选择器与检索结果缓存据此判断是否失效
+        self._generation = 0
+        self._selector_cache = {}
+        self.result_cache_size = result_cache_size
+        self._result_cache = OrderedDict()
+        # HNSW 中已删除但仍占位的向量数
+        self._tombstones = 0
+
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._dirty_ops = 0
+        self._last_snapshot = time.monotonic()
+        self._closed = threading.Event()
+        self._snapshot_due = threading.Event()
+        use_wal = persist_mode == "wal" and not read_only
+        self.wal = IndexWAL(f"{persist_path}.wal", fsync=wal_fsync) if use_wal else None
 
         # 尝试加载已有索引
+        normalized = False
+        if not read_only:
+            self._recover_snapshot_dirs()
         if os.path.exists(self.persist_path):
             try:
-                self.vectorstore = FAISS.load_local(
-                    self.persist_path,
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                print(f"✅ 已加载本地索引：{self.persist_path}")
+                self.vectorstore = self._load_snapshot()
+                self._ensure_id_map()
+                normalized = self._ensure_unit_vectors()
+                print(f"✅ 已加载本地索引：{self.persist_path}"
+                      f"（{ann_index.index_kind(self.vectorstore.index)}{'，只读映射' if read_only else ''}）")
             except Exception as e:
+                self.vectorstore = None
                 print(f"⚠️ 无法加载已有索引，重新建立: {e}")
 
+        if self.wal is not None:
+            replayed = self._replay_wal()
+            if replayed:
+                print(f"📜 已回放 WAL {replayed} 条记录")
+
+        if not read_only:
+            if self.catalog is not None:
+                dropped = self._drop_unindexed_bulk_rows()
+                if dropped:
+                    print(f"🧹 上次批量导入未保存就中断，已删除 {dropped} 条没有向量的目录记录")
+            if self.catalog is not None and self.vectorstore is not None:
+                self._adopt_catalog_ids()
+            if not self._maybe_rebuild_index() and normalized:
+                # 回放 WAL 之后再保存归一化后的索引
+                self.save_index()
+
+        self._flusher = None
+        self._atexit_hook = None
+        if self.wal is not None:
+            # 后台线程与退出钩子只持有弱引用，不用的 EmbeddingManager（连同索引）可以被回收
+            ref = weakref.ref(self)
+            self._flusher = threading.Thread(
+                target=_flush_loop, args=(ref, self._closed, self._snapshot_due, self.snapshot_interval), daemon=True)
+            self._flusher.start()
+            self._atexit_hook = functools.partial(_close_ref, ref)
+            atexit.register(self._atexit_hook)
+
+    def _embedding_model_id(self):
+        """只做检测、不加载模型，用于向量缓存的键"""
+        return "ollama:bge-m3" if self._check_ollama_model("bge-m3") else "hf:BAAI/bge-m3"
+
     def _init_embeddings(self):
         """检测并初始化 Embedding 模型"""
         if self._check_ollama_model("bge-m3"):
+            from langchain_community.embeddings import OllamaEmbeddings
             print("✅ 检测到 Ollama 本地有 bge-m3，使用 OllamaEmbeddings")
             return OllamaEmbeddings(model="bge-m3")
         else:
+            from langchain_community.embeddings import HuggingFaceBgeEmbeddings
             print("⚠️ 未检测到 Ollama bge-m3，使用 HuggingFace BGE-M3（CPU模式）")
             return HuggingFaceBgeEmbeddings(
                 model_name="BAAI/bge-m3",
@@ -41,81 +212,899 @@ class EmbeddingManager:
             )
 
     def _check_ollama_model(self, model_name):
-        """检查 Ollama 是否有某个模型"""
-        try:
-            result = subprocess.run(
-                ["ollama", "list"], capture_output=True, text=True, check=True
-            )
-            return model_name in result.stdout
-        except Exception as e:
-            print(f"⚠️ 无法检测 Ollama 模型: {e}")
+        """检查 Ollama 是否有某个模型（结果在进程内和磁盘上缓存）"""
+        models = _list_ollama_models()
+        return models is not None and model_name in models
+
+    # ---------- ID 映射 ----------
+    def _new_vectorstore(self, dim, metric=faiss.METRIC_L2):
+        """建立以稳定整数 ID 寻址的空索引（阈值为 0 且无需训练时直接使用目标类型）"""
+        index_type = "flat"
+        if self.index_threshold <= 0 and ann_index.min_train_size(self.index_type, self.index_params) == 0:
+            index_type = self.index_type
+        index = ann_index.new_index(index_type, dim, metric, self.index_params)
+        return FAISS(self.embeddings, index, InMemoryDocstore({}), {})
+
+    def _load_snapshot(self):
+        """加载快照；只读模式下内存映射向量数据"""
+        if not self.read_only:
+            return FAISS.load_local(self.persist_path, self.embeddings, allow_dangerous_deserialization=True)
+        index = ann_index.read_index(os.path.join(self.persist_path, "index.faiss"), mmap=True)
+        with open(os.path.join(self.persist_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+
+    def _ensure_id_map(self):
+        """
+        旧版索引是按位置编号的 IndexFlat：直接取回已存向量包装成 IndexIDMap2，
+        不需要重新 embedding。然后重建 file_id -> ID 映射。
+        """
+        vs = self.vectorstore
+        if not isinstance(vs.index, (faiss.IndexIDMap, faiss.IndexIVF)) and not self.read_only:
+            old = vs.index
+            vectors = old.reconstruct_n(0, old.ntotal) if old.ntotal else np.zeros((0, old.d), dtype=np.float32)
+            index = faiss.IndexIDMap2(faiss.IndexFlat(old.d, old.metric_type))
+            index.add_with_ids(vectors, np.arange(old.ntotal, dtype=np.int64))
+            vs.index = index
+            vs.index_to_docstore_id = {int(i): doc_id for i, doc_id in vs.index_to_docstore_id.items()}
+
+        self._file_ids = {}
+        self._clear_filters()
+        for int_id, doc_id in vs.index_to_docstore_id.items():
+            doc = vs.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                self._file_ids.setdefault(doc.metadata.get("file_id"), []).append(int_id)
+                self._index_filters(int_id, doc.metadata, bulk=True)
+        self._next_id = max(vs.index_to_docstore_id, default=-1) + 1
+        self._tombstones = ann_index.tombstone_count(vs.index)
+
+    def _ensure_unit_vectors(self):
+        """
+        旧版索引存的是未归一化的向量，L2 距离换算不出余弦相似度：抽查一部分已存向量，
+        不是单位向量时取回全部向量归一化后重建（不重新 embedding）。重建过时返回 True。
+        """
+        vs = self.vectorstore
+        kind = ann_index.index_kind(vs.index)
+        if kind == "ivf_pq" or not vs.index_to_docstore_id:
+            # PQ 取回的是近似向量，范数本来就不精确
+            return False
+        ids = np.fromiter(vs.index_to_docstore_id, dtype=np.int64, count=len(vs.index_to_docstore_id))
+        norms = np.linalg.norm(ann_index.get_vectors(vs.index, ids[:64]), axis=1)
+        norms = norms[norms > 0]
+        if np.allclose(norms, 1.0, atol=1e-3):
+            return False
+        if self.read_only:
+            print("⚠️ 索引中的向量未归一化，相似度分数不准确；请以可写模式打开一次完成迁移")
             return False
+        vs.index = ann_index.build_index(kind, _unit(ann_index.get_vectors(vs.index, ids)), ids,
+                                         vs.index.metric_type, self.index_params)
+        self._tombstones = 0
+        print(f"🔄 已将 {len(ids)} 个向量归一化")
+        return True
 
+    def _adopt_catalog_ids(self):
+        """
+        首次启用 FileCatalog 时，已有索引的向量 ID 与目录 id 不一致：
+        把索引中的文件登记进目录，并按目录 id 重新编号（取回已存向量，不重新 embedding）。
+        同一 file_id 有多个向量时只保留最新的一个。
+        """
+        vs = self.vectorstore
+        latest = {}
+        for int_id in sorted(vs.index_to_docstore_id):
+            doc = vs.docstore.search(vs.index_to_docstore_id[int_id])
+            if isinstance(doc, Document):
+                latest[doc.metadata.get("file_id")] = (int_id, doc)
+        known = self.catalog.ids_for(list(latest))
+        if len(latest) == len(vs.index_to_docstore_id) and all(
+                known.get(file_id) == int_id for file_id, (int_id, _) in latest.items()):
+            return
+
+        infos = []
+        for _, doc in latest.values():
+            info = FileInfo.from_dict(doc.metadata)
+            info.text_summary = doc.page_content
+            infos.append(info)
+        ids = self.catalog.upsert_many(infos)
+        old_ids = [int_id for int_id, _ in latest.values()]
+        new_ids = [ids[file_id] for file_id in latest]
+        vectors = ann_index.get_vectors(vs.index, old_ids)
+        index = ann_index.build_index(ann_index.index_kind(vs.index), vectors, new_ids, vs.index.metric_type,
+                                      self.index_params)
+        self._tombstones = 0
+        kept = set(old_ids)
+        stale = [doc_id for int_id, doc_id in vs.index_to_docstore_id.items() if int_id not in kept]
+        if stale:
+            vs.docstore.delete(stale)
+        vs.index = index
+        vs.index_to_docstore_id = {}
+        self._file_ids = {}
+        self._clear_filters()
+        for new_id, (file_id, (_, doc)) in zip(new_ids, latest.items()):
+            doc.metadata["catalog_id"] = new_id
+            vs.index_to_docstore_id[new_id] = doc.id
+            self._file_ids[file_id] = [new_id]
+            self._index_filters(new_id, doc.metadata, bulk=True)
+        self._next_id = max(new_ids, default=-1) + 1
+        print(f"🔄 已按文件目录重新编号 {len(new_ids)} 个向量")
+        self.save_index()
+
+    def _maybe_rebuild_index(self):
+        """
+        - flat 索引的向量数达到阈值时迁移到 index_type
+        - HNSW 墓碑比例过高时重建
+        都是取回已存向量重建，不重新 embedding；完成后立即做一次快照。重建过时返回 True。
+        """
+        with self._lock:
+            vs = self.vectorstore
+            if vs is None:
+                return
+            kind = ann_index.index_kind(vs.index)
+            live = len(vs.index_to_docstore_id)
+            target = kind
+            if kind == "flat" and self.index_type != "flat":
+                needed = max(self.index_threshold, ann_index.min_train_size(self.index_type, self.index_params, live))
+                if live >= needed:
+                    target = self.index_type
+            if target == kind and not (
+                    self._tombstones and self._tombstones > vs.index.ntotal * self.index_params["tombstone_ratio"]):
+                return False
+
+            start = time.perf_counter()
+            ids = np.fromiter(vs.index_to_docstore_id, dtype=np.int64, count=live)
+            vectors = ann_index.get_vectors(vs.index, ids)
+            vs.index = ann_index.build_index(target, vectors, ids, vs.index.metric_type, self.index_params)
+            self._tombstones = 0
+            self._generation += 1
+            self._selector_cache = {}
+            metrics.observe("sfs_embedding_op_seconds", time.perf_counter() - start, op="rebuild")
+            print(f"🔄 向量索引已重建为 {target}（{live} 个向量，{time.perf_counter() - start:.1f}s）")
+        self.save_index()
+        return True
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("只读模式的 EmbeddingManager 不能修改索引")
+
+    def _catalog_ids(self, file_objs, metadatas):
+        """把文件登记到目录，返回每条 metadata 对应的向量 ID（未启用目录时为 None）"""
+        if self.catalog is None:
+            return None
+        ids = self.catalog.upsert_many(file_objs)
+        for f in file_objs:
+            f.catalog_id = ids[f.file_id]
+        for meta in metadatas:
+            meta["catalog_id"] = ids[meta["file_id"]]
+        return [meta["catalog_id"] for meta in metadatas]
+
+    def _index_metadata(self, file_obj):
+        """向量附带的元数据：启用目录时用精简形式，其余字段在 FileCatalog 中"""
+        return file_obj.to_index_metadata(lean=self.catalog is not None)
+
+    def _file_vectors(self, file_objs, texts):
+        """
+        各文件摘要的向量：已带 embedding 的（例如分类时通过 embed_file 算过）直接使用，其余一次性 embedding。
+        向量进了索引就不再挂在 FileInfo 上，大批量入库时不会为每个对象多占一份向量内存。
+        """
+        missing = [i for i, f in enumerate(file_objs) if f.embedding is None]
+        if len(missing) == len(file_objs):
+            return self._embed(texts)
+        vectors = [f.embedding for f in file_objs]
+        if missing:
+            for i, vector in zip(missing, self._embed([texts[i] for i in missing])):
+                vectors[i] = vector
+        for f in file_objs:
+            f.embedding = None
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _embed(self, texts):
+        metrics.inc("sfs_embedding_texts_total", len(texts))
+        with metrics.timer("sfs_embedding_embed_seconds"):
+            return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    def _add_documents(self, texts, metadatas, vectors=None, int_ids=None):
+        """以新的整数 ID（或指定的目录 id）写入一批文本（未给出向量时先 embedding）"""
+        if vectors is None:
+            vectors = self._embed(texts)
+        with self._lock:
+            if int_ids is None:
+                int_ids = list(range(self._next_id, self._next_id + len(texts)))
+            doc_ids = [str(uuid.uuid4()) for _ in texts]
+            if self.wal is not None:
+                self.wal.log_add(int_ids, doc_ids, texts, metadatas, vectors)
+            self._apply_add(int_ids, doc_ids, texts, metadatas, vectors)
+
+    def _apply_add(self, int_ids, doc_ids, texts, metadatas, vectors):
+        vectors = _unit(np.asarray(vectors, dtype=np.float32).reshape(len(int_ids), -1))
+        if self.vectorstore is None:
+            self.vectorstore = self._new_vectorstore(vectors.shape[1])
+
+        vs = self.vectorstore
+        vs.index.add_with_ids(vectors, np.asarray(int_ids, dtype=np.int64))
+        docs = {}
+        bulk = len(int_ids) > 1
+        for int_id, doc_id, text, meta in zip(int_ids, doc_ids, texts, metadatas):
+            docs[doc_id] = Document(id=doc_id, page_content=text, metadata=meta)
+            vs.index_to_docstore_id[int_id] = doc_id
+            self._file_ids.setdefault(meta.get("file_id"), []).append(int_id)
+            self._index_filters(int_id, meta, bulk)
+        vs.docstore.add(docs)
+        self._next_id = max(self._next_id, max(int_ids) + 1)
+
+    def _remove_file_ids(self, file_ids):
+        """只移除指定文件的向量，其它向量保持不变，返回被删除的 file_id 集合"""
+        with self._lock:
+            int_ids = []
+            removed = set()
+            for file_id in file_ids:
+                ids = self._file_ids.get(file_id)
+                if ids:
+                    int_ids.extend(ids)
+                    removed.add(file_id)
+            if int_ids:
+                if self.wal is not None:
+                    self.wal.log_remove(int_ids)
+                self._apply_remove(int_ids)
+            return removed
+
+    def _apply_remove(self, int_ids):
+        vs = self.vectorstore
+        if ann_index.index_kind(vs.index) == "hnsw":
+            self._tombstones += ann_index.remove_ids(vs.index, int_ids)
+        else:
+            ann_index.remove_ids(vs.index, int_ids)
+        doc_ids = []
+        bulk = len(int_ids) > 1
+        for int_id in int_ids:
+            doc_id = vs.index_to_docstore_id.pop(int_id)
+            doc_ids.append(doc_id)
+            self._unindex_filters(int_id, bulk)
+            doc = vs.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                ids = self._file_ids.get(doc.metadata.get("file_id"))
+                if ids and int_id in ids:
+                    ids.remove(int_id)
+                    if not ids:
+                        del self._file_ids[doc.metadata.get("file_id")]
+        vs.docstore.delete(doc_ids)
+
+    # ---------- 预过滤 ----------
+    def _clear_filters(self):
+        self._attr_ids = {}
+        self._id_attrs = {}
+        self._by_modified = []
+        self._modified_stale = False
+        self._generation += 1
+        self._selector_cache = {}
+
+    def _index_filters(self, int_id, meta, bulk=False):
+        """
+        登记一个向量的过滤属性。单条写入时用 insort 维护 _by_modified；
+        bulk=True（加载、批量写入）时只标记为过期，避免 n 次 O(n) 插入
+        """
+        attrs = _filter_attrs(meta)
+        self._id_attrs[int_id] = attrs
+        for attr in FILTER_ATTRS:
+            if attrs.get(attr) is not None:
+                self._attr_ids.setdefault((attr, attrs[attr]), set()).add(int_id)
+        if attrs.get("modified_at") and not self._modified_stale:
+            if bulk:
+                self._modified_stale = True
+            else:
+                bisect.insort(self._by_modified, (attrs["modified_at"], int_id))
+        self._generation += 1
+
+    def _unindex_filters(self, int_id, bulk=False):
+        attrs = self._id_attrs.pop(int_id, None)
+        if attrs is None:
+            return
+        for attr in FILTER_ATTRS:
+            key = (attr, attrs.get(attr))
+            ids = self._attr_ids.get(key)
+            if ids is not None:
+                ids.discard(int_id)
+                if not ids:
+                    del self._attr_ids[key]
+        if attrs.get("modified_at") and not self._modified_stale:
+            if bulk:
+                self._modified_stale = True
+            else:
+                entry = (attrs["modified_at"], int_id)
+                pos = bisect.bisect_left(self._by_modified, entry)
+                if pos < len(self._by_modified) and self._by_modified[pos] == entry:
+                    del self._by_modified[pos]
+        self._generation += 1
+
+    def _sorted_modified(self):
+        """按修改时间排序的 [(modified_at, int_id)]；批量增删后在这里整体重排一次"""
+        if self._modified_stale:
+            self._by_modified = sorted((attrs["modified_at"], int_id) for int_id, attrs in self._id_attrs.items()
+                                       if attrs.get("modified_at"))
+            self._modified_stale = False
+        return self._by_modified
+
+    def _matching_ids(self, filters):
+        """
+        满足全部过滤条件的向量 ID 集合。
+        filters: {"type": ..., "ext": ..., "label": ...（单个值或列表）,
+                  "modified_after": ..., "modified_before": ...（ISO 字符串或 datetime，区间 [after, before)）}
+        """
+        unknown = set(filters) - set(FILTER_ATTRS) - {"modified_after", "modified_before"}
+        if unknown:
+            raise ValueError(f"不支持的过滤条件: {sorted(unknown)}")
+        sets = []
+        for attr in FILTER_ATTRS:
+            value = filters.get(attr)
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            if attr == "ext":
+                values = [v.lower().lstrip(".") for v in values]
+            matched = set()
+            for v in values:
+                matched |= self._attr_ids.get((attr, v), set())
+            sets.append(matched)
+        after = filters.get("modified_after")
+        before = filters.get("modified_before")
+        if after is not None or before is not None:
+            by_modified = self._sorted_modified()
+            lo = bisect.bisect_left(by_modified, (_iso(after),)) if after is not None else 0
+            hi = bisect.bisect_left(by_modified, (_iso(before),)) if before is not None else len(by_modified)
+            sets.append({int_id for _, int_id in by_modified[lo:hi]})
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def _selector(self, filters):
+        """过滤条件对应的 faiss.IDSelectorBatch；结果按条件缓存，索引变化后失效。无匹配时返回 None"""
+        key = json.dumps(filters, sort_keys=True, default=str)
+        cached = self._selector_cache.get(key)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        ids = self._matching_ids(filters)
+        selector = None
+        if ids:
+            selector = faiss.IDSelectorBatch(np.fromiter(ids, dtype=np.int64, count=len(ids)))
+        if len(self._selector_cache) >= 64:
+            self._selector_cache.clear()
+        self._selector_cache[key] = (self._generation, selector)
+        return selector
+
+    @metrics.timed("sfs_embedding_op_seconds", op="search")
+    def _search_by_vector(self, vector, k, filters=None):
+        """返回 [(Document, 归一化向量间的 L2 距离)]；有过滤条件时用 ID 选择器在索引内预过滤，结果精确且不需要多取"""
+        with self._lock:
+            vs = self.vectorstore
+            if vs is None or vs.index.ntotal == 0:
+                return []
+            selector = None
+            if filters:
+                selector = self._selector(filters)
+                if selector is None:
+                    return []
+            params = ann_index.search_params(vs.index, selector, self.index_params, self._tombstones > 0)
+            distances, ids = vs.index.search(_unit(vector), k, params=params)
+            results = []
+            for dist, int_id in zip(distances[0], ids[0]):
+                if int_id == -1:
+                    continue
+                doc = vs.docstore.search(vs.index_to_docstore_id[int(int_id)])
+                if isinstance(doc, Document):
+                    results.append((doc, float(dist)))
+            return results
+
+    def _reset(self):
+        with self._lock:
+            if self.wal is not None:
+                self.wal.log_reset()
+            self.vectorstore = None
+            self._file_ids = {}
+            self._clear_filters()
+            self._next_id = 0
+            self._tombstones = 0
+
+    # ---------- 增删改 ----------
+    @metrics.timed("sfs_embedding_op_seconds", op="build")
     def build_index(self, file_objects):
         """用文件对象（FileInfo）列表建立索引"""
+        self._check_writable()
+        file_objects = list(file_objects)
         texts = []
         metadatas = []
+        with_text = []
         for f in file_objects:
             if f.content["text_summary"]:
                 texts.append(f.content["text_summary"])
-                metadatas.append(f.to_dict())
+                metadatas.append(self._index_metadata(f))
+                with_text.append(f)
+        int_ids = self._catalog_ids(file_objects, metadatas)
 
         if texts:
-            self.vectorstore = FAISS.from_texts(texts, self.embeddings, metadatas=metadatas)
+            vectors = self._file_vectors(with_text, texts)
+            with self._lock:
+                self._reset()
+                self._add_documents(texts, metadatas, vectors, int_ids)
+            self._persist(len(texts))
+
+    @metrics.timed("sfs_embedding_op_seconds", op="bulk_load")
+    def bulk_load(self, batches, replace=True):
+        """
+        大批量导入（例如首次导入整个共享目录）。batches 是 FileInfo 列表的可迭代对象，可以是边解析边产出的生成器，
+        每取到一批就 embedding 并直接写入内存中的索引，后面的批次分类时已能检索到前面的文件。
+        导入期间不写 WAL、不做快照；全部写完后按需迁移索引类型，只保存一次。
+        中途失败时磁盘上的快照与 WAL 仍是导入前的状态；新登记的目录行先记入 <persist_path>.bulk_rows，
+        失败时（或进程中断后下次启动时）删除其中没有向量的行，快照保存后清除该记录。导入期间不应有其它写入。
+        :param replace: True 时替换现有索引（同 build_index），False 时按 file_id 覆盖写入现有索引
+        :return: 写入的向量数
+        """
+        self._check_writable()
+        with self._lock:
+            if replace:
+                self.vectorstore = None
+                self._file_ids = {}
+                self._clear_filters()
+                self._next_id = 0
+                self._tombstones = 0
+        total = 0
+        try:
+            for batch in batches:
+                texts = []
+                metadatas = []
+                with_text = []
+                for f in batch:
+                    if f.content["text_summary"]:
+                        texts.append(f.content["text_summary"])
+                        metadatas.append(self._index_metadata(f))
+                        with_text.append(f)
+                if self.catalog is not None:
+                    self._journal_new_catalog_rows(batch)
+                int_ids = self._catalog_ids(list(batch), metadatas)
+                if not texts:
+                    continue
+                vectors = self._file_vectors(with_text, texts)
+                with self._lock:
+                    if self.vectorstore is not None:
+                        # 同一文件再次出现（追加导入、或断点续传时重复产出）时覆盖旧向量
+                        stale = [i for f in with_text for i in self._file_ids.get(f.file_id, [])]
+                        if stale:
+                            self._apply_remove(stale)
+                    if int_ids is None:
+                        int_ids = list(range(self._next_id, self._next_id + len(texts)))
+                    self._apply_add(int_ids, [str(uuid.uuid4()) for _ in texts], texts, metadatas, vectors)
+                total += len(texts)
+        except BaseException:
+            # 已写入内存索引的行保留在记录中（之后保存快照即生效），只删掉失败批次里没有向量的行
+            if self.catalog is not None:
+                self._drop_unindexed_bulk_rows(finished=False)
+            raise
+
+        vs = self.vectorstore
+        metrics.set_gauge("sfs_index_vectors", len(vs.index_to_docstore_id) if vs else 0)
+        # 导入结束后才迁移索引类型（一次训练/建图），迁移时已保存
+        if not self._maybe_rebuild_index():
             self.save_index()
+        return total
 
     def add_file(self, file_obj):
         """单文件添加到向量数据库"""
+        self._check_writable()
         if not self.vectorstore:
             self.build_index([file_obj])
             return
 
+        if self.catalog is not None:
+            # 同一文件重复添加时按 file_id 替换，目录 id 不变
+            self.upsert_files([file_obj])
+            return
         if file_obj.content["text_summary"]:
-            self.vectorstore.add_texts(
-                [file_obj.content["text_summary"]],
-                metadatas=[file_obj.to_dict()]
-            )
-            self.save_index()
+            texts = [file_obj.content["text_summary"]]
+            self._add_documents(texts, [self._index_metadata(file_obj)], self._file_vectors([file_obj], texts))
+            self._persist(1)
 
-    def delete_file(self, file_id):
-        """删除指定 file_id 的文件"""
+    @metrics.timed("sfs_embedding_op_seconds", op="delete")
+    def delete_files(self, file_ids):
+        """批量删除，返回实际删除的文件数"""
+        self._check_writable()
+        file_ids = list(file_ids)
+        if self.catalog is not None:
+            self.catalog.delete(file_ids)
         if not self.vectorstore:
-            return False
+            return 0
+        removed = self._remove_file_ids(file_ids)
+        if removed:
+            self._persist(len(removed))
+        return len(removed)
 
+    def delete_file(self, file_id):
+        """删除指定 file_id 的文件"""
         try:
-            self.vectorstore.docstore._dict = {
-                k: v for k, v in self.vectorstore.docstore._dict.items()
-                if v.metadata["file_id"] != file_id
-            }
-            self.vectorstore.index.reset()
-            self.vectorstore.add_texts(
-                [doc.page_content for doc in self.vectorstore.docstore._dict.values()],
-                metadatas=[doc.metadata for doc in self.vectorstore.docstore._dict.values()]
-            )
-            self.save_index()
-            print(f"🗑️ 已删除文件: {file_id}")
-            return True
+            if self.delete_files([file_id]):
+                print(f"🗑️ 已删除文件: {file_id}")
+                return True
+            return False
         except Exception as e:
             print(f"⚠️ 删除失败: {e}")
             return False
 
+    @metrics.timed("sfs_embedding_op_seconds", op="upsert")
+    def upsert_files(self, file_objs):
+        """
+        批量新增或替换：先按 file_id 移除旧向量，再一次性 embedding 新摘要。
+        返回 (新增数, 更新数)
+        """
+        self._check_writable()
+        file_objs = list(file_objs)
+        texts = []
+        metadatas = []
+        with_text = []
+        for f in file_objs:
+            if f.content["text_summary"]:
+                texts.append(f.content["text_summary"])
+                metadatas.append(self._index_metadata(f))
+                with_text.append(f)
+        int_ids = self._catalog_ids(file_objs, metadatas)
+        vectors = self._file_vectors(with_text, texts) if texts else None
+
+        with self._lock:
+            replaced = set()
+            if self.vectorstore:
+                replaced = self._remove_file_ids([f.file_id for f in file_objs])
+            if texts:
+                self._add_documents(texts, metadatas, vectors, int_ids)
+        added = sum(1 for m in metadatas if m["file_id"] not in replaced)
+        if texts or replaced:
+            self._persist(len(texts) + len(replaced))
+        return added, len(replaced)
+
     def update_file(self, file_obj):
-        """更新文件（先删再加）"""
-        deleted = self.delete_file(file_obj.file_id)
-        self.add_file(file_obj)
-        if deleted:
+        """更新文件（只替换该文件自己的向量）"""
+        _, replaced = self.upsert_files([file_obj])
+        if replaced:
             print(f"🔄 文件已更新: {file_obj.name}")
         else:
             print(f"➕ 文件已新增: {file_obj.name}")
 
-    def search(self, query, k=3):
-        """搜索"""
+    def move_files(self, moves):
+        """
+        文件改名 / 移动后更新索引中的路径：向量取自索引、摘要取自 Document，不重新解析也不重新 embedding，
+        file_id、标签与反馈保持不变。
+        :param moves: [(file_id, 新路径)]
+        :return: 实际更新了的 file_id 列表（索引中没有向量的文件不在其中）
+        """
+        self._check_writable()
+        infos = []
+        with self._lock:
+            vs = self.vectorstore
+            if vs is None:
+                return []
+            for file_id, new_path in moves:
+                ids = self._file_ids.get(file_id)
+                if not ids:
+                    continue
+                doc = vs.docstore.search(vs.index_to_docstore_id[ids[-1]])
+                if not isinstance(doc, Document):
+                    continue
+                # 启用目录时向量只带精简元数据，完整记录从目录取
+                info = self.catalog.get_by_file_id(file_id) if self.catalog is not None else None
+                if info is None:
+                    info = FileInfo.from_dict(doc.metadata)
+                info.text_summary = doc.page_content
+                info.path = new_path
+                info.name = os.path.basename(new_path)
+                info.ext = info.name.split('.')[-1].lower()
+                info.embedding = ann_index.get_vectors(vs.index, ids[-1:])[0]
+                infos.append(info)
+        if infos:
+            self.upsert_files(infos)
+        return [info.file_id for info in infos]
+
+    def search(self, query, k=3, filters=None):
+        """
+        搜索。
+        filters: 可选的结构化过滤条件，如 {"type": "document", "ext": ["pdf", "docx"], "label": "contract",
+                 "modified_after": "2025-01-01"}，在索引内预过滤（见 _matching_ids）
+        """
+        return [doc for doc, _ in self._cached_search(query, k, filters)]
+
+    def search_with_scores(self, query, k=3, filters=None):
+        """
+        搜索并返回 [(Document, 相似度)]。
+        写入索引与检索前向量都做了 L2 归一化，cos = 1 - d²/2，这里换算成余弦相似度（越大越相似）。
+        """
+        return [(doc, 1.0 - float(dist) / 2.0) for doc, dist in self._cached_search(query, k, filters)]
+
+    def search_by_vector(self, vector, k=3, filters=None):
+        """用已有向量检索（不再 embedding），参数与 search 相同"""
+        return [doc for doc, _ in self._search_by_vector(vector, k, filters)]
+
+    def search_by_vector_with_scores(self, vector, k=3, filters=None):
+        """用已有向量检索，返回 [(Document, 相似度)]"""
+        return [(doc, 1.0 - float(dist) / 2.0) for doc, dist in self._search_by_vector(vector, k, filters)]
+
+    def embed_file(self, file_obj):
+        """
+        计算并记录文件摘要的向量（file_obj.embedding）。
+        分类时用它做近邻检索，随后入库（upsert_files 等）直接复用，同一摘要只 embedding 一次。
+        摘要修改后需把 embedding 置为 None。
+        """
+        if file_obj.embedding is None and file_obj.content["text_summary"]:
+            file_obj.embedding = self._embed([file_obj.content["text_summary"]])[0]
+        return file_obj.embedding
+
+    def embed_files(self, file_objs):
+        """embed_file 的批量版本：尚无 embedding 的文件一次性 embedding"""
+        todo = [f for f in file_objs if f.embedding is None and f.content["text_summary"]]
+        if todo:
+            for f, vector in zip(todo, self._embed([f.content["text_summary"] for f in todo])):
+                f.embedding = vector
+        return [f.embedding for f in file_objs]
+
+    def _cached_search(self, query, k, filters):
+        """按 (规范化查询, k, 过滤条件) 缓存 _search_by_vector 的结果；缓存项记录索引代数，索引变化后自动失效"""
         if not self.vectorstore:
             return []
-        return self.vectorstore.similarity_search(query, k=k)
+        key = None
+        if self.result_cache_size:
+            key = (normalize_text(query), k, json.dumps(filters, sort_keys=True, default=str) if filters else None)
+            with self._lock:
+                generation = self._generation
+                cached = self._result_cache.get(key)
+                if cached is not None and cached[0] == generation:
+                    self._result_cache.move_to_end(key)
+                    metrics.inc("sfs_search_cache_total", result="hit")
+                    return list(cached[1])
+            metrics.inc("sfs_search_cache_total", result="miss")
+
+        results = self._search_by_vector(self.embeddings.embed_query(query), k, filters)
+        if key is not None:
+            with self._lock:
+                # 检索期间索引被修改过的结果不缓存
+                if self._generation == generation:
+                    self._result_cache[key] = (generation, results)
+                    self._result_cache.move_to_end(key)
+                    if len(self._result_cache) > self.result_cache_size:
+                        self._result_cache.popitem(last=False)
+        return list(results)
+
+    # ---------- 持久化 ----------
+    def _persist(self, ops):
+        """变更后的持久化：sync 模式立即保存，WAL 模式按策略唤醒后台快照线程"""
+        self._maybe_rebuild_index()
+        vs = self.vectorstore
+        metrics.set_gauge("sfs_index_vectors", len(vs.index_to_docstore_id) if vs else 0)
+        if self.wal is None:
+            self.save_index()
+            return
+        with self._lock:
+            self._dirty_ops += ops
+            due = (self._dirty_ops >= self.snapshot_ops
+                   or time.monotonic() - self._last_snapshot >= self.snapshot_interval)
+        if due:
+            self._snapshot_due.set()
 
+    @metrics.timed("sfs_embedding_op_seconds", op="save")
     def save_index(self):
-        """保存向量数据库"""
-        if self.vectorstore:
-            self.vectorstore.save_local(self.persist_path)
+        """
+        保存向量数据库。
+        持锁期间只在内存中序列化索引并轮转 WAL，写盘在锁外进行，
+        先写临时目录再替换，不会留下写了一半的快照。
+        """
+        with self._snapshot_lock:
+            self._save_snapshot()
+
+    def _save_snapshot(self):
+        with self._lock:
+            payload = None
+            if self.vectorstore:
+                vs = self.vectorstore
+                payload = (faiss.serialize_index(vs.index),
+                           pickle.dumps((vs.docstore, vs.index_to_docstore_id)))
+            if self.wal is not None:
+                self.wal.rotate()
+            self._dirty_ops = 0
+            self._last_snapshot = time.monotonic()
+
+        if payload is not None:
+            tmp_path = f"{self.persist_path}.tmp"
+            old_path = f"{self.persist_path}.old"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            for name, data in (("index.faiss", payload[0]), ("index.pkl", payload[1])):
+                with open(os.path.join(tmp_path, name), "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            if os.path.exists(self.persist_path):
+                os.rename(self.persist_path, old_path)
+            os.rename(tmp_path, self.persist_path)
+            shutil.rmtree(old_path, ignore_errors=True)
             print(f"💾 索引已保存到 {self.persist_path}")
+        elif os.path.exists(self.persist_path):
+            # 索引已清空：先整体改名再删除，否则下次启动会重新加载旧快照
+            deleted_path = f"{self.persist_path}.deleted"
+            shutil.rmtree(deleted_path, ignore_errors=True)
+            os.rename(self.persist_path, deleted_path)
+            shutil.rmtree(deleted_path, ignore_errors=True)
+            print(f"🗑️ 索引已清空，已删除快照 {self.persist_path}")
+        if self.wal is not None:
+            self.wal.discard_rotated()
+        if self.catalog is not None:
+            # 快照已包含 bulk_load 写入内存的向量
+            self._drop_unindexed_bulk_rows()
+
+    def _journal_new_catalog_rows(self, file_objs):
+        """bulk_load 登记目录前先把其中新文件的 file_id 落盘，中断后据此删除没有向量的行"""
+        known = self.catalog.ids_for([f.file_id for f in file_objs])
+        new = [f.file_id for f in file_objs if f.file_id not in known]
+        if not new:
+            return
+        with open(f"{self.persist_path}.bulk_rows", "a", encoding="utf-8") as f:
+            f.write("".join(f"{file_id}\n" for file_id in new))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _drop_unindexed_bulk_rows(self, finished=True):
+        """
+        删除 bulk_load 新登记、但索引中没有向量的目录行，返回删除的行数
+        :param finished: 是否同时清除记录（快照已保存或启动恢复时）；导入失败但内存索引尚未保存时保留
+        """
+        journal_path = f"{self.persist_path}.bulk_rows"
+        if not os.path.exists(journal_path):
+            return 0
+        with open(journal_path, encoding="utf-8") as f:
+            file_ids = {line.strip() for line in f if line.strip()}
+        with self._lock:
+            orphans = [file_id for file_id in file_ids if file_id not in self._file_ids]
+        dropped = self.catalog.delete(orphans) if orphans else 0
+        if finished:
+            os.remove(journal_path)
+        return dropped
+
+    def _recover_snapshot_dirs(self):
+        """处理快照替换过程中崩溃留下的目录"""
+        old_path = f"{self.persist_path}.old"
+        if os.path.exists(old_path):
+            if os.path.exists(self.persist_path):
+                shutil.rmtree(old_path, ignore_errors=True)
+            else:
+                os.rename(old_path, self.persist_path)
+        shutil.rmtree(f"{self.persist_path}.tmp", ignore_errors=True)
+        shutil.rmtree(f"{self.persist_path}.deleted", ignore_errors=True)
+
+    def _replay_wal(self):
+        """在快照之上回放 WAL；已包含在快照中的变更会被跳过（幂等）"""
+        count = 0
+        for record in self.wal.replay():
+            op = record.get("op")
+            if op == "reset":
+                self.vectorstore = None
+                self._file_ids = {}
+                self._clear_filters()
+                self._next_id = 0
+                self._tombstones = 0
+            elif op == "add":
+                known = self.vectorstore.index_to_docstore_id if self.vectorstore else {}
+                items = [it for it in record["items"] if it["id"] not in known]
+                if items:
+                    self._apply_add(
+                        [it["id"] for it in items],
+                        [it["doc_id"] for it in items],
+                        [it["text"] for it in items],
+                        [it["metadata"] for it in items],
+                        np.stack([decode_vector(it["vector"]) for it in items]),
+                    )
+            elif op == "remove" and self.vectorstore:
+                ids = [i for i in record["ids"] if i in self.vectorstore.index_to_docstore_id]
+                if ids:
+                    self._apply_remove(ids)
+            count += 1
+        self._dirty_ops = count
+        return count
+
+    def close(self):
+        """关闭时先停止后台快照线程，再把 WAL 中未快照的变更落盘"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._atexit_hook is not None:
+            atexit.unregister(self._atexit_hook)
+        if self.wal is not None:
+            self._snapshot_due.set()
+            if self._flusher is not None and self._flusher is not threading.current_thread():
+                self._flusher.join()
+            if self._dirty_ops:
+                self.save_index()
+            self.wal.close()
+
+
+def _flush_loop(ref, closed, snapshot_due, interval):
+    """后台快照线程：按间隔或被唤醒时保存有变更的索引；EmbeddingManager 被回收或关闭后退出"""
+    while True:
+        snapshot_due.wait(interval)
+        snapshot_due.clear()
+        if closed.is_set():
+            return
+        em = ref()
+        if em is None:
+            return
+        if em._dirty_ops:
+            try:
+                em.save_index()
+            except Exception as e:
+                print(f"⚠️ 定时快照失败: {e}")
+        del em
+
+
+def _close_ref(ref):
+    em = ref()
+    if em is not None:
+        em.close()
+
+
+def _unit(vectors):
+    """L2 归一化（返回副本），使索引中的 L2 距离与余弦相似度对应；零向量保持不变"""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _embeddings_model_id(embeddings):
+    """Embeddings 实例的模型标识（类名:模型名），如 OllamaEmbeddings:bge-m3；取不到时返回 None"""
+    for attr in ("model", "model_name", "model_id"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value:
+            return f"{type(embeddings).__name__}:{value}"
+    return None
+
+
+def _filter_attrs(meta):
+    """从向量的 metadata（FileInfo.to_index_metadata()，旧快照中为 to_dict()）中取出可过滤的属性"""
+    return {
+        "type": meta.get("type"),
+        "ext": (meta.get("ext") or "").lower().lstrip(".") or None,
+        "label": meta.get("feedback") or meta.get("final_label"),
+        "modified_at": meta.get("modified_at") or (meta.get("metadata") or {}).get("modified_at"),
+    }
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _list_ollama_models():
+    """
+    返回 `ollama list` 的输出文本；检测失败返回 None。
+    结果缓存在进程内，并写入 OLLAMA_MODELS_CACHE，有效期内的新进程无需再启动 ollama。
+    """
+    global _ollama_models
+    with _ollama_models_lock:
+        if _ollama_models is not None:
+            return _ollama_models or None
+
+        try:
+            with open(OLLAMA_MODELS_CACHE, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if time.time() - cached["checked_at"] < OLLAMA_MODELS_TTL:
+                _ollama_models = cached["output"]
+                return _ollama_models or None
+        except (OSError, ValueError, KeyError):
+            pass
+
+        try:
+            result = subprocess.run(
+                ["ollama", "list"], capture_output=True, text=True, check=True
+            )
+            _ollama_models = result.stdout
+        except Exception as e:
+            print(f"⚠️ 无法检测 Ollama 模型: {e}")
+            # 失败只在进程内记住，不写磁盘，下次启动重新检测
+            _ollama_models = ""
+            return None
+
+        try:
+            os.makedirs(os.path.dirname(OLLAMA_MODELS_CACHE), exist_ok=True)
+            with open(OLLAMA_MODELS_CACHE, "w", encoding="utf-8") as f:
+                json.dump({"checked_at": time.time(), "output": _ollama_models}, f, ensure_ascii=False)
+        except OSError:
+            pass
+        return _ollama_models
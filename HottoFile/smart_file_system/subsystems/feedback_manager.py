@@ -1,57 +1,323 @@
+import atexit
 import json
 import os
+import threading
+import time
+
+from ..utils import metrics
+from .fewshot_index import FewShotIndex, estimate_tokens, truncate_to_tokens
+
 
 class FeedbackManager:
-    def __init__(self, storage_path="feedback.json", embedding_manager=None):
+    def __init__(self, storage_path="feedback.jsonl", embedding_manager=None, fsync_every=16,
+                 fsync_interval=1.0, compact_min_records=1000, compact_ratio=0.5, embeddings=None,
+                 fewshot_token_budget=400, fewshot_example_tokens=120):
         """
         Args:
-            storage_path (str): JSON file to store feedback
+            storage_path (str): append-only JSONL log to store feedback. A legacy ``feedback.json``
+                next to it (or ``storage_path`` itself if it ends in ``.json``) is migrated once.
             embedding_manager: Optional, if provided will update FAISS when feedback is added
+            fsync_every (int): fsync the log after this many appended records
+            fsync_interval (float): ... or when this many seconds passed since the last fsync
+            compact_min_records (int): never compact logs shorter than this
+            compact_ratio (float): compact when superseded records exceed this share of the log
+            embeddings: Embeddings used for similarity-based few-shot retrieval; defaults to
+                ``embedding_manager.embeddings``. Without either, the latest corrections are used.
+            fewshot_token_budget (int): approximate token budget for all few-shot summaries together
+            fewshot_example_tokens (int): each example summary is truncated to this many tokens
         """
+        legacy_path = None
+        if storage_path.endswith(".json"):
+            legacy_path, storage_path = storage_path, storage_path + "l"
+        else:
+            legacy_path = os.path.splitext(storage_path)[0] + ".json"
+
         self.storage_path = storage_path
         self.embedding_manager = embedding_manager
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_min_records = compact_min_records
+        self.compact_ratio = compact_ratio
+        self.fewshot_token_budget = fewshot_token_budget
+        self.fewshot_example_tokens = fewshot_example_tokens
+        if embeddings is None and embedding_manager is not None:
+            embeddings = getattr(embedding_manager, "embeddings", None)
+        # built lazily on the first similarity query
+        self._fewshot = FewShotIndex(embeddings) if embeddings is not None else None
+        self._fewshot_ready = False
+        self._fewshot_build_lock = threading.Lock()
+
+        self._lock = threading.RLock()
+        # seq -> record，只保留每个 file_id 的最新一条（按 seq 顺序）
+        self._records = {}
+        self._by_file_id = {}
+        self._by_label = {}
+        self._seq = 0
+        self._log_lines = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
 
+        storage_dir = os.path.dirname(storage_path)
+        if storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
         if os.path.exists(storage_path):
-            with open(storage_path, "r", encoding="utf-8") as f:
-                self.corrections = json.load(f)
-        else:
-            self.corrections = []
+            self._load_log()
+        elif legacy_path and os.path.exists(legacy_path):
+            self._migrate_legacy(legacy_path)
+
+        self._log = open(storage_path, "a", encoding="utf-8")
+        atexit.register(self.close)
+
+    # ---------- persistence ----------
+    def _load_log(self):
+        with open(self.storage_path, "rb") as f:
+            data = f.read()
+        # 上次崩溃时可能只写了半行：截掉最后一个换行之后的内容
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            print(f"⚠️ Dropping torn tail of feedback log ({len(data) - end} bytes)")
+            with open(self.storage_path, "r+b") as f:
+                f.truncate(end)
+            data = data[:end]
+
+        for line in data.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"⚠️ Skipping corrupt feedback record: {line[:80]}")
+                continue
+            self._log_lines += 1
+            self._index(record)
+
+    def _migrate_legacy(self, legacy_path):
+        """One-time import of the old feedback.json list; the legacy file is left untouched"""
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                corrections = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not migrate {legacy_path}: {e}")
+            return
+
+        records = []
+        for correction in corrections:
+            self._seq += 1
+            record = dict(correction, seq=self._seq)
+            records.append(record)
+            self._index(record)
+        self._rewrite(records)
+        self._log_lines = len(records)
+        print(f"📜 Migrated {len(records)} corrections from {legacy_path} to {self.storage_path}")
+
+    def _rewrite(self, records):
+        tmp_path = self.storage_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.storage_path)
+
+    def _index(self, record):
+        self._seq = max(self._seq, record.get("seq", self._seq + 1))
+        record.setdefault("seq", self._seq)
+        previous = self._by_file_id.get(record.get("file_id"))
+        if previous is not None:
+            self._unindex(previous)
+        self._records[record["seq"]] = record
+        self._by_file_id[record.get("file_id")] = record
+        self._by_label.setdefault(record.get("correct_label"), {})[record["seq"]] = record
+        return previous
+
+    def _unindex(self, record):
+        self._records.pop(record["seq"], None)
+        bucket = self._by_label.get(record.get("correct_label"))
+        if bucket is not None:
+            bucket.pop(record["seq"], None)
+            if not bucket:
+                del self._by_label[record.get("correct_label")]
+
+    @metrics.timed("sfs_feedback_append_seconds")
+    def _append(self, record):
+        self._log.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._log.flush()
+        self._log_lines += 1
+        self._unsynced += 1
+        now = time.monotonic()
+        if self._unsynced >= self.fsync_every or now - self._last_sync >= self.fsync_interval:
+            self._sync(now)
+
+    def _sync(self, now=None):
+        if self._unsynced:
+            with metrics.timer("sfs_feedback_fsync_seconds"):
+                os.fsync(self._log.fileno())
+            self._unsynced = 0
+        self._last_sync = now if now is not None else time.monotonic()
+
+    def _maybe_compact(self):
+        superseded = self._log_lines - len(self._records)
+        if self._log_lines >= self.compact_min_records and superseded > self._log_lines * self.compact_ratio:
+            self.compact()
+
+    @metrics.timed("sfs_feedback_compact_seconds")
+    def compact(self):
+        """Rewrite the log keeping only the latest correction per file"""
+        with self._lock:
+            self._log.close()
+            records = list(self._records.values())
+            self._rewrite(records)
+            self._log_lines = len(records)
+            self._unsynced = 0
+            self._log = open(self.storage_path, "a", encoding="utf-8")
+            print(f"🗑️ Feedback log compacted to {len(records)} records")
 
+    def flush(self):
+        """Force buffered records to disk"""
+        with self._lock:
+            if not self._log.closed:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            if not self._log.closed:
+                self._sync()
+                self._log.close()
+
+    # ---------- public API ----------
+    @metrics.timed("sfs_feedback_add_seconds")
     def add_feedback(self, file_info, correct_label):
         """
         Add feedback for a file, persist it, and update embedding DB if provided.
         """
         file_info.update_label(correct_label, feedback=True)
 
-        correction = {
-            "file_id": file_info.file_id,
-            "name": file_info.name,
-            "summary": file_info.content.get("text_summary", ""),
-            "correct_label": correct_label
-        }
-
-        # 存到内存
-        self.corrections.append(correction)
+        with self._lock:
+            self._seq += 1
+            correction = {
+                "seq": self._seq,
+                "file_id": file_info.file_id,
+                "name": file_info.name,
+                "summary": file_info.content.get("text_summary", ""),
+                "correct_label": correct_label,
+                "ts": time.time(),
+            }
+            # 只追加一行，不再重写整个文件
+            self._append(correction)
+            previous = self._index(correction)
+            self._maybe_compact()
+            fewshot_ready = self._fewshot_ready
+        metrics.inc("sfs_feedback_records_total")
 
-        # 存到 JSON 文件
-        with open(self.storage_path, "w", encoding="utf-8") as f:
-            json.dump(self.corrections, f, indent=4, ensure_ascii=False)
+        if fewshot_ready:
+            try:
+                if previous is not None:
+                    self._fewshot.remove([previous["seq"]])
+                self._fewshot.add_many([correction])
+            except Exception as e:
+                print(f"⚠️ Could not update few-shot index: {e}")
 
-        # 如果有 embedding_manager，更新向量数据库
+        # 如果有 embedding_manager，更新向量数据库（按 file_id 替换，不产生重复条目；
+        # 摘要未变时向量直接来自缓存）
         if self.embedding_manager:
             try:
-                self.embedding_manager.add_file(file_info)
+                self.embedding_manager.update_file(file_info)
                 print(f"🔄 Embedding DB updated for corrected file: {file_info.name}")
             except Exception as e:
                 print(f"⚠️ Could not update embedding DB: {e}")
 
         print(f"✅ Feedback saved for {file_info.name} -> {correct_label}")
 
+    @property
+    def version(self):
+        """Monotonic sequence number of the latest correction"""
+        return self._seq
+
+    @property
+    def corrections(self):
+        """Latest correction per file, oldest first"""
+        with self._lock:
+            return list(self._records.values())
+
     def load_feedback(self):
         """Return all stored corrections"""
         return self.corrections
 
-    def get_fewshot_examples(self, n=3):
-        """Get a few feedback examples for LLM few-shot prompting"""
-        return self.corrections[-n:] if self.corrections else []
+    def get_by_file_id(self, file_id):
+        """Latest correction for a file, or None"""
+        with self._lock:
+            return self._by_file_id.get(file_id)
+
+    def get_by_label(self, label):
+        """All current corrections with the given label, oldest first"""
+        with self._lock:
+            return list(self._by_label.get(label, {}).values())
+
+    def labels(self):
+        """{label: number of corrections}"""
+        with self._lock:
+            return {label: len(bucket) for label, bucket in self._by_label.items()}
+
+    @metrics.timed("sfs_feedback_fewshot_seconds")
+    def get_fewshot_examples(self, n=3, query=None, token_budget=None):
+        """
+        Get a few feedback examples for LLM few-shot prompting.
+
+        With a ``query`` (the summary being classified) and embeddings available, the n most
+        similar corrections are returned, most similar first; otherwise the latest n.
+        Summaries are truncated and examples dropped so the total stays within ``token_budget``
+        (defaults to ``fewshot_token_budget``).
+        """
+        if n <= 0:
+            return []
+        examples = None
+        if query and self._fewshot is not None:
+            try:
+                examples = self._similar(query, n)
+            except Exception as e:
+                print(f"⚠️ Few-shot similarity search failed, using latest corrections: {e}")
+        if examples is None:
+            with self._lock:
+                examples = list(self._records.values())[-n:]
+        return self._fit_budget(examples, self.fewshot_token_budget if token_budget is None else token_budget)
+
+    def _similar(self, query, n):
+        if not self._fewshot_ready:
+            self._build_fewshot()
+        hits = self._fewshot.search(query, n)
+        with self._lock:
+            return [self._records[seq] for seq, _ in hits if seq in self._records]
+
+    def _build_fewshot(self):
+        """
+        首次相似度检索时建立 few-shot 索引。只在持锁时复制记录，embedding 在锁外进行，
+        不阻塞 add_feedback；建索引期间新增或被取代的反馈在置 _fewshot_ready 时一并补上。
+        """
+        with self._fewshot_build_lock:
+            if self._fewshot_ready:
+                return
+            with self._lock:
+                records = list(self._records.values())
+            self._fewshot.rebuild(records)
+            built = {r["seq"] for r in records}
+            with self._lock:
+                # 此后的 add_feedback 会自己更新索引
+                self._fewshot_ready = True
+                missing = [r for seq, r in self._records.items() if seq not in built]
+                stale = built.difference(self._records)
+            if stale:
+                self._fewshot.remove(stale)
+            if missing:
+                self._fewshot.add_many(missing)
 
+    def _fit_budget(self, examples, token_budget):
+        fitted = []
+        used = 0
+        for ex in examples:
+            summary = truncate_to_tokens(ex.get("summary", "") or "", self.fewshot_example_tokens)
+            cost = estimate_tokens(summary) + estimate_tokens(ex.get("correct_label", "") or "")
+            if fitted and used + cost > token_budget:
+                break
+            used += cost
+            fitted.append(dict(ex, summary=summary, text_summary=summary))
+        return fitted
@@ -0,0 +1,97 @@
+import re
+import threading
+
+import faiss
+import numpy as np
+
+_CJK = re.compile("[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：CJK 字符按 1 个 token，其余按每 4 个字符 1 个 token"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """把文本截断到大约 max_tokens 个 token 以内"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + "…"
+
+
+class FewShotIndex:
+    """
+    反馈摘要的小型向量索引（内积 + 归一化向量 = 余弦相似度），
+    用于为待分类文件检索最相似的若干条人工修正作为 few-shot 示例。
+    以反馈记录的 seq 作为 FAISS ID，同一文件的旧反馈被新反馈取代时随之移除。
+    """
+
+    def __init__(self, embeddings):
+        """
+        :param embeddings: langchain Embeddings（如 EmbeddingManager.embeddings，带向量缓存）
+        """
+        self.embeddings = embeddings
+        self.index = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def rebuild(self, records):
+        """用全部当前反馈重建索引：新索引在锁外建好后整体替换，期间检索仍使用旧索引"""
+        vectors, ids = self._embed(records)
+        index = None
+        if vectors is not None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+            index.add_with_ids(vectors, ids)
+        with self._lock:
+            self.index = index
+
+    def add_many(self, records):
+        vectors, ids = self._embed(records)
+        if vectors is None:
+            return
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+            self.index.add_with_ids(vectors, ids)
+
+    def _embed(self, records):
+        records = [r for r in records if r.get("summary")]
+        if not records:
+            return None, None
+        vectors = self._normalize(self.embeddings.embed_documents([r["summary"] for r in records]))
+        return vectors, np.asarray([r["seq"] for r in records], dtype=np.int64)
+
+    def remove(self, seqs):
+        with self._lock:
+            if self.index is not None and seqs:
+                self.index.remove_ids(np.asarray(list(seqs), dtype=np.int64))
+
+    def search(self, query, k):
+        """返回 [(seq, 相似度)]，按相似度从高到低"""
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0 or k <= 0:
+                return []
+        vector = self._normalize(self.embeddings.embed_query(query))
+        with self._lock:
+            scores, ids = self.index.search(vector, min(k, self.index.ntotal))
+        return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != -1]
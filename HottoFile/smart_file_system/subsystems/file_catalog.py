@@ -0,0 +1,247 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from ..data_structures.file_info import FileInfo
+
+_COLUMNS = ("id", "file_id", "path", "name", "ext", "type", "size", "created_at", "modified_at",
+            "final_label", "feedback", "label", "content", "candidates")
+
+
+class FileCatalog:
+    """
+    FileInfo 的持久化目录（SQLite），按 path / file_id / 标签 / 扩展名 / 类型 / 修改时间建索引。
+    每个文件一行，整数主键 id 同时作为向量索引中的 ID，向量通过它引用文件记录；
+    按条件列出文件不需要接触向量库。
+    label 列为生效标签：用户反馈优先，其次为分类结果。
+    """
+
+    def __init__(self, db_path="file_catalog.sqlite"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # AUTOINCREMENT：删除后的 id 不会被新文件复用，旧向量 ID 不会指向别的文件
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_id TEXT NOT NULL UNIQUE,
+                path TEXT,
+                name TEXT,
+                ext TEXT,
+                type TEXT,
+                size INTEGER,
+                created_at TEXT,
+                modified_at TEXT,
+                final_label TEXT,
+                feedback TEXT,
+                label TEXT,
+                content TEXT,
+                candidates TEXT
+            )
+            """
+        )
+        for column in ("path", "label", "ext", "type", "modified_at"):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_files_{column} ON files({column})")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_label_modified ON files(label, modified_at)")
+        self._conn.commit()
+
+    # ---------- 写入 ----------
+    def upsert_many(self, file_infos):
+        """批量新增或更新（按 file_id），返回 {file_id: id}"""
+        rows = [_to_row(f) for f in file_infos]
+        if not rows:
+            return {}
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO files ({', '.join(_COLUMNS[1:])}) VALUES ({', '.join('?' for _ in _COLUMNS[1:])}) "
+                "ON CONFLICT(file_id) DO UPDATE SET "
+                + ", ".join(f"{c} = excluded.{c}" for c in _COLUMNS[2:]),
+                rows,
+            )
+            self._conn.commit()
+            return self._ids_locked([row[0] for row in rows])
+
+    def upsert(self, file_info):
+        return self.upsert_many([file_info])[file_info.file_id]
+
+    def set_label(self, file_id, label, feedback=False):
+        """只更新标签（例如用户反馈），不重写整行"""
+        column = "feedback" if feedback else "final_label"
+        with self._lock:
+            self._conn.execute(f"UPDATE files SET {column} = ? WHERE file_id = ?", (label, file_id))
+            self._conn.execute("UPDATE files SET label = COALESCE(feedback, final_label) WHERE file_id = ?",
+                               (file_id,))
+            self._conn.commit()
+
+    def delete(self, file_ids):
+        """按 file_id 删除，返回删除的行数"""
+        file_ids = list(file_ids)
+        deleted = 0
+        with self._lock:
+            for i in range(0, len(file_ids), 500):
+                chunk = file_ids[i:i + 500]
+                cur = self._conn.execute(
+                    f"DELETE FROM files WHERE file_id IN ({', '.join('?' for _ in chunk)})", chunk
+                )
+                deleted += cur.rowcount
+            self._conn.commit()
+        return deleted
+
+    # ---------- 查询 ----------
+    def ids_for(self, file_ids):
+        """返回 {file_id: id}，只包含已登记的文件"""
+        with self._lock:
+            return self._ids_locked(list(file_ids))
+
+    def _ids_locked(self, file_ids):
+        found = {}
+        # SQLite 默认最多 999 个绑定参数
+        for i in range(0, len(file_ids), 500):
+            chunk = file_ids[i:i + 500]
+            found.update(self._conn.execute(
+                f"SELECT file_id, id FROM files WHERE file_id IN ({', '.join('?' for _ in chunk)})", chunk
+            ).fetchall())
+        return found
+
+    def get(self, row_id):
+        return self._one("id = ?", row_id)
+
+    def get_by_file_id(self, file_id):
+        return self._one("file_id = ?", file_id)
+
+    def get_by_path(self, path):
+        return self._one("path = ?", path)
+
+    def get_many(self, row_ids):
+        """按 id 批量取出，返回 {id: FileInfo}"""
+        row_ids = list(row_ids)
+        found = {}
+        with self._lock:
+            for i in range(0, len(row_ids), 500):
+                chunk = row_ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM files WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+                found.update((row[0], _from_row(row)) for row in rows)
+        return found
+
+    def _one(self, where, value):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM files WHERE {where}", (value,)).fetchone()
+        return _from_row(row) if row else None
+
+    def list_files(self, label=None, ext=None, ftype=None, modified_after=None, modified_before=None,
+                   path_prefix=None, order_by="modified_at DESC", limit=None, offset=0):
+        """
+        按条件列出文件，全部条件走索引。
+        :param label: 生效标签（反馈优先），可以是单个值或列表
+        :param ext: 扩展名（不含点），可以是单个值或列表
+        :param ftype: 文件类型（document / image / ...），可以是单个值或列表
+        :param modified_after / modified_before: 修改时间区间 [after, before)，datetime 或 ISO 字符串
+        :param path_prefix: 只列出该目录下的文件
+        :param order_by: "modified_at DESC" / "modified_at" / "id" / "path"
+        :return: [FileInfo]，每个对象带有 catalog_id 属性
+        """
+        where, params = self._where(label=label, ext=ext, ftype=ftype, modified_after=modified_after,
+                                    modified_before=modified_before, path_prefix=path_prefix)
+        if order_by not in ("modified_at DESC", "modified_at", "id", "path"):
+            raise ValueError(f"Unsupported order_by: {order_by}")
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM files{where} ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset)]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def count(self, **filters):
+        """满足 list_files 同样条件的文件数"""
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM files{where}", params).fetchone()[0]
+
+    def select_ids(self, **filters):
+        """满足条件的 id 集合（用于向量检索的预过滤）"""
+        where, params = self._where(**filters)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(f"SELECT id FROM files{where}", params)}
+
+    @staticmethod
+    def _where(label=None, ext=None, ftype=None, modified_after=None, modified_before=None, path_prefix=None):
+        clauses = []
+        params = []
+        for column, value in (("label", label), ("ext", ext), ("type", ftype)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            if column == "ext":
+                values = [v.lower().lstrip(".") for v in values]
+            clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        if modified_after is not None:
+            clauses.append("modified_at >= ?")
+            params.append(_iso(modified_after))
+        if modified_before is not None:
+            clauses.append("modified_at < ?")
+            params.append(_iso(modified_before))
+        if path_prefix:
+            prefix = os.path.join(path_prefix, "")
+            # 用区间代替 LIKE，可以走 path 索引
+            clauses.append("path >= ? AND path < ?")
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def __len__(self):
+        return self.count()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _to_row(f):
+    return (
+        f.file_id,
+        f.path,
+        f.name,
+        (f.ext or "").lower(),
+        f.type,
+        f.metadata.get("size"),
+        f.metadata.get("created_at"),
+        f.metadata.get("modified_at"),
+        f.final_label,
+        f.feedback,
+        f.feedback or f.final_label,
+        json.dumps(dict(f.content), ensure_ascii=False, default=str),
+        json.dumps(f.candidates or [], ensure_ascii=False),
+    )
+
+
+def _from_row(row):
+    data = dict(zip(_COLUMNS, row))
+    info = FileInfo.from_dict({
+        "file_id": data["file_id"],
+        "path": data["path"],
+        "name": data["name"],
+        "ext": data["ext"],
+        "type": data["type"],
+        "metadata": {"size": data["size"], "created_at": data["created_at"], "modified_at": data["modified_at"]},
+        "content": json.loads(data["content"]) if data["content"] else {},
+        "candidates": json.loads(data["candidates"]) if data["candidates"] else [],
+        "final_label": data["final_label"],
+        "feedback": data["feedback"],
+    })
+    info.catalog_id = data["id"]
+    return info
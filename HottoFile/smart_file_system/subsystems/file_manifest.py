@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+import time
+
+from ..utils.hashing import file_sha256
+
+
+class FileManifest:
+    """
+    已入库文件的持久化清单：path, file_id, size, mtime, inode, content_hash。
+    把索引中的 file_id 与磁盘上的文件稳定地对应起来，供启动时对账使用。
+    路径统一存为绝对路径。
+    """
+
+    def __init__(self, db_path="file_manifest.sqlite"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS manifest (
+                path TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                content_hash TEXT,
+                indexed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_manifest_file_id ON manifest(file_id)")
+        self._conn.commit()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, file_id, size, mtime_ns, inode, content_hash FROM manifest WHERE path = ?", (path,)
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def file_id_for(self, path):
+        entry = self.get(path)
+        return entry["file_id"] if entry else None
+
+    def entries(self):
+        """返回 {path: entry}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, file_id, size, mtime_ns, inode, content_hash FROM manifest"
+            ).fetchall()
+        return {row[0]: _row_to_dict(row) for row in rows}
+
+    def record(self, path, file_id, content_hash=None):
+        """文件入库后登记（未给出哈希时现算）"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        if content_hash is None:
+            content_hash = file_sha256(path)
+        self.record_many([(path, file_id, st.st_size, st.st_mtime_ns, st.st_ino, content_hash)])
+
+    def record_many(self, rows):
+        """rows: [(path, file_id, size, mtime_ns, inode, content_hash), ...]"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO manifest (path, file_id, size, mtime_ns, inode, content_hash, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*row, now) for row in rows],
+            )
+            self._conn.commit()
+
+    def remove(self, paths):
+        with self._lock:
+            self._conn.executemany("DELETE FROM manifest WHERE path = ?", [(os.path.abspath(p),) for p in paths])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _row_to_dict(row):
+    return {
+        "path": row[0],
+        "file_id": row[1],
+        "size": row[2],
+        "mtime_ns": row[3],
+        "inode": row[4],
+        "content_hash": row[5],
+    }
@@ -1,20 +1,32 @@
 import time
 import os
 import logging
+import threading
+from collections import OrderedDict
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
+
 class FileMonitor:
-    def __init__(self, path, handler_func, watch_dirs=False):
+    def __init__(self, path, handler_func, watch_dirs=False, settle_time=1.0, poll_interval=0.5):
+        """
+        :param path: 监控的目录
+        :param handler_func: 文件写入完成后调用 handler_func(path)
+        :param watch_dirs: 是否也上报目录
+        :param settle_time: 文件大小/mtime 保持不变多久才视为写入完成（秒）
+        :param poll_interval: 检查待定文件的间隔（秒）
+        """
         self.path = path
         self.handler_func = handler_func
         self.watch_dirs = watch_dirs
-        self.event_handler = self.NewFileHandler(handler_func, watch_dirs)
+        self.coalescer = EventCoalescer(handler_func, settle_time=settle_time, poll_interval=poll_interval)
+        self.event_handler = self.NewFileHandler(self.coalescer, watch_dirs)
         self.observer = Observer()
 
     def start(self):
+        self.coalescer.start()
         self.observer.schedule(self.event_handler, self.path, recursive=True)
         self.observer.start()
         logging.info(f"Monitoring started on: {self.path}")
@@ -22,18 +34,130 @@ class FileMonitor:
     def stop(self):
         self.observer.stop()
         self.observer.join()
+        self.coalescer.stop()
         logging.info("Monitoring stopped.")
 
     class NewFileHandler(FileSystemEventHandler):
-        def __init__(self, handler_func, watch_dirs):
-            self.handler_func = handler_func
+        """只登记事件，不在 observer 线程上做任何等待或处理"""
+
+        def __init__(self, coalescer, watch_dirs):
+            self.coalescer = coalescer
             self.watch_dirs = watch_dirs
 
+        def _skip(self, event):
+            return not self.watch_dirs and event.is_directory
+
         def on_created(self, event):
-            if not self.watch_dirs and event.is_directory:
-                return
-            # 等待写入完成
-            time.sleep(0.5)
-            if os.path.exists(event.src_path):
-                logging.info(f"New file detected: {event.src_path}")
-                self.handler_func(event.src_path)
+            if not self._skip(event):
+                self.coalescer.touch(event.src_path)
+
+        def on_modified(self, event):
+            if not self._skip(event):
+                self.coalescer.touch(event.src_path)
+
+        def on_moved(self, event):
+            if not self._skip(event):
+                self.coalescer.discard(event.src_path)
+                self.coalescer.touch(event.dest_path)
+
+        def on_deleted(self, event):
+            if not self._skip(event):
+                self.coalescer.discard(event.src_path)
+
+
+class EventCoalescer:
+    """
+    合并同一路径的 created/modified/moved 事件，并判断写入是否完成：
+    文件的 (size, mtime) 在 settle_time 内不再变化才向下游发出，
+    同一内容状态只发出一次（只记住最近 max_emitted 个路径，更早的路径重复变化时可能再发一次）。
+    """
+
+    def __init__(self, handler_func, settle_time=1.0, poll_interval=0.5, max_emitted=10_000):
+        self.handler_func = handler_func
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.max_emitted = max_emitted
+        # path -> {"stat": (size, mtime) 或 None, "changed_at": 上次变化时间}
+        self._pending = {}
+        # path -> 最近一次发出时的 (size, mtime)，用于去重；LRU，长期运行时内存有界
+        self._emitted = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def touch(self, path):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pending.get(path)
+            if entry is None:
+                self._pending[path] = {"stat": None, "changed_at": now}
+            else:
+                entry["changed_at"] = now
+
+    def discard(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+            self._emitted.pop(path, None)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="file-monitor-coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            for path in self.poll():
+                logging.info(f"New file detected: {path}")
+                try:
+                    self.handler_func(path)
+                except Exception as e:
+                    logging.error(f"Handler failed for {path}: {e}")
+
+    def poll(self):
+        """检查所有待定路径，返回本轮已写入完成、需要处理的路径"""
+        now = time.monotonic()
+        with self._lock:
+            paths = list(self._pending)
+
+        ready = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                stat = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                stat = None
+
+            with self._lock:
+                entry = self._pending.get(path)
+                if entry is None:
+                    continue
+                if stat is None:
+                    # 文件已不存在（临时文件、被移走）
+                    del self._pending[path]
+                    self._emitted.pop(path, None)
+                    continue
+                if stat != entry["stat"]:
+                    entry["stat"] = stat
+                    entry["changed_at"] = now
+                    continue
+                if now - entry["changed_at"] < self.settle_time:
+                    continue
+                del self._pending[path]
+                if self._emitted.get(path) == stat:
+                    self._emitted.move_to_end(path)
+                    continue
+                self._emitted[path] = stat
+                self._emitted.move_to_end(path)
+                while len(self._emitted) > self.max_emitted:
+                    self._emitted.popitem(last=False)
+            ready.append(path)
+        return ready
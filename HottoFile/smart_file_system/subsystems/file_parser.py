@@ -1,123 +1,445 @@
+import io
 import os
-import subprocess
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-import pytesseract
-from PIL import Image
-
-import pdfplumber
-import docx
-import ppt
-import openpyxl
+# 各格式的解析库（pdfplumber / python-docx / python-pptx / openpyxl / pytesseract / PIL）
+# 在首次处理对应扩展名时才导入，避免拖慢只做检索的启动
 
 from ..data_structures.file_info import FileInfo
+from ..utils import metrics
+from ..utils.hashing import file_sha256
+from .llm_client import get_default_client
+
+# 解析逻辑或提示词变化时递增，使旧的缓存条目失效
+PARSER_VERSION = "2"
+# 每个文件最多抽取的字符数（摘要只用到这么多，抽够即停）
+MAX_TEXT_CHARS = 2000
+
+IMAGE_EXTS = ["jpg", "jpeg", "png"]
+IMAGE_PROMPT = "请描述这张图片的内容。"
+# 图片解码一次后分别缩放给 OCR 与视觉模型（最长边像素）；手机照片原图通常在 4000px 以上
+# （OCR 取 2000：4000px 级的 JPEG 照片可以直接按 1/2 解码）
+OCR_MAX_SIDE = 2000
+VLM_MAX_SIDE = 1344
+# 图片处理策略：
+#   concurrent  OCR 与视觉模型描述同时进行，单张图片的延迟约为两者中较慢的一个
+#   ocr_first   先 OCR，识别出的非空白字符达到 vlm_skip_chars 时不再调用视觉模型（扫描件、截图）
+IMAGE_STRATEGIES = ("concurrent", "ocr_first")
+VLM_SKIP_CHARS = 300
+# concurrent 策略下同时进行的视觉模型调用数（未传入 vlm_executor 时）
+VLM_WORKERS = 4
+SUMMARY_PROMPTS = {
+    "txt": "请总结以下文本内容：",
+    "md": "请总结以下文本内容：",
+    "pdf": "请总结以下 PDF 内容：",
+    "docx": "请总结以下 Word 文档内容：",
+    "doc": "请总结以下 Word 文档内容：",
+    "pptx": "请总结以下 PPT 内容：",
+    "ppt": "请总结以下 PPT 内容：",
+    "xlsx": "请总结以下 Excel 表格内容：",
+    "xls": "请总结以下 Excel 表格内容：",
+}
 
 
 class FileParser:
-    def __init__(self, llm_model="minicpm-v4.5"):
+    def __init__(self, llm_model="minicpm-v4.5", llm_client=None, llm_timeout=None, cache=None,
+                 text_budget=MAX_TEXT_CHARS, track_memory=False, image_strategy="concurrent",
+                 ocr_max_side=OCR_MAX_SIDE, vlm_max_side=VLM_MAX_SIDE, vlm_skip_chars=VLM_SKIP_CHARS,
+                 vlm_workers=VLM_WORKERS, vlm_executor=None):
         """
         :param llm_model: Ollama 本地运行的模型名称
+        :param llm_client: LLMBackend 实例，默认使用进程内共享的 HTTP 客户端
+        :param llm_timeout: 单次调用超时（秒），默认使用客户端配置
+        :param cache: 可选的 ParseCache，按内容哈希复用抽取与摘要结果
+        :param text_budget: 每个文件最多抽取的字符数
+        :param track_memory: 是否用 tracemalloc 统计每个文件抽取阶段的峰值内存（有额外开销，
+                             并发抽取时各文件的数值会互相叠加）
+        :param image_strategy: 图片处理策略，见 IMAGE_STRATEGIES
+        :param ocr_max_side / vlm_max_side: 交给 OCR / 视觉模型的图片最长边（像素），更大的图片先缩小
+        :param vlm_skip_chars: ocr_first 策略下跳过视觉模型所需的 OCR 字符数
+        :param vlm_workers: concurrent 策略下后台视觉模型调用的线程数（首次用到时才创建，close() 关闭）
+        :param vlm_executor: 可选的外部执行器，代替自建线程池；由调用方负责关闭
         """
+        if image_strategy not in IMAGE_STRATEGIES:
+            raise ValueError(f"未知的图片处理策略: {image_strategy}（可选 {', '.join(IMAGE_STRATEGIES)}）")
         self.llm_model = llm_model
+        self.llm_client = llm_client or get_default_client()
+        self.llm_timeout = llm_timeout
+        self.cache = cache
+        self.text_budget = text_budget
+        self.track_memory = track_memory
+        self.image_strategy = image_strategy
+        self.ocr_max_side = ocr_max_side
+        self.vlm_max_side = vlm_max_side
+        self.vlm_skip_chars = vlm_skip_chars
+        self.vlm_workers = vlm_workers
+        self._vlm_executor = vlm_executor
+        self._owns_vlm_executor = vlm_executor is None
+        self._vlm_executor_lock = threading.Lock()
+
+    def close(self):
+        """关闭自建的视觉模型线程池（等待进行中的调用结束）；外部传入的执行器不受影响"""
+        with self._vlm_executor_lock:
+            executor, owned = self._vlm_executor, self._owns_vlm_executor
+            if owned:
+                self._vlm_executor = None
+        if owned and executor is not None:
+            executor.shutdown(wait=True)
 
-    def _call_ollama(self, prompt, image_path=None):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _call_ollama(self, prompt, image=None):
         """
         调用 Ollama 的本地大模型 (minicpm-v4.5)，支持文本或图片输入
+        :param image: 图片路径或编码后的图片字节
         """
         try:
-            cmd = ["ollama", "run", self.llm_model, prompt]
-            if image_path:
-                cmd.extend(["--image", image_path])
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            return result.stdout.strip()
+            images = [image] if image else None
+            with metrics.timer("sfs_llm_request_seconds", model=self.llm_model, caller="parser"):
+                return self.llm_client.generate(self.llm_model, prompt, images=images, timeout=self.llm_timeout)
         except Exception as e:
+            metrics.inc("sfs_llm_errors_total", model=self.llm_model, caller="parser")
             print(f"调用 Ollama 模型失败: {e}")
             return ""
 
-    def parse_file(self, file_path):
+    def parse_file(self, file_path, file_id=None):
+        """
+        :param file_id: 已知的稳定 ID（例如来自文件清单），用于更新已入库的文件
+        """
+        file_ext = os.path.basename(file_path).split('.')[-1].lower()
+        start = time.perf_counter()
+        status = "error"
         try:
-            file_name = os.path.basename(file_path)
-            file_ext = file_name.split('.')[-1].lower()
-            file_size = os.path.getsize(file_path)
-            created_at = datetime.fromtimestamp(os.path.getctime(file_path)).isoformat()
-            modified_at = datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
-
-            text_summary = None
-            image_features = None
-            ftype = "other"
-
-            # 📄 文本类文件
-            if file_ext in ["txt", "md"]:
-                ftype = "document"
-                with open(file_path, "r", encoding="utf-8") as f:
-                    raw_text = f.read()
-                # 交给本地模型总结
-                text_summary = self._call_ollama(f"请总结以下文本内容：\n{raw_text[:2000]}")
-
-            elif file_ext == "pdf":
-                ftype = "document"
-                with pdfplumber.open(file_path) as pdf:
-                    raw_text = "\n".join([page.extract_text() or "" for page in pdf.pages])
-                text_summary = self._call_ollama(f"请总结以下 PDF 内容：\n{raw_text[:2000]}")
-
-            elif file_ext in ["docx", "doc"]:
-                ftype = "document"
-                doc = docx.Document(file_path)
-                raw_text = "\n".join([p.text for p in doc.paragraphs])
-                text_summary = self._call_ollama(f"请总结以下 Word 文档内容：\n{raw_text[:2000]}")
-
-            elif file_ext in ["pptx", "ppt"]:
-                ftype = "document"
-                prs = ppt.Presentation(file_path)
-                raw_text = []
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            raw_text.append(shape.text)
-                raw_text = "\n".join(raw_text)
-                text_summary = self._call_ollama(f"请总结以下 PPT 内容：\n{raw_text[:2000]}")
-
-            elif file_ext in ["xlsx", "xls"]:
-                ftype = "document"
-                wb = openpyxl.load_workbook(file_path)
-                raw_text = []
-                for sheet in wb.sheetnames:
-                    ws = wb[sheet]
-                    for row in ws.iter_rows(values_only=True):
-                        raw_text.append(" ".join([str(cell) if cell else "" for cell in row]))
-                raw_text = "\n".join(raw_text)
-                text_summary = self._call_ollama(f"请总结以下 Excel 表格内容：\n{raw_text[:2000]}")
-
-            # 🖼️ 图片文件
-            elif file_ext in ["jpg", "jpeg", "png"]:
-                ftype = "image"
-                try:
-                    # OCR 提取文本
-                    ocr_text = pytesseract.image_to_string(Image.open(file_path))
-                    # 用视觉模型生成图像描述
-                    image_desc = self._call_ollama("请描述这张图片的内容。", image_path=file_path)
-                    image_features = image_desc
-                    text_summary = f"OCR文本：{ocr_text}\n视觉模型描述：{image_desc}"
-                except Exception as e:
-                    print(f"OCR/图像解析失败: {e}")
-                    text_summary = ""
-                    image_features = ""
-
-            # 🎵 音频 & 🎬 视频 未来可加
-
-            # 组装 FileInfo
-            return FileInfo(
-                path=file_path,
-                name=file_name,
-                ext=file_ext,
-                ftype=ftype,
-                size=file_size,
-                created_at=created_at,
-                modified_at=modified_at,
-                text_summary=text_summary,
-                image_features=image_features
-            )
+            job = self.extract(file_path, file_id=file_id)
+            if job["needs_ocr"]:
+                self._ocr_and_describe(job)
+            self.summarize(job)
+            file_info = self.build_file_info(job)
+            status = "ok"
+            return file_info
 
         except Exception as e:
             print(f"解析文件 {file_path} 失败: {e}")
             return None
+        finally:
+            metrics.observe("sfs_parse_file_seconds", time.perf_counter() - start, format=file_ext)
+            metrics.inc("sfs_parse_files_total", format=file_ext, status=status)
+
+    # ---------- 分阶段接口（供 parse_file 与 IngestPipeline 使用） ----------
+    def extract(self, file_path, file_id=None):
+        """
+        阶段 1：读取元信息、查缓存、抽取文本（CPU/IO 密集，可放线程池）。
+        返回在各阶段之间传递的 job 字典。
+        """
+        file_name = os.path.basename(file_path)
+        file_ext = file_name.split('.')[-1].lower()
+        job = {
+            "file_id": file_id,
+            "path": file_path,
+            "name": file_name,
+            "ext": file_ext,
+            "size": os.path.getsize(file_path),
+            "created_at": datetime.fromtimestamp(os.path.getctime(file_path)).isoformat(),
+            "modified_at": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
+            "ftype": "other",
+            "raw_text": None,
+            "ocr_text": None,
+            "text_summary": None,
+            "image_features": None,
+            "needs_ocr": False,
+            "ocr_failed": False,
+            "ocr_image": None,
+            "vlm_image": None,
+            "vlm_skipped": False,
+            "content_hash": None,
+            "cache_key": None,
+            "cached": False,
+            "peak_memory": None,
+        }
+
+        # 内容相同的文件直接复用缓存，跳过抽取和摘要
+        if self.cache is not None:
+            job["content_hash"] = file_sha256(file_path)
+            job["cache_key"] = self.cache.make_key(job["content_hash"], PARSER_VERSION, self.llm_model,
+                                                   self._cache_options())
+            hit = self.cache.get(job["cache_key"])
+            metrics.inc("sfs_parse_cache_total", result="miss" if hit is None else "hit")
+            if hit is not None:
+                job.update(hit)
+                job["cached"] = True
+                return job
+
+        if file_ext in IMAGE_EXTS:
+            job["ftype"] = "image"
+            job["needs_ocr"] = True
+            with metrics.timer("sfs_parse_extract_seconds", format=file_ext):
+                self._prepare_image(job)
+        elif file_ext in SUMMARY_PROMPTS:
+            job["ftype"] = "document"
+            # 抽样剖析只包住抽取本身；慢文件（如超大 PDF）的热点会落盘
+            with metrics.timer("sfs_parse_extract_seconds", format=file_ext), \
+                    metrics.profile("extract", file_path):
+                if self.track_memory:
+                    raw_text, job["peak_memory"] = _measure_peak(self._extract_text, file_path, file_ext)
+                    print(f"📈 {file_name}: 抽取峰值内存 {job['peak_memory'] / 1024:.0f} KiB")
+                else:
+                    raw_text = self._extract_text(file_path, file_ext)
+            job["raw_text"] = raw_text
+        # 🎵 音频 & 🎬 视频 未来可加
+        return job
+
+    def _cache_options(self):
+        """会改变摘要 / 图像描述的选项，作为解析缓存键的一部分"""
+        return (f"text_budget={self.text_budget};image_strategy={self.image_strategy};"
+                f"ocr_max_side={self.ocr_max_side};vlm_max_side={self.vlm_max_side};vlm_skip_chars={self.vlm_skip_chars}")
+
+    def _extract_text(self, file_path, file_ext):
+        """按预算抽取文本：各格式的生成器逐段产出，攒够 text_budget 个字符即停止"""
+        pieces = []
+        total = 0
+        gen = _TEXT_EXTRACTORS[file_ext](file_path, self.text_budget)
+        try:
+            for piece in gen:
+                if not piece:
+                    continue
+                pieces.append(piece)
+                total += len(piece) + 1
+                if total >= self.text_budget:
+                    break
+        finally:
+            # 提前停止时关闭生成器，释放其中打开的文件/工作簿
+            gen.close()
+        return "\n".join(pieces)[:self.text_budget]
+
+    def _prepare_image(self, job):
+        """只解码一次，分别生成 OCR 输入（灰度、限制尺寸）和视觉模型输入（缩小后的 JPEG 字节）"""
+        try:
+            image = load_image(job["path"], max(self.ocr_max_side, self.vlm_max_side))
+            job["ocr_image"] = ocr_input(image, self.ocr_max_side)
+            if getattr(self.llm_client, "accepts_image_bytes", True):
+                job["vlm_image"] = vlm_input(image, self.vlm_max_side)
+            else:
+                job["vlm_image"] = job["path"]
+        except Exception as e:
+            print(f"图像解码失败: {e}")
+            job["ocr_failed"] = True
+
+    def _ocr_and_describe(self, job):
+        """parse_file 中的图片：concurrent 策略下视觉模型描述在后台线程中与 OCR 同时进行"""
+        if job["ocr_image"] is None:
+            return
+        future = self.describe_async(job)
+        try:
+            with metrics.timer("sfs_ocr_seconds"):
+                job["ocr_text"] = ocr_image(job["ocr_image"])
+        except Exception as e:
+            metrics.inc("sfs_ocr_errors_total")
+            print(f"OCR/图像解析失败: {e}")
+            job["ocr_failed"] = True
+        job["ocr_image"] = None
+        if future is not None:
+            job["image_features"] = future.result()
+
+    def describe_async(self, job):
+        """
+        concurrent 策略下在后台开始视觉模型描述，返回 Future（结果写入 job["image_features"] 由调用方完成）；
+        其他策略或图片无法解码时返回 None
+        """
+        if self.image_strategy != "concurrent" or job["vlm_image"] is None:
+            return None
+        return self._vlm_pool().submit(self._call_ollama, IMAGE_PROMPT, job["vlm_image"])
+
+    def _vlm_pool(self):
+        with self._vlm_executor_lock:
+            if self._vlm_executor is None:
+                self._vlm_executor = ThreadPoolExecutor(max_workers=self.vlm_workers, thread_name_prefix="vlm")
+            return self._vlm_executor
+
+    def summarize(self, job):
+        """阶段 3：调用 LLM 生成摘要 / 图像描述（OCR 已在之前完成），结果写回缓存"""
+        if job["cached"]:
+            return job
+
+        if job["ftype"] == "image":
+            if job["vlm_image"] is None:
+                # 图片无法解码
+                job["text_summary"] = ""
+                job["image_features"] = ""
+                return job
+            ocr_text = job["ocr_text"] or ""
+            if job["image_features"] is None:
+                if self.image_strategy == "ocr_first" and len("".join(ocr_text.split())) >= self.vlm_skip_chars:
+                    # OCR 已经给出足够的文字，省掉一次视觉模型调用
+                    job["vlm_skipped"] = True
+                    job["image_features"] = ""
+                    metrics.inc("sfs_vlm_skipped_total")
+                else:
+                    # 用视觉模型生成图像描述
+                    job["image_features"] = self._call_ollama(IMAGE_PROMPT, image=job["vlm_image"])
+            job["vlm_image"] = None
+            job["text_summary"] = f"OCR文本：{ocr_text}"
+            if not job["vlm_skipped"]:
+                job["text_summary"] += f"\n视觉模型描述：{job['image_features']}"
+
+        elif job["raw_text"] is not None:
+            # 交给本地模型总结
+            job["text_summary"] = self._call_ollama(f"{SUMMARY_PROMPTS[job['ext']]}\n{job['raw_text'][:self.text_budget]}")
+
+        if job["cache_key"] is not None and job["text_summary"]:
+            self.cache.put(job["cache_key"], job)
+        return job
+
+    def build_file_info(self, job):
+        """组装 FileInfo"""
+        file_info = FileInfo(
+            path=job["path"],
+            name=job["name"],
+            ext=job["ext"],
+            ftype=job["ftype"],
+            size=job["size"],
+            created_at=job["created_at"],
+            modified_at=job["modified_at"],
+            text_summary=job["text_summary"],
+            image_features=job["image_features"],
+            file_id=job["file_id"]
+        )
+        file_info.content_hash = job["content_hash"]
+        return file_info
+
+
+# ---------- 各格式的流式抽取器：逐段产出文本，由调用方决定何时停止 ----------
+def _iter_plain_text(file_path, budget):
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield f.read(budget)
+
+
+def _iter_pdf(file_path, budget):
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            try:
+                yield page.extract_text() or ""
+            finally:
+                # 释放该页解析出的对象，避免整本 PDF 常驻内存
+                page.close()
+
+
+def _iter_docx(file_path, budget):
+    import docx
+    doc = docx.Document(file_path)
+    for p in doc.paragraphs:
+        yield p.text
+
+
+def _iter_pptx(file_path, budget):
+    import pptx
+    prs = pptx.Presentation(file_path)
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield shape.text
+
+
+def _iter_workbook(file_path, budget):
+    import openpyxl
+    # read_only 模式按行流式读取，不把整个工作簿建成对象树
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            for row in ws.iter_rows(values_only=True):
+                yield " ".join([str(cell) if cell else "" for cell in row])
+    finally:
+        wb.close()
+
+
+_TEXT_EXTRACTORS = {
+    "txt": _iter_plain_text,
+    "md": _iter_plain_text,
+    "pdf": _iter_pdf,
+    "docx": _iter_docx,
+    "doc": _iter_docx,
+    "pptx": _iter_pptx,
+    "ppt": _iter_pptx,
+    "xlsx": _iter_workbook,
+    "xls": _iter_workbook,
+}
+
+
+def _measure_peak(func, *args):
+    """运行 func 并返回 (结果, 期间 Python 分配的峰值字节数)"""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        return result, max(peak - base, 0)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+# ---------- 图片：解码一次，分别为 OCR 与视觉模型准备输入 ----------
+def load_image(file_path, max_side=None):
+    """
+    解码图片并按 EXIF 方向摆正。
+    JPEG 在解码时就按 max_side 降采样（draft，按 1/2、1/4、1/8 缩放），大尺寸照片省掉大部分解码开销。
+    """
+    from PIL import Image, ImageOps
+    image = Image.open(file_path)
+    if max_side and image.format == "JPEG" and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image.draft(image.mode, (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return image
+
+
+def _fit(image, max_side):
+    """等比缩小到最长边不超过 max_side（reducing_gap：先整数倍快速缩小再精细重采样）；不需要缩小时原样返回"""
+    if max(image.size) <= max_side:
+        return image
+    scale = max_side / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, reducing_gap=3.0)
+
+
+def ocr_input(image, max_side=OCR_MAX_SIDE):
+    """OCR 输入：灰度、自动对比度，最长边不超过 max_side"""
+    from PIL import ImageOps
+    return ImageOps.autocontrast(_fit(image.convert("L"), max_side))
+
+
+def vlm_input(image, max_side=VLM_MAX_SIDE, quality=85):
+    """视觉模型输入：RGB JPEG 字节，最长边不超过 max_side（请求体小，模型端也不用再缩放）"""
+    rgb = _fit(image, max_side)
+    if rgb.mode != "RGB":
+        rgb = rgb.convert("RGB")
+    buf = io.BytesIO()
+    rgb.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def ocr_image(image):
+    """
+    阶段 2：OCR 提取图片文本。模块级函数，可直接提交到进程池。
+    :param image: ocr_input() 准备好的图片，或图片路径（此时先解码并缩放）
+    """
+    import pytesseract
+    if isinstance(image, str):
+        image = ocr_input(load_image(image, OCR_MAX_SIDE))
+    try:
+        return pytesseract.image_to_string(image)
+    except pytesseract.TesseractNotFoundError as e:
+        # 该异常无法在父进程中反序列化，原样抛出会让整个进程池失效
+        raise RuntimeError(str(e)) from None
@@ -0,0 +1,106 @@
+import base64
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class IndexWAL:
+    """
+    向量索引的追加式预写日志（JSON Lines）。
+    每条记录是一次变更：
+        {"op": "add", "items": [{"id", "doc_id", "text", "metadata", "vector"}, ...]}
+        {"op": "remove", "ids": [...]}
+        {"op": "reset"}
+    向量以 float32 原始字节的 base64 存储，回放时无需重新 embedding。
+    """
+
+    def __init__(self, path, fsync=True):
+        """
+        :param path: 日志文件路径
+        :param fsync: 每次追加后是否 fsync（关闭可换取更低延迟，但掉电可能丢最后几条）
+        """
+        self.path = path
+        self.fsync = fsync
+        self._f = None
+
+    def _file(self):
+        if self._f is None:
+            self._f = open(self.path, "a", encoding="utf-8")
+        return self._f
+
+    def append(self, record):
+        f = self._file()
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def log_add(self, int_ids, doc_ids, texts, metadatas, vectors):
+        items = [
+            {"id": int(i), "doc_id": d, "text": t, "metadata": m, "vector": encode_vector(v)}
+            for i, d, t, m, v in zip(int_ids, doc_ids, texts, metadatas, vectors)
+        ]
+        self.append({"op": "add", "items": items})
+
+    def log_remove(self, int_ids):
+        self.append({"op": "remove", "ids": [int(i) for i in int_ids]})
+
+    def log_reset(self):
+        self.append({"op": "reset"})
+
+    @property
+    def rotated_path(self):
+        return self.path + ".1"
+
+    def replay(self):
+        """
+        按顺序产出日志记录（先是快照进行中被轮转出去的旧段，再是当前段）；
+        末尾写了一半的行（崩溃残留）会被忽略
+        """
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"⚠️ WAL 中存在不完整记录，已忽略: {path}")
+                        break
+
+    def rotate(self):
+        """
+        开始快照时调用：当前段并入轮转段，之后的变更写入新段。
+        快照写盘成功后再 discard_rotated()，失败时两段都会在启动时回放。
+        """
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.rotated_path):
+            with open(self.path, "rb") as src, open(self.rotated_path, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.rename(self.path, self.rotated_path)
+
+    def discard_rotated(self):
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def encode_vector(vector):
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
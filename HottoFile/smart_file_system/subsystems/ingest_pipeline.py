@@ -0,0 +1,230 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ..utils import metrics
+from .file_parser import ocr_image
+
+_STOP = object()
+
+
+class _Stage:
+    """一个流水线阶段：若干工作线程从有界队列取任务，处理后交给下游"""
+
+    def __init__(self, name, workers, maxsize):
+        self.name = name
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.threads = []
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._alive = 0
+        self._lock = threading.Lock()
+
+    def start(self, target, on_drained):
+        self._alive = self.workers
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, args=(target, on_drained),
+                                 name=f"ingest-{self.name}-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _run(self, target, on_drained):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            start = time.perf_counter()
+            try:
+                target(item)
+                ok = True
+            except Exception as e:
+                ok = False
+                print(f"⚠️ [{self.name}] 处理失败 {_describe(item)}: {e}")
+            elapsed = time.perf_counter() - start
+            metrics.observe("sfs_pipeline_stage_seconds", elapsed, stage=self.name, status="ok" if ok else "error")
+            with self._lock:
+                self.busy_seconds += elapsed
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last:
+            on_drained()
+
+    def stop(self):
+        for _ in range(self.workers):
+            self.queue.put(_STOP)
+
+
+def _describe(item):
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        return item.get("path", "")
+    return getattr(item, "path", "")
+
+
+class IngestPipeline:
+    """
+    分阶段的并行入库流水线，挂在 FileMonitor 之后：
+
+        submit(path) → [抽取: 线程池] → [OCR: 进程池] → [摘要+分类: 限并发] → [Embedding: 批量]
+
+    各阶段之间是有界队列；下游处理不过来时 submit() 会阻塞，
+    从而对 FileMonitor 形成背压。queue_depths() 可查看各阶段积压。
+
+    用法:
+        pipeline = IngestPipeline(parser, classifier, embedding_manager).start()
+        monitor = FileMonitor(path, pipeline.submit)
+    """
+
+    def __init__(self, parser, classifier, embedding_manager, extract_workers=4, ocr_workers=None,
+                 llm_concurrency=2, embed_batch_size=32, embed_max_wait=1.0, queue_size=64,
+                 on_indexed=None, manifest=None):
+        """
+        :param parser: FileParser
+        :param classifier: Classifier
+        :param embedding_manager: EmbeddingManager
+        :param extract_workers: 文本抽取线程数
+        :param ocr_workers: OCR 进程数，默认 CPU 核数
+        :param llm_concurrency: 同时进行的摘要/分类数（受本地模型吞吐限制）
+        :param embed_batch_size: 每批 embedding 的最大文件数
+        :param embed_max_wait: 凑批的最长等待时间（秒）
+        :param queue_size: 每个阶段队列的容量
+        :param on_indexed: 可选回调 (file_info) -> None，文件入库后调用
+        :param manifest: 可选的 FileManifest；已知路径沿用原 file_id，入库后更新清单
+        """
+        self.parser = parser
+        self.classifier = classifier
+        self.embedding_manager = embedding_manager
+        self.embed_batch_size = embed_batch_size
+        self.embed_max_wait = embed_max_wait
+        self.on_indexed = on_indexed
+        self.manifest = manifest
+
+        ocr_workers = ocr_workers or os.cpu_count() or 1
+        self.extract_stage = _Stage("extract", extract_workers, queue_size)
+        self.ocr_stage = _Stage("ocr", ocr_workers, queue_size)
+        self.llm_stage = _Stage("llm", llm_concurrency, queue_size)
+        self.embed_stage = _Stage("embed", 1, queue_size)
+        self.stages = [self.extract_stage, self.ocr_stage, self.llm_stage, self.embed_stage]
+
+        self._ocr_pool = None
+        self._ocr_workers = ocr_workers
+        self.indexed = 0
+        self._done = threading.Event()
+        self._started = False
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        # 本进程已有阶段线程、HTTP 连接池和 faiss 线程，fork 出的子进程可能卡死，用 spawn 启动
+        self._ocr_pool = ProcessPoolExecutor(max_workers=self._ocr_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        self.extract_stage.start(self._extract, self.ocr_stage.stop)
+        self.ocr_stage.start(self._ocr, self.llm_stage.stop)
+        self.llm_stage.start(self._summarize_and_classify, self.embed_stage.stop)
+        self.embed_stage.start(self._embed, self._done.set)
+        self._started = True
+        return self
+
+    def submit(self, file_path, block=True, timeout=None):
+        """提交一个文件；队列已满时阻塞（背压），block=False 时抛出 queue.Full"""
+        self.extract_stage.queue.put(file_path, block=block, timeout=timeout)
+
+    def stop(self, timeout=None):
+        """处理完已提交的文件后停止所有阶段"""
+        if not self._started:
+            return
+        self.extract_stage.stop()
+        self._done.wait(timeout)
+        self._ocr_pool.shutdown(wait=True)
+        self._started = False
+
+    def queue_depths(self):
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
+
+    def stats(self):
+        stats = {
+            stage.name: {
+                "queued": stage.queue.qsize(),
+                "processed": stage.processed,
+                "failed": stage.failed,
+                "busy_seconds": round(stage.busy_seconds, 3),
+            }
+            for stage in self.stages
+        }
+        stats["indexed"] = self.indexed
+        return stats
+
+    # ---------- 各阶段 ----------
+    def _extract(self, file_path):
+        file_id = self.manifest.file_id_for(file_path) if self.manifest else None
+        job = self.parser.extract(file_path, file_id=file_id)
+        if job["needs_ocr"] and not job["cached"]:
+            self.ocr_stage.queue.put(job)
+        else:
+            self.llm_stage.queue.put(job)
+
+    def _ocr(self, job):
+        # 抽取阶段已经解码并缩放好 OCR 输入（解码失败时为 None，直接交给下游）
+        if job["ocr_image"] is not None:
+            # concurrent 策略：视觉模型描述在解析器的线程池中与 OCR 同时进行，summarize 不再重复调用
+            future = self.parser.describe_async(job)
+            try:
+                with metrics.timer("sfs_ocr_seconds"):
+                    job["ocr_text"] = self._ocr_pool.submit(ocr_image, job["ocr_image"]).result()
+            except Exception as e:
+                metrics.inc("sfs_ocr_errors_total")
+                print(f"OCR/图像解析失败: {e}")
+                job["ocr_failed"] = True
+            job["ocr_image"] = None
+            if future is not None:
+                job["image_features"] = future.result()
+        self.llm_stage.queue.put(job)
+
+    def _summarize_and_classify(self, job):
+        self.parser.summarize(job)
+        file_info = self.parser.build_file_info(job)
+        if self.classifier is not None:
+            file_info = self.classifier.classify(file_info, self.embedding_manager)
+        self.embed_stage.queue.put(file_info)
+
+    def _embed(self, first):
+        # 在 embed_max_wait 内尽量凑满一批，一次 embedding、一次索引写入
+        batch = [first]
+        deadline = time.monotonic() + self.embed_max_wait
+        stop = False
+        while len(batch) < self.embed_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.embed_stage.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+
+        try:
+            self.embedding_manager.upsert_files(batch)
+            self.indexed += len(batch)
+            for file_info in batch:
+                print(f"✅ 已入库: {file_info.name} -> {file_info.final_label}")
+                if self.manifest:
+                    self.manifest.record(file_info.path, file_info.file_id, file_info.content_hash)
+                if self.on_indexed:
+                    self.on_indexed(file_info)
+        finally:
+            if stop:
+                # 凑批时取到了停止信号，放回去让工作线程正常退出
+                self.embed_stage.queue.put(_STOP)
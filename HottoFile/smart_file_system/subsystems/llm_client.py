@@ -0,0 +1,194 @@
+import base64
+import http.client
+import json
+import os
+import queue
+import subprocess
+import threading
+from urllib.parse import urlparse
+
+
+class LLMError(Exception):
+    """LLM 后端调用失败"""
+
+
+class LLMBackend:
+    """
+    LLM 后端接口：FileParser 与 OllamaClassifier 只依赖 generate()。
+    """
+
+    # images 是否可以直接传编码后的图片字节（否则只能传路径）
+    accepts_image_bytes = True
+
+    def generate(self, model, prompt, images=None, timeout=None):
+        """
+        :param model: 模型名称
+        :param prompt: 提示词
+        :param images: 可选，图片路径或原始字节列表
+        :return: 模型输出文本
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class OllamaCLIBackend(LLMBackend):
+    """旧实现：每次调用都启动一个 `ollama run` 进程，仅作兼容/排错使用"""
+
+    accepts_image_bytes = False
+
+    def generate(self, model, prompt, images=None, timeout=None):
+        cmd = ["ollama", "run", model]
+        for image in images or []:
+            if isinstance(image, (bytes, bytearray)):
+                raise LLMError("CLI 后端只支持图片路径")
+            cmd.extend(["--image", image])
+        try:
+            result = subprocess.run(
+                cmd, input=prompt, capture_output=True, text=True, timeout=timeout, check=False
+            )
+        except subprocess.TimeoutExpired as e:
+            raise LLMError(f"ollama run 超时: {model}") from e
+        if result.returncode != 0:
+            raise LLMError(result.stderr.strip() or f"ollama run 退出码 {result.returncode}")
+        return result.stdout.strip()
+
+
+class OllamaHTTPBackend(LLMBackend):
+    """
+    常驻的 Ollama HTTP 客户端：
+      - keep-alive 连接池，避免每次调用的进程启动与握手
+      - 按模型的并发上限（信号量），防止单个模型被打满
+      - 每次请求的超时
+    """
+
+    def __init__(self, base_url=None, pool_size=8, timeout=120.0,
+                 default_concurrency=2, model_concurrency=None, keep_alive="10m"):
+        """
+        :param base_url: Ollama 服务地址，默认读取 OLLAMA_HOST，否则 http://127.0.0.1:11434
+        :param pool_size: 连接池大小
+        :param timeout: 默认请求超时（秒）
+        :param default_concurrency: 未单独配置的模型的并发上限
+        :param model_concurrency: {model: 并发上限}
+        :param keep_alive: 让 Ollama 在两次请求之间保持模型常驻
+        """
+        base_url = base_url or os.environ.get("OLLAMA_HOST") or "http://127.0.0.1:11434"
+        if "://" not in base_url:
+            base_url = "http://" + base_url
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 11434
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.default_concurrency = default_concurrency
+        self.model_concurrency = dict(model_concurrency or {})
+
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    # ---------- 连接池 ----------
+    def _acquire_conn(self, timeout):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _release_conn(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _semaphore(self, model):
+        with self._lock:
+            sem = self._semaphores.get(model)
+            if sem is None:
+                limit = self.model_concurrency.get(model, self.default_concurrency)
+                sem = threading.BoundedSemaphore(limit)
+                self._semaphores[model] = sem
+            return sem
+
+    def _post_json(self, path, payload, timeout):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        # 池中的连接可能已被服务端关闭，重试一次新连接
+        for attempt in range(2):
+            conn = self._acquire_conn(timeout)
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release_conn(conn)
+            if resp.status != 200:
+                raise LLMError(f"Ollama HTTP {resp.status}: {data[:200]!r}")
+            return json.loads(data)
+        raise LLMError("Ollama 连接失败")
+
+    # ---------- 接口 ----------
+    def generate(self, model, prompt, images=None, timeout=None):
+        timeout = timeout or self.timeout
+        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive}
+        if images:
+            payload["images"] = [_encode_image(img) for img in images]
+        with self._semaphore(model):
+            try:
+                result = self._post_json("/api/generate", payload, timeout)
+            except LLMError:
+                raise
+            except Exception as e:
+                raise LLMError(f"Ollama 请求失败: {e}") from e
+        return (result.get("response") or "").strip()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _encode_image(image):
+    if isinstance(image, (bytes, bytearray)):
+        return base64.b64encode(image).decode("ascii")
+    with open(image, "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_default_client():
+    """进程内共享的 LLM 客户端（FileParser 与 OllamaClassifier 共用同一个连接池）"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            if os.environ.get("HOTTO_LLM_BACKEND", "http").lower() == "cli":
+                _default_client = OllamaCLIBackend()
+            else:
+                _default_client = OllamaHTTPBackend()
+        return _default_client
+
+
+def set_default_client(client):
+    """替换共享客户端（例如指向测试用的 FakeOllamaServer）"""
+    global _default_client
+    with _default_lock:
+        _default_client = client
@@ -0,0 +1,319 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ..utils import metrics
+from .file_parser import IMAGE_PROMPT, ocr_image
+
+STAGES = ("extract", "ocr", "describe", "summarize", "classify", "index")
+
+
+class StageTimeout(TimeoutError):
+    """某个阶段超过了为它设置的超时"""
+
+    def __init__(self, stage, path, timeout):
+        super().__init__(f"{stage} 阶段超时（{timeout}s）: {path}")
+        self.stage = stage
+        self.path = path
+        self.timeout = timeout
+
+
+class AsyncOrchestrator:
+    """
+    asyncio 原生的入库/检索入口，供异步服务直接 await：
+
+        async with AsyncOrchestrator(parser, classifier, embedding_manager) as orch:
+            file_info = await orch.ingest(path)
+            results = await orch.ingest_many(paths)
+            docs = await orch.search("关于合同的文件", k=5)
+
+    各子系统仍是同步阻塞的，这里把它们放进执行器运行，并按资源各用一个信号量限流：
+      - disk  文件读取与文本抽取、索引保存（线程池）
+      - ocr   OCR（进程池）
+      - llm   摘要、图像描述、分类（线程池；真正的并发仍受 LLM 客户端自身限制）
+      - embed 向量写入与查询（线程池）；入库的向量写入在 index_max_wait 内合并成批
+    资源名额在执行器中的调用真正结束后才归还：超时或取消只是让调用方不再等待，
+    已经开始的阻塞调用（线程无法中断）会在后台跑完，排队中尚未开始的则直接取消。
+    图片在 image_strategy 为 concurrent 时 OCR 与视觉模型描述同时进行。
+    """
+
+    def __init__(self, parser, classifier, embedding_manager, manifest=None, disk_concurrency=8,
+                 ocr_workers=None, llm_concurrency=2, classify_concurrency=None, embed_concurrency=2,
+                 timeouts=None, index_batch_size=32, index_max_wait=0.05, max_in_flight=256, on_indexed=None):
+        """
+        :param parser: FileParser
+        :param classifier: Classifier，为 None 时不分类
+        :param embedding_manager: EmbeddingManager
+        :param manifest: 可选的 FileManifest；已知路径沿用原 file_id，入库后更新清单
+        :param disk_concurrency: 同时进行的抽取 / 保存数
+        :param ocr_workers: OCR 进程数，默认 CPU 核数
+        :param llm_concurrency: 同时进行的摘要 / 图像描述数
+        :param classify_concurrency: 同时进行的分类数，默认与摘要共用 llm 名额；
+                                     使用 BatchingClassifier 时应调大，让足够多的请求进入合并队列
+        :param embed_concurrency: 同时进行的向量写入 / 查询数
+        :param timeouts: {阶段: 秒}，阶段见 STAGES；未列出的阶段不限时
+        :param index_batch_size / index_max_wait: 向量写入合并成批的上限与等待时间（秒）
+        :param max_in_flight: ingest_many 同时处理的文件数上限
+        :param on_indexed: 可选回调 (file_info) -> None，文件入库后在事件循环中调用
+        """
+        unknown = set(timeouts or {}) - set(STAGES)
+        if unknown:
+            raise ValueError(f"未知的阶段: {', '.join(sorted(unknown))}（可选 {', '.join(STAGES)}）")
+        self.parser = parser
+        self.classifier = classifier
+        self.embedding_manager = embedding_manager
+        self.manifest = manifest
+        self.timeouts = dict(timeouts or {})
+        self.index_batch_size = index_batch_size
+        self.index_max_wait = index_max_wait
+        self.max_in_flight = max_in_flight
+        self.on_indexed = on_indexed
+
+        self._limits = {
+            "disk": disk_concurrency,
+            "ocr": ocr_workers or os.cpu_count() or 1,
+            "llm": llm_concurrency,
+            "classify": classify_concurrency,
+            "embed": embed_concurrency,
+        }
+        # 信号量绑定事件循环，在第一次使用时创建
+        self._sems = None
+        self._threads = ThreadPoolExecutor(
+            max_workers=disk_concurrency + llm_concurrency + (classify_concurrency or 0) + embed_concurrency,
+            thread_name_prefix="orchestrator")
+        self._ocr_pool = None
+        self._pending_index = []
+        self._flush_handle = None
+        self._tasks = set()
+        self.in_flight = 0
+        self.indexed = 0
+        self.failed = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ---------- 公共接口 ----------
+    async def ingest(self, path, timeout=None):
+        """
+        解析、摘要、分类并写入索引，返回 FileInfo。
+        失败时抛出异常（阶段超时为 StageTimeout）；timeout 为整个文件的总时限（秒）。
+        """
+        if timeout is not None:
+            return await asyncio.wait_for(self.ingest(path), timeout)
+        self.in_flight += 1
+        metrics.set_gauge("sfs_orchestrator_in_flight", self.in_flight)
+        try:
+            file_info = await self._ingest(path)
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            metrics.set_gauge("sfs_orchestrator_in_flight", self.in_flight)
+        self.indexed += 1
+        if self.on_indexed:
+            self.on_indexed(file_info)
+        return file_info
+
+    async def ingest_many(self, paths, timeout=None, return_exceptions=True):
+        """
+        并发入库多个文件，同时处理的文件数不超过 max_in_flight。
+        返回与 paths 一一对应的列表；return_exceptions 为 True 时失败的位置是异常对象，
+        否则第一个失败会取消其余文件并抛出。
+        :param timeout: 每个文件的总时限（秒）
+        """
+        paths = list(paths)
+        results = [None] * len(paths)
+        todo = iter(enumerate(paths))
+
+        async def worker():
+            for i, path in todo:
+                try:
+                    results[i] = await self.ingest(path, timeout=timeout)
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results[i] = e
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.max_in_flight, len(paths)))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        return results
+
+    async def search(self, query, k=3, filters=None, with_scores=False, timeout=None):
+        """检索，参数同 EmbeddingManager.search / search_with_scores"""
+        search = self.embedding_manager.search_with_scores if with_scores else self.embedding_manager.search
+        return await self._run("embed", "search", timeout, search, query, k, filters)
+
+    async def save(self):
+        """保存索引快照"""
+        await self._run("disk", "save", None, self.embedding_manager.save_index)
+
+    async def close(self):
+        """写完合并中的向量，等待后台任务结束并关闭执行器"""
+        if self._pending_index:
+            self._flush_index()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._threads.shutdown)
+        if self._ocr_pool is not None:
+            await loop.run_in_executor(None, self._ocr_pool.shutdown)
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "indexed": self.indexed, "failed": self.failed,
+                "pending_index": len(self._pending_index)}
+
+    # ---------- 各阶段 ----------
+    async def _ingest(self, path):
+        file_id = self.manifest.file_id_for(path) if self.manifest else None
+        job = await self._run("disk", "extract", self.timeouts.get("extract"), self.parser.extract, path, file_id)
+
+        if job["needs_ocr"] and not job["cached"] and job["ocr_image"] is not None:
+            if self.parser.image_strategy == "concurrent":
+                # OCR 与视觉模型描述互不依赖，同时进行
+                await asyncio.gather(self._ocr(job), self._describe(job))
+            else:
+                await self._ocr(job)
+        job["ocr_image"] = None
+
+        await self._run("llm", "summarize", self.timeouts.get("summarize"), self.parser.summarize, job)
+        file_info = self.parser.build_file_info(job)
+        if self.classifier is not None:
+            file_info = await self._run("classify" if self._limits["classify"] else "llm", "classify",
+                                        self.timeouts.get("classify"), self.classifier.classify, file_info,
+                                        self.embedding_manager)
+        await self._index(file_info)
+        return file_info
+
+    async def _ocr(self, job):
+        if self._ocr_pool is None:
+            # 事件循环所在进程里已经有执行器线程、HTTP 连接和 faiss 的线程池，fork 出的子进程可能卡死或崩溃
+            self._ocr_pool = ProcessPoolExecutor(max_workers=self._limits["ocr"],
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        try:
+            job["ocr_text"] = await self._run("ocr", "ocr", self.timeouts.get("ocr"), ocr_image, job["ocr_image"],
+                                              executor=self._ocr_pool)
+        except Exception as e:
+            # 包括超时：与 OCR 失败一样，只用视觉模型描述继续
+            metrics.inc("sfs_ocr_errors_total")
+            print(f"OCR/图像解析失败: {e}")
+            job["ocr_failed"] = True
+
+    async def _describe(self, job):
+        # 写入 image_features 后 summarize 不再调用视觉模型
+        job["image_features"] = await self._run("llm", "describe", self.timeouts.get("describe"),
+                                                self.parser._call_ollama, IMAGE_PROMPT, job["vlm_image"])
+
+    async def _index(self, file_info):
+        """加入合并队列，等待所在批次写入索引"""
+        fut = asyncio.get_running_loop().create_future()
+        self._pending_index.append((file_info, fut))
+        if len(self._pending_index) >= self.index_batch_size:
+            self._flush_index()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.index_max_wait, self._flush_index)
+        await fut
+
+    def _flush_index(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending_index = self._pending_index, []
+        # 调用方已取消的文件不再写入
+        batch = [(f, fut) for f, fut in batch if not fut.done()]
+        if batch:
+            task = asyncio.ensure_future(self._write_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write_batch(self, batch):
+        files = [f for f, _ in batch]
+        try:
+            await self._run("embed", "index", self.timeouts.get("index"), self.embedding_manager.upsert_files, files)
+            if self.manifest:
+                await self._run("disk", "manifest", None, _record_all, self.manifest, files)
+        except BaseException as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(None)
+
+    # ---------- 执行器与限流 ----------
+    def _semaphore(self, resource):
+        if self._sems is None:
+            self._sems = {name: asyncio.Semaphore(limit) for name, limit in self._limits.items() if limit}
+        return self._sems[resource]
+
+    async def _run(self, resource, stage, timeout, func, *args, executor=None):
+        """
+        占用 resource 的一个名额，在执行器中运行 func(*args)。
+        名额在 func 真正返回后才释放，所以超时 / 取消不会让某个资源被超额使用。
+        """
+        loop = asyncio.get_running_loop()
+        sem = self._semaphore(resource)
+        await sem.acquire()
+        start = time.perf_counter()
+        try:
+            cf = (executor or self._threads).submit(func, *args)
+        except BaseException:
+            sem.release()
+            raise
+
+        def release(_):
+            if loop.is_closed():
+                return
+            try:
+                loop.call_soon_threadsafe(sem.release)
+            except RuntimeError:
+                # 事件循环正在关闭
+                pass
+
+        cf.add_done_callback(release)
+        status = "error"
+        try:
+            # 调用方取消时 wrap_future 会取消 cf：尚未开始的调用不再执行
+            result = await asyncio.wait_for(asyncio.wrap_future(cf), timeout)
+            status = "ok"
+            return result
+        except asyncio.TimeoutError:
+            status = "timeout"
+            metrics.inc("sfs_orchestrator_timeouts_total", stage=stage)
+            raise StageTimeout(stage, _describe(args), timeout) from None
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            metrics.observe("sfs_orchestrator_stage_seconds", time.perf_counter() - start, stage=stage, status=status)
+
+
+def _record_all(manifest, file_infos):
+    for f in file_infos:
+        manifest.record(f.path, f.file_id, f.content_hash)
+
+
+def _describe(args):
+    """超时信息中显示的文件路径"""
+    for arg in args:
+        if isinstance(arg, str):
+            return arg
+        if isinstance(arg, dict):
+            return arg.get("path", "")
+        if hasattr(arg, "path"):
+            return arg.path
+    return ""
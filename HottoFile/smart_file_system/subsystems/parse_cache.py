@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+import time
+
+from ..utils.hashing import text_sha256
+
+
+class ParseCache:
+    """
+    以文件内容哈希为键的解析结果缓存（SQLite 持久化）。
+    缓存抽取文本、text_summary、OCR 文本和 image_features，
+    同内容的文件（复制、移动、重新导入）直接命中，跳过抽取与 LLM 摘要。
+    """
+
+    FIELDS = ("ftype", "raw_text", "text_summary", "ocr_text", "image_features")
+
+    def __init__(self, db_path="parse_cache.sqlite", max_entries=100_000,
+                 max_bytes=512 * 1024 * 1024, max_age=30 * 24 * 3600):
+        """
+        :param db_path: SQLite 文件路径
+        :param max_entries: 最多保留的条目数
+        :param max_bytes: 缓存文本总大小上限（字节）
+        :param max_age: 条目最长保留时间（秒），None 表示不过期
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parse_cache (
+                key TEXT PRIMARY KEY,
+                ftype TEXT,
+                raw_text TEXT,
+                text_summary TEXT,
+                ocr_text TEXT,
+                image_features TEXT,
+                nbytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_parse_cache_access ON parse_cache(last_access)")
+        self._conn.commit()
+        self._writes_since_evict = 0
+
+    @staticmethod
+    def make_key(content_hash, parser_version, model, options=""):
+        """内容哈希 + 解析器版本 + 模型名 + 影响结果的解析选项，任一变化都会让旧条目失效"""
+        return text_sha256(content_hash, parser_version, model, options)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.FIELDS)}, created_at FROM parse_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age is not None and now - row[-1] > self.max_age):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE parse_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return dict(zip(self.FIELDS, row[:-1]))
+
+    def put(self, key, entry):
+        values = [entry.get(f) for f in self.FIELDS]
+        nbytes = sum(len(v.encode("utf-8")) for v in values if isinstance(v, str))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO parse_cache (key, {', '.join(self.FIELDS)}, nbytes, created_at, last_access) "
+                f"VALUES (?, {', '.join('?' for _ in self.FIELDS)}, ?, ?, ?)",
+                (key, *values, nbytes, now, now),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 100:
+                self._evict_locked(now)
+            self._conn.commit()
+
+    def evict(self):
+        """按年龄、条目数、总大小淘汰（最久未访问的先淘汰）"""
+        with self._lock:
+            self._evict_locked(time.time())
+            self._conn.commit()
+
+    def _evict_locked(self, now):
+        self._writes_since_evict = 0
+        removed = 0
+        if self.max_age is not None:
+            removed += self._conn.execute(
+                "DELETE FROM parse_cache WHERE created_at < ?", (now - self.max_age,)
+            ).rowcount
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM parse_cache").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, nbytes FROM parse_cache ORDER BY last_access").fetchall()
+            stale = []
+            for key, nbytes in rows:
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                count -= 1
+                total -= nbytes
+            self._conn.executemany("DELETE FROM parse_cache WHERE key = ?", stale)
+            removed += len(stale)
+        self.evictions += removed
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM parse_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,171 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from ..utils.hashing import file_sha256
+
+
+class Reconciler:
+    """
+    启动时对账：并行 os.scandir 遍历监控目录，与 FileManifest 比对，
+    只把新增/变化的文件交给入库流程，已删除的文件从索引和清单中清除；
+    监控停止期间改名/移动的文件只更新路径，保留原 file_id（标签与反馈随之保留）。
+    """
+
+    def __init__(self, manifest, embedding_manager=None, workers=8):
+        """
+        :param manifest: FileManifest
+        :param embedding_manager: 可选，用于清除已删除文件的向量
+        :param workers: 遍历目录与计算哈希的线程数
+        """
+        self.manifest = manifest
+        self.embedding_manager = embedding_manager
+        self.workers = workers
+
+    def scan(self, root):
+        """并行遍历目录树，返回 {path: (size, mtime_ns, inode)}"""
+        found = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(_scan_dir, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    files, subdirs = fut.result()
+                    found.update(files)
+                    for d in subdirs:
+                        pending.add(pool.submit(_scan_dir, d))
+        return found
+
+    def diff(self, root):
+        """
+        返回 (added, changed, deleted, touched, moved)：
+          added/changed 为需要重新入库的路径；deleted 为清单中已不存在的条目；
+          touched 为 stat 变了但内容哈希未变、只需更新清单的行；
+          moved 为 [(旧条目, 新路径, size, mtime_ns, inode, content_hash)]，是从 added 与 deleted 中配对出来的改名
+        """
+        on_disk = self.scan(root)
+        known = self.manifest.entries()
+        root = os.path.abspath(root)
+
+        added = [p for p in on_disk if p not in known]
+        deleted = [e for p, e in known.items() if p not in on_disk and _is_under(p, root)]
+        added, deleted, moved = self._match_moves(added, deleted, on_disk)
+        suspects = [
+            p for p, stat in on_disk.items()
+            if p in known and stat != (known[p]["size"], known[p]["mtime_ns"], known[p]["inode"])
+        ]
+
+        changed = []
+        touched = []
+        # 只有 size 不变的文件才值得算哈希确认（例如仅 touch 过），size 变了必然已修改
+        to_hash = [p for p in suspects if on_disk[p][0] == known[p]["size"] and known[p]["content_hash"]]
+        hashing = set(to_hash)
+        changed.extend(p for p in suspects if p not in hashing)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for path, digest in zip(to_hash, pool.map(_safe_hash, to_hash)):
+                if digest is not None and digest == known[path]["content_hash"]:
+                    size, mtime_ns, inode = on_disk[path]
+                    touched.append((path, known[path]["file_id"], size, mtime_ns, inode, digest))
+                else:
+                    changed.append(path)
+        return added, changed, deleted, touched, moved
+
+    def _match_moves(self, added, deleted, on_disk):
+        """
+        把已删除的条目与新出现的路径配对为改名：先按 (inode, size, mtime_ns)（同一文件系统内的 rename），
+        剩下的按内容哈希（跨文件系统移动、inode 变了）；只对大小能对上的新文件计算哈希。
+        返回 (剩余的 added, 剩余的 deleted, moved)
+        """
+        if not added or not deleted:
+            return added, deleted, []
+        moved = []
+        by_stat = {(e["inode"], e["size"], e["mtime_ns"]): e for e in deleted}
+        unmatched = []
+        for path in added:
+            size, mtime_ns, inode = on_disk[path]
+            entry = by_stat.pop((inode, size, mtime_ns), None)
+            if entry is not None:
+                moved.append((entry, path, size, mtime_ns, inode, entry["content_hash"]))
+            else:
+                unmatched.append(path)
+
+        by_hash = {}
+        for entry in by_stat.values():
+            if entry["content_hash"]:
+                by_hash.setdefault((entry["size"], entry["content_hash"]), []).append(entry)
+        sizes = {size for size, _ in by_hash}
+        to_hash = [p for p in unmatched if on_disk[p][0] in sizes]
+        matched = set()
+        if to_hash:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for path, digest in zip(to_hash, pool.map(_safe_hash, to_hash)):
+                    size, mtime_ns, inode = on_disk[path]
+                    candidates = by_hash.get((size, digest))
+                    if digest is None or not candidates:
+                        continue
+                    moved.append((candidates.pop(), path, size, mtime_ns, inode, digest))
+                    matched.add(path)
+
+        moved_from = {entry["path"] for entry, *_ in moved}
+        return ([p for p in unmatched if p not in matched],
+                [e for e in deleted if e["path"] not in moved_from], moved)
+
+    def reconcile(self, root, submit):
+        """
+        :param root: 监控目录
+        :param submit: 入库函数，如 IngestPipeline.submit
+        :return: 各类文件数量
+        """
+        added, changed, deleted, touched, moved = self.diff(root)
+
+        if moved:
+            kept = None
+            if self.embedding_manager is not None:
+                kept = set(self.embedding_manager.move_files([(entry["file_id"], path) for entry, path, *_ in moved]))
+            self.manifest.remove([entry["path"] for entry, *_ in moved])
+            self.manifest.record_many([(path, entry["file_id"], *rest) for entry, path, *rest in moved])
+            if kept is not None:
+                # 索引里没有向量的文件（例如上次入库未完成）按原 file_id 重新入库
+                added.extend(path for entry, path, *_ in moved if entry["file_id"] not in kept)
+        if deleted:
+            if self.embedding_manager is not None:
+                self.embedding_manager.delete_files([e["file_id"] for e in deleted])
+            self.manifest.remove([e["path"] for e in deleted])
+        if touched:
+            self.manifest.record_many(touched)
+        for path in added + changed:
+            submit(path)
+
+        summary = {"added": len(added), "changed": len(changed), "deleted": len(deleted), "touched": len(touched),
+                   "moved": len(moved)}
+        print(f"🔍 启动对账完成: {summary}")
+        return summary
+
+
+def _scan_dir(path):
+    files = {}
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        files[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime_ns, st.st_ino)
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"⚠️ 无法读取目录 {path}: {e}")
+    return files, subdirs
+
+
+def _safe_hash(path):
+    try:
+        return file_sha256(path)
+    except OSError:
+        return None
+
+
+def _is_under(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
@@ -0,0 +1,35 @@
+import hashlib
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class HashEmbeddings(Embeddings):
+    """
+    按文本哈希生成的确定性单位向量，用于在没有 embedding 模型的情况下测试和做基准。
+
+    用法:
+        em = EmbeddingManager(persist_path, embeddings=HashEmbeddings(256), embedding_cache_path=False)
+    """
+
+    def __init__(self, dim=256, latency=0.0):
+        """
+        :param dim: 向量维度
+        :param latency: 每批 embedding 模拟的推理耗时（秒）
+        """
+        self.dim = dim
+        self.latency = latency
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def _vector(self, text):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer:
+    """
+    本地假 Ollama 服务，实现 /api/generate 与 /api/tags，
+    用于在没有真实模型的情况下测试 OllamaHTTPBackend。
+
+    用法:
+        with FakeOllamaServer(responder=lambda model, prompt, images: "invoice") as srv:
+            client = OllamaHTTPBackend(base_url=srv.url)
+    """
+
+    def __init__(self, responder=None, latency=0.0, host="127.0.0.1", port=0, parallel=None):
+        """
+        :param responder: (model, prompt, images) -> str，默认回显 prompt 最后一行
+        :param latency: 每次请求模拟的推理耗时（秒），或 (prompt, response) -> 秒，
+                        用于按 prompt / 输出长度模拟预填充与生成的耗时
+        :param parallel: 同时推理的请求数上限（相当于 OLLAMA_NUM_PARALLEL），默认不限
+        """
+        self.responder = responder or (lambda model, prompt, images: prompt.strip().splitlines()[-1] if prompt.strip() else "")
+        self.latency = latency
+        self.requests = []
+        self.connections = 0
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持 keep-alive
+            # 响应头和正文分两次写出，不关 Nagle 会与客户端的延迟 ACK 叠加，每次请求多出约 40ms
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": []})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests.append(payload)
+                if self.path != "/api/generate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                if server._slots is not None:
+                    server._slots.acquire()
+                try:
+                    text = server.responder(payload.get("model"), payload.get("prompt", ""), payload.get("images"))
+                    latency = server.latency(payload.get("prompt", ""), text) if callable(server.latency) \
+                        else server.latency
+                    if latency:
+                        time.sleep(latency)
+                except Exception as e:
+                    self._send_json(500, {"error": str(e)})
+                    return
+                finally:
+                    if server._slots is not None:
+                        server._slots.release()
+                self._send_json(200, {"model": payload.get("model"), "response": text, "done": True})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
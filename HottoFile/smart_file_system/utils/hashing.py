@@ -0,0 +1,23 @@
+import hashlib
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """流式计算文件内容的 sha256（不一次性读入内存）"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def text_sha256(*parts):
+    """对若干文本片段计算 sha256，片段之间用 \\x1f 分隔"""
+    h = hashlib.sha256()
+    for i, part in enumerate(parts):
+        if i:
+            h.update(b"\x1f")
+        h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
@@ -0,0 +1,384 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 轻量的进程内指标：计数器 / 仪表 / 直方图，支持 Prometheus 文本格式与 JSON 导出，
+# 另外可以对抽样的慢文件做 cProfile。各子系统通过模块级函数写入默认注册表：
+#
+#     from ..utils import metrics
+#     with metrics.timer("sfs_parse_extract_seconds", format="pdf"):
+#         ...
+#     metrics.inc("sfs_parse_files_total", format="pdf", status="ok")
+#
+# 导出：
+#     metrics.start_http_server(9108)                   # GET /metrics（Prometheus）与 /metrics.json
+#     metrics.start_json_dump("metrics.json", 60)       # 每 60 秒原子地写一次 JSON
+#     metrics.enable_profiling("profiles", slow_seconds=2.0, sample_rate=0.05)
+
+# 延迟直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * n_buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: 直方图的桶上界（升序），+Inf 桶自动附加
+        """
+        self.buckets = tuple(buckets)
+        self.profiler = None
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        # 落在第一个上界 >= value 的桶中，导出时再累加
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(len(self.buckets) + 1)
+            hist.counts[idx] += 1
+            hist.sum += value
+            hist.count += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """计时代码块（秒）；抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """计时装饰器"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def profile(self, name, key=""):
+        """未开启 enable_profiling 时不做任何事"""
+        if self.profiler is None:
+            yield
+            return
+        with self.profiler.profile(name, key):
+            yield
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    # ---------- 导出 ----------
+    def snapshot(self):
+        """
+        返回可 JSON 序列化的快照:
+            {"time", "counters": [{"name", "labels", "value"}], "gauges": [...],
+             "histograms": [{"name", "labels", "count", "sum", "p50", "p99", "buckets": {上界: 累计数}}]}
+        p50 / p99 按桶上界估算，无样本或超过最大的桶时为 None。
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+            histograms = [(k, list(h.counts), h.sum, h.count) for k, h in self._histograms.items()]
+
+        def entries(items):
+            return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(items)]
+
+        hist_entries = []
+        for (name, labels), counts, total, count in sorted(histograms):
+            cumulative = []
+            running = 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            hist_entries.append({
+                "name": name,
+                "labels": dict(labels),
+                "count": count,
+                "sum": round(total, 6),
+                "p50": self._quantile(cumulative, count, 0.5),
+                "p99": self._quantile(cumulative, count, 0.99),
+                "buckets": {str(b): c for b, c in zip(self.buckets + ("+Inf",), cumulative)},
+            })
+        return {"time": time.time(), "counters": entries(counters), "gauges": entries(gauges),
+                "histograms": hist_entries}
+
+    def _quantile(self, cumulative, count, q):
+        if not count:
+            return None
+        target = q * count
+        for bound, c in zip(self.buckets, cumulative):
+            if c >= target:
+                return bound
+        # 落在 +Inf 桶：没有上界可估（返回 None，保证快照是合法 JSON）
+        return None
+
+    def render_prometheus(self):
+        """Prometheus 文本格式（version 0.0.4）"""
+        snap = self.snapshot()
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for kind, entries in (("counter", snap["counters"]), ("gauge", snap["gauges"])):
+            for e in entries:
+                name = _metric_name(e["name"])
+                header(name, kind)
+                lines.append(f"{name}{_labels(e['labels'])} {_number(e['value'])}")
+        for e in snap["histograms"]:
+            name = _metric_name(e["name"])
+            header(name, "histogram")
+            for bound, c in e["buckets"].items():
+                lines.append(f"{name}_bucket{_labels(e['labels'], le=bound)} {c}")
+            lines.append(f"{name}_sum{_labels(e['labels'])} {_number(e['sum'])}")
+            lines.append(f"{name}_count{_labels(e['labels'])} {e['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _metric_name(name):
+    return _NAME_RE.sub("_", name)
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(_metric_name(k), str(v).replace("\\", "\\\\").replace('"', '\\"')
+                                     .replace("\n", "\\n"))
+                    for k, v in items)
+    return "{" + body + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class SlowCallProfiler:
+    """
+    抽样 cProfile：按 sample_rate 抽取调用进行剖析，耗时超过 slow_seconds 时
+    把统计写成 <out_dir>/<name>-<时间戳>-<key>.prof（可用 snakeviz / pstats 查看）并打印热点。
+    同一时刻只剖析一个调用（cProfile 不能在多个线程中同时启用），其余调用直接跳过。
+    """
+
+    def __init__(self, out_dir, slow_seconds=2.0, sample_rate=0.05, top=15):
+        self.out_dir = out_dir
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.top = top
+        self.profiled = 0
+        self.dumped = 0
+        self._busy = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+
+    @contextmanager
+    def profile(self, name, key=""):
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            yield
+            return
+        prof = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            prof.enable()
+        except ValueError:
+            # 其它剖析工具已经启用
+            self._busy.release()
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            self._busy.release()
+            self.profiled += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.slow_seconds:
+                self._dump(prof, name, key, elapsed)
+
+    def _dump(self, prof, name, key, elapsed):
+        safe_key = _NAME_RE.sub("_", os.path.basename(str(key)))[:60]
+        path = os.path.join(self.out_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{safe_key}.prof")
+        try:
+            prof.dump_stats(path)
+            self.dumped += 1
+            print(f"🐢 {name} {key} 耗时 {elapsed:.2f}s，剖析结果已保存到 {path}")
+            if self.top:
+                pstats.Stats(prof).sort_stats("cumulative").print_stats(self.top)
+        except OSError as e:
+            print(f"⚠️ 无法保存剖析结果: {e}")
+
+
+class MetricsHTTPServer:
+    """
+    指标 HTTP 端点：GET /metrics 返回 Prometheus 文本格式，GET /metrics.json 返回 JSON 快照。
+
+    用法:
+        with MetricsHTTPServer(port=9108) as srv:
+            print(srv.url)
+    """
+
+    def __init__(self, registry=None, host="127.0.0.1", port=9108):
+        self.registry = registry or REGISTRY
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class JSONDumper:
+    """后台线程每 interval 秒把快照写到 path（先写临时文件再替换），stop() 时再写一次"""
+
+    def __init__(self, path, interval=60.0, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or REGISTRY
+        self._stop = threading.Event()
+        self._thread = None
+
+    def dump(self):
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.registry.snapshot(), f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ 写入指标文件失败: {e}")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="metrics-json", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
+
+
+# ---------- 默认注册表与便捷函数 ----------
+REGISTRY = MetricsRegistry()
+
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set_gauge
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+profile = REGISTRY.profile
+snapshot = REGISTRY.snapshot
+render_prometheus = REGISTRY.render_prometheus
+
+
+def start_http_server(port=9108, host="127.0.0.1"):
+    return MetricsHTTPServer(REGISTRY, host=host, port=port).start()
+
+
+def start_json_dump(path, interval=60.0):
+    return JSONDumper(path, interval, REGISTRY).start()
+
+
+def enable_profiling(out_dir, slow_seconds=2.0, sample_rate=0.05, top=15):
+    """开启慢调用抽样剖析（作用于 metrics.profile(...) 包裹的代码块）"""
+    REGISTRY.profiler = SlowCallProfiler(out_dir, slow_seconds, sample_rate, top)
+    return REGISTRY.profiler
+
+
+def disable_profiling():
+    REGISTRY.profiler = None
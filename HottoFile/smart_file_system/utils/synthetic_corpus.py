@@ -0,0 +1,203 @@
+import os
+import random
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+# 合成语料：不依赖任何第三方库，直接写出能被 FileParser 各抽取器读取的最小文件
+# （PDF / docx / xlsx 按规范手写最小结构，PNG 用 zlib 编码）
+
+CORPUS_EXTS = ("txt", "md", "pdf", "docx", "xlsx", "png")
+
+# 主题 -> 词表；同一主题的文件摘要相近，使 kNN 投票与检索有意义
+TOPICS = {
+    "invoice": ["invoice", "amount", "due", "payment", "tax", "total", "vendor", "billing"],
+    "contract": ["agreement", "party", "clause", "term", "liability", "signature", "renewal", "breach"],
+    "research paper": ["abstract", "method", "experiment", "results", "baseline", "dataset", "citation", "model"],
+    "code script": ["function", "module", "import", "variable", "loop", "return", "class", "exception"],
+    "meeting notes": ["agenda", "attendees", "action", "decision", "follow-up", "minutes", "owner", "deadline"],
+}
+
+
+def _sentences(rng, topic, count):
+    words = TOPICS[topic]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(6, 12))).capitalize() + "."
+            for _ in range(count)]
+
+
+def write_text(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def write_pdf(path, lines):
+    """单页 PDF，Helvetica 文本（仅 ASCII）"""
+    stream = ["BT", "/F1 11 Tf", "14 TL", "50 780 Td"]
+    for line in lines:
+        text = line.encode("ascii", "replace").decode("ascii")
+        text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream.append(f"({text}) Tj T*")
+    stream.append("ET")
+    content = "\n".join(stream).encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="word/document.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+
+
+def write_docx(path, lines):
+    paragraphs = "".join(f"<w:p><w:r><w:t>{escape(line)}</w:t></w:r></w:p>" for line in lines)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{paragraphs}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        z.writestr("_rels/.rels", _DOCX_RELS)
+        z.writestr("word/document.xml", document)
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '</Relationships>'
+)
+
+
+def write_xlsx(path, rows):
+    """rows: [[单元格文本或数字, ...], ...]，文本用 inlineStr，不需要共享字符串表"""
+    xml_rows = []
+    for r, row in enumerate(rows, start=1):
+        cells = []
+        for c, value in enumerate(row):
+            ref = f"{chr(ord('A') + c)}{r}"
+            if isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+        xml_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+    sheet = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'<sheetData>{"".join(xml_rows)}</sheetData></worksheet>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        z.writestr("_rels/.rels", _XLSX_RELS)
+        z.writestr("xl/workbook.xml", _XLSX_WORKBOOK)
+        z.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        z.writestr("xl/worksheets/sheet1.xml", sheet)
+
+
+def write_png(path, width, height, seed=0):
+    """8 位灰度 PNG，内容为由 seed 决定的条纹图案"""
+    rows = []
+    for y in range(height):
+        row = bytes(((x * (seed % 7 + 1) + y * 3 + seed) * 5) % 256 for x in range(width))
+        rows.append(b"\x00" + row)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    png = (b"\x89PNG\r\n\x1a\n"
+           + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+           + chunk(b"IEND", b""))
+    with open(path, "wb") as f:
+        f.write(png)
+
+
+def generate_corpus(root, n, exts=CORPUS_EXTS, seed=0, lines=20, image_size=256, files_per_dir=500):
+    """
+    在 root 下生成 n 个文件，扩展名轮流取自 exts，主题随机。
+    :param lines: 每个文本类文件的句子数（xlsx 为行数）
+    :param image_size: PNG 的边长（像素）
+    :param files_per_dir: 每个子目录的文件数
+    :return: [(路径, 主题)]
+    """
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    files = []
+    for i in range(n):
+        ext = exts[i % len(exts)]
+        topic = rng.choice(topics)
+        folder = os.path.join(root, f"d{i // files_per_dir:04d}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{topic.replace(' ', '_')}-{i}.{ext}")
+        if ext in ("txt", "md"):
+            write_text(path, [f"# {topic} {i}"] + _sentences(rng, topic, lines))
+        elif ext == "pdf":
+            write_pdf(path, [f"{topic} {i}"] + _sentences(rng, topic, min(lines, 50)))
+        elif ext == "docx":
+            write_docx(path, [f"{topic} {i}"] + _sentences(rng, topic, lines))
+        elif ext == "xlsx":
+            write_xlsx(path, [["item", "value", "note"]]
+                       + [[rng.choice(TOPICS[topic]), rng.randint(1, 10_000), s] for s in _sentences(rng, topic, lines)])
+        elif ext == "png":
+            write_png(path, image_size, image_size, seed=i)
+        else:
+            raise ValueError(f"不支持生成的扩展名: {ext}")
+        files.append((path, topic))
+    return files